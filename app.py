@@ -1,8 +1,9 @@
 import streamlit as st
 import subprocess
-import json
 import os
-from pypdf import PdfReader
+from src.pdf_ingest import PdfIngestor
+from src.report_codec import ReportReader
+from src.normalize import DEFAULT_MASKS, MASKS
 
 # --- Page Config ---
 st.set_page_config(
@@ -99,24 +100,36 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Helper Functions ---
+@st.cache_data(show_spinner=False)
+def ingest_pdf(data):
+    # Cached per file content, so Streamlit reruns do not re-parse the PDF
+    result = PdfIngestor().ingest(data)
+    return result.code, result.prose
+
 def parse_pdf(uploaded_file):
+    """Returns (code, prose) extracted from the PDF, or (None, None) on failure."""
     try:
-        reader = PdfReader(uploaded_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return ingest_pdf(uploaded_file.getvalue())
     except Exception as e:
         st.error(f"Error parsing PDF: {e}")
-        return None
+        return None, None
 
-def run_debugger(code_content, description=None):
+def run_debugger(code_content, description=None, output_masks=DEFAULT_MASKS):
     # Save to temp file
     with open("temp_source.py", "w") as f:
         f.write(code_content)
     
     # Build command
-    cmd = ["python3", "main.py", "temp_source.py", "--model", "qwen2.5-coder:7b"]
+    # Small model first, escalate to the 7b model only if its patch fails verification
+    cmd = ["python3", "main.py", "temp_source.py", "--model", "qwen2.5-coder:7b",
+           "--models", "qwen2.5-coder:1.5b,qwen2.5-coder:7b", "--priority", "interactive",
+           # The UI only reads debug_report.json, so skip loading rich in the backend process
+           "--plain", "--compact-report",
+           # Output differences the verifier ignores (printed timings, addresses, float noise, ...)
+           "--output-masks", ",".join(output_masks) or "none"]
+    # Optional comma separated list of Ollama endpoints to balance across
+    if os.environ.get("OLLAMA_URLS"):
+        cmd.extend(["--ollama-url", os.environ["OLLAMA_URLS"]])
     
     # Add description if provided
     if description and description.strip():
@@ -136,9 +149,9 @@ def run_debugger(code_content, description=None):
             return None
 
 def load_report():
+    # Handles both full and compact (delta encoded) reports; code versions are rebuilt on access
     if os.path.exists("debug_report.json"):
-        with open("debug_report.json", "r") as f:
-            return json.load(f)
+        return ReportReader.load("debug_report.json")
     return None
 
 # --- Header ---
@@ -166,10 +179,16 @@ with left_col:
         uploaded_file = st.file_uploader("Upload .py or .pdf", type=["py", "pdf"])
         if uploaded_file is not None:
             if uploaded_file.name.endswith(".pdf"):
-                code_input = parse_pdf(uploaded_file)
-                if code_input:
-                    st.info("Extracted text from PDF. Please verify code structure below.")
-                    code_input = st.text_area("Extracted Code", value=code_input, height=300)
+                pdf_code, pdf_prose = parse_pdf(uploaded_file)
+                if pdf_code:
+                    st.info("Extracted Python code from PDF. Please verify code structure below.")
+                    code_input = st.text_area("Extracted Code", value=pdf_code, height=300)
+                    if pdf_prose:
+                        with st.expander("Assignment Text"):
+                            st.text(pdf_prose)
+                elif pdf_prose:
+                    st.info("No Python code detected in PDF. Showing extracted text.")
+                    code_input = st.text_area("Extracted Text", value=pdf_prose, height=300)
             else:
                 # .py file
                 stringio = uploaded_file.getvalue().decode("utf-8")
@@ -183,11 +202,18 @@ with left_col:
         label_visibility="collapsed"
     )
     
+    output_masks = st.multiselect(
+        "Ignore in output comparison",
+        options=list(MASKS),
+        default=list(DEFAULT_MASKS),
+        help="Differences of these kinds do not count as an output change when verifying a fix"
+    )
+    
     run_btn = st.button("Run Debugger", type="primary")
     
     # Handle button click
     if run_btn and code_input:
-        result = run_debugger(code_input, bug_description)
+        result = run_debugger(code_input, bug_description, output_masks)
         if result:
             st.session_state.execution_done = True
             st.rerun()
@@ -291,7 +317,7 @@ with right_col:
                     if opt_report:
                         changes = opt_report.get("changes_summary", [])
                         changes_text = " ".join(changes).lower()
-                        if "complexity" in changes_text or "o(n" in changes_text:
+                        if "complexity" in changes_text or "o(n" in changes_text or opt_report.get("goal") == "memory":
                             is_optimization = True
                     
                     # Check traces for logic repair
@@ -305,6 +331,9 @@ with right_col:
                             
                             if orig_comp and opt_comp and orig_comp != opt_comp:
                                 st.markdown(f"**Complexity Improvement:** `{orig_comp}` ➝ `{opt_comp}`")
+                            if opt_report.get("original_peak_bytes") and opt_report.get("optimized_peak_bytes"):
+                                st.markdown(f"**Peak Memory:** `{opt_report['original_peak_bytes'] / 1024:.1f} KiB` ➝ "
+                                            f"`{opt_report['optimized_peak_bytes'] / 1024:.1f} KiB`")
                             
                             changes = opt_report.get("changes_summary", [])
                             if changes:
@@ -317,18 +346,35 @@ with right_col:
 
                     st.markdown("### Final Code")
                     st.code(repaired_code, language="python")
+                
+                # Parallel optimization mode: measured comparison of every candidate
+                candidates = report.get("optimization_candidates")
+                if candidates:
+                    st.markdown("### Optimization Candidates")
+                    st.table([
+                        {
+                            "#": c.get("candidate"),
+                            "Model": c.get("model"),
+                            "Strategy": c.get("strategy"),
+                            "Verified": "✅" if c.get("verified") else "❌",
+                            "Runtime (s)": c.get("runtime"),
+                            "Speedup": f"{c['speedup']}x" if c.get("speedup") else "-",
+                        }
+                        for c in candidates
+                    ])
 
             with tab4:
                 st.caption("Execution Trace")
                 traces = report.get("traces", [])
-                for trace in traces:
+                for index, trace in enumerate(traces):
                     status_icon = "✅" if trace.get("success") else "❌"
                     status_text = trace.get("status", "Attempted")
                     
                     with st.expander(f"{status_icon} Iteration {trace.get('iteration')}: {trace.get('error_type')} ({status_text})"):
                         st.write(f"**Strategy:** {trace.get('strategy')}")
-                        st.write(f"**Patch:**")
-                        st.code(trace.get('patch'), language="python")
+                        # Reconstruct the patch only when asked for (it may be stored as a delta)
+                        if st.checkbox("Show patch", key=f"patch_{index}"):
+                            st.code(report.code(trace.get('patch')), language="python")
 
             # Download Button
             st.markdown("---")
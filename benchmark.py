@@ -0,0 +1,86 @@
+import argparse
+import sys
+from src.benchmark import run_benchmark, measure_startup, compare, save_results, load_results, DEFAULT_TOLERANCE
+from src.llm_backend import BackendPool
+from src.stand_in_llm import StandInLLM
+from src.cassette import RecordingBackend, ReplayBackend, LATENCY_MODES
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark over the tests/ corpus")
+    parser.add_argument("--tests-dir", type=str, default="tests", help="Directory of broken scripts")
+    parser.add_argument("--fixed-dir", type=str, default="fixed_tests", help="Directory of accepted fixes to compare against")
+    parser.add_argument("--scripts", nargs="*", default=None, help="Only run these scripts (file names inside --tests-dir)")
+    parser.add_argument("--iterations", type=int, default=3, help="Maximum number of debugging iterations per script")
+    parser.add_argument("--model", type=str, default="llama3", help="Model name sent to the LLM backend")
+    parser.add_argument("--live", action="store_true", help="Use real Ollama endpoints instead of the deterministic stand-in")
+    parser.add_argument("--ollama-url", action="append", default=None, help="Ollama endpoint(s) for --live runs")
+    parser.add_argument("--record", type=str, default=None, help="Record the LLM traffic of this run to a cassette")
+    parser.add_argument("--replay", type=str, default=None, help="Replay LLM traffic from a cassette (no server needed)")
+    parser.add_argument("--replay-latency", choices=LATENCY_MODES, default="none", help="Replay with zero or the recorded latency")
+    parser.add_argument("--startup", action="store_true", help="Also measure CLI import/startup time")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure CLI import/startup time")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown before flagging a regression")
+    
+    args = parser.parse_args()
+    
+    if args.startup_only:
+        startup = measure_startup()
+        results = {"mode": "startup", "startup": startup}
+        save_results(results, args.output)
+        print(f"Startup: {startup}")
+        if args.baseline:
+            report_regressions(compare(results, load_results(args.baseline), args.tolerance))
+        return
+    
+    stand_in = None
+    backend = None
+    if args.replay:
+        backend = ReplayBackend(args.replay, latency=args.replay_latency)
+        mode = "replay"
+    elif args.live:
+        backend = BackendPool(BackendPool.parse_urls(args.ollama_url))
+        mode = "live"
+    else:
+        stand_in = StandInLLM.from_corpus(args.tests_dir, args.fixed_dir)
+        backend = BackendPool([stand_in.start()])
+        mode = "stand-in"
+    if args.record:
+        backend = RecordingBackend(backend, args.record)
+    
+    try:
+        results = run_benchmark(args.tests_dir, args.fixed_dir, args.model, iterations=args.iterations,
+                                scripts=args.scripts, backend=backend, prewarm=not args.replay)
+    finally:
+        if stand_in:
+            stand_in.stop()
+    
+    results["mode"] = mode
+    if args.startup:
+        results["startup"] = measure_startup()
+    save_results(results, args.output)
+    
+    print(f"{'script':<28}{'ok':<5}{'time':>9}{'iters':>7}{'llm':>5}{'tokens':>8}{'runs':>6}  opt")
+    for r in results["results"]:
+        opt = "accepted" if r["optimization_accepted"] else ("rejected" if r["optimization_attempted"] else "-")
+        print(f"{r['script']:<28}{'yes' if r['success'] else 'no':<5}{r['time_to_fix']:>9.3f}{r['iterations']:>7}"
+              f"{r['llm_calls']:>5}{r['prompt_tokens'] + r['completion_tokens']:>8}{r['sandbox_runs']:>6}  {opt}")
+    print(f"\nSummary: {results['summary']}")
+    if args.startup:
+        print(f"Startup: {results['startup']}")
+    print(f"Results saved to {args.output}")
+    
+    if args.baseline:
+        report_regressions(compare(results, load_results(args.baseline), args.tolerance))
+
+def report_regressions(regressions):
+    if regressions:
+        print("\nRegressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
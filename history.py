@@ -0,0 +1,48 @@
+import argparse
+import json
+from src.history import HistoryStore
+
+def print_rows(rows, as_json: bool):
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        print("No sessions recorded.")
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate queries over the debugging session history")
+    parser.add_argument("query", choices=["strategies", "p95", "expensive", "errors", "recent"],
+                        help="strategies: success rate per strategy, p95: time-to-fix per model, "
+                             "expensive: costliest scripts, errors: outcomes per error type, recent: latest sessions")
+    parser.add_argument("--db", type=str, default="debug_history.db", help="History database written by main.py --history")
+    parser.add_argument("--limit", type=int, default=10, help="Number of rows for expensive/recent")
+    parser.add_argument("--by", choices=["wall_seconds", "tokens"], default="wall_seconds", help="Cost measure for expensive")
+    parser.add_argument("--percentile", type=float, default=0.95, help="Percentile for the p95 query (0-1)")
+    parser.add_argument("--since", type=str, default=None, help="Only sessions started at or after this date (YYYY-MM-DD) for errors")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    try:
+        if args.query == "strategies":
+            rows = store.strategy_success()
+        elif args.query == "p95":
+            rows = store.percentile_time_to_fix(args.percentile)
+        elif args.query == "expensive":
+            rows = store.expensive_scripts(args.limit, args.by)
+        elif args.query == "errors":
+            rows = store.error_types(args.since)
+        else:
+            rows = store.recent(args.limit)
+        print_rows(rows, args.json)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,198 @@
 import argparse
+import contextlib
+import os
 import sys
 from src.controller import DebuggingController
+from src.cascade import ModelCascade
+from src.llm_backend import BackendPool, PRIORITIES
+from src.knowledge_base import KnowledgeBase
+from src.cassette import RecordingBackend, ReplayBackend, LATENCY_MODES
+from src.console import make_output
+from src.sandbox import Sandbox, LAUNCH_PROFILES
+from src.patch_engine import PatchEngine
+from src.history import HistoryStore
+from src.workspace import Workspace
+from src.normalize import OutputNormalizer, MASKS, DEFAULT_MASKS
+from src.watch import Watcher
+from src.checkpoint import SessionCheckpoint, new_session_id, SESSIONS_DIR
+from src.budget import Budget
+
+def build_cascade(args):
+    """Builds the per-phase model cascade from the CLI flags (None if no cascade was requested)."""
+    default = ModelCascade.parse_models(args.models)
+    tiers = {
+        "repair": ModelCascade.parse_models(args.repair_models) or default,
+        "logic_repair": ModelCascade.parse_models(args.logic_models) or default,
+        "optimization": ModelCascade.parse_models(args.optimize_models) or default,
+    }
+    if not any(tiers.values()):
+        return None
+    # Phases without an explicit cascade fall back to --model
+    tiers = {phase: models or [args.model] for phase, models in tiers.items()}
+    return ModelCascade(tiers, stats_file=args.cascade_stats)
+
+def run_session(controller, output, mode, resume=None):
+    """Runs (or resumes) the session; in JSON mode stdout carries only JSON lines ending with a result event."""
+    if mode == "json":
+        # Keep stdout pure JSON lines: progress prints from the engine go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            controller.run(resume)
+        report = controller.logger.report
+        output.emit("result", success=bool(report["repaired_code"]), report=controller.logger.log_file,
+                    telemetry=report.get("telemetry"))
+    else:
+        controller.run(resume)
 
 def main():
     parser = argparse.ArgumentParser(description="Local AI-Supervised Autonomous Debugging Sandbox")
-    parser.add_argument("script", help="Path to the broken Python script")
+    parser.add_argument("script", nargs="?", help="Path to the broken Python script (the entry point with --project)")
     parser.add_argument("--iterations", type=int, default=3, help="Maximum number of debugging iterations")
     parser.add_argument("--model", type=str, default="llama3", help="Ollama model to use (default: llama3)")
     parser.add_argument("--description", type=str, default=None, help="User description of expected behavior for logic repair")
+    parser.add_argument("--models", type=str, default=None, help="Comma separated model cascade for all phases, cheapest first")
+    parser.add_argument("--repair-models", type=str, default=None, help="Model cascade for the repair phase")
+    parser.add_argument("--logic-models", type=str, default=None, help="Model cascade for the logic repair phase")
+    parser.add_argument("--optimize-models", type=str, default=None, help="Model cascade for the optimization phase")
+    parser.add_argument("--cascade-stats", type=str, default="cascade_stats.json", help="File holding per-error-type cascade statistics")
+    parser.add_argument("--ollama-url", action="append", default=None, help="Ollama endpoint (repeatable or comma separated, default: http://localhost:11434)")
+    parser.add_argument("--max-concurrency", type=int, default=2, help="Maximum in-flight requests per Ollama endpoint")
+    parser.add_argument("--priority", choices=sorted(PRIORITIES), default="batch", help="Scheduling priority of this session's LLM requests")
+    output_mode = parser.add_mutually_exclusive_group()
+    output_mode.add_argument("--plain", action="store_true", help="Plain text output without rich (faster startup)")
+    output_mode.add_argument("--json", action="store_true", help="Machine readable JSON-lines output without rich")
+    parser.add_argument("--optimize", choices=["time", "memory"], default="time", help="Optimize for running time or for peak memory (tracemalloc)")
+    parser.add_argument("--candidates", type=int, default=1, help="Number of optimization candidates to request and benchmark in parallel")
+    parser.add_argument("--keep-alive", type=str, default="30m", help="How long Ollama keeps models loaded after each request (e.g. 30m, -1 for forever)")
+    parser.add_argument("--no-prewarm", action="store_true", help="Do not load models in the background at session start")
+    parser.add_argument("--compact-report", action="store_true", help="Store report code versions as deltas against their parent")
+    parser.add_argument("--compress-report", action="store_true", help="zlib-compress each stored version (implies --compact-report)")
+    parser.add_argument("--record", type=str, default=None, help="Record every LLM request/response to this cassette file")
+    parser.add_argument("--replay", type=str, default=None, help="Serve LLM responses from this cassette instead of Ollama")
+    parser.add_argument("--replay-latency", choices=LATENCY_MODES, default="none", help="Replay with zero or the recorded latency")
+    parser.add_argument("--project", type=str, default=None, help="Project directory the script belongs to; its files are staged and may be patched")
+    parser.add_argument("--output-masks", type=str, default=",".join(DEFAULT_MASKS),
+                        help=f"Differences ignored when verifying optimizations (any of {','.join(MASKS)}; 'none' compares exactly)")
+    parser.add_argument("--float-tolerance", type=float, default=1e-9, help="Relative tolerance for the floats mask")
+    parser.add_argument("--sandbox-seed", type=int, default=0, help="PYTHONHASHSEED and random seed of sandboxed runs")
+    parser.add_argument("--no-sandbox-seed", action="store_true", help="Run sandboxed code with random hashing and seeds")
+    parser.add_argument("--launch-profile", choices=list(LAUNCH_PROFILES), default="file",
+                        help="How sandboxed code is started: temp file, or stdin with optional -E/-I/-S where the code allows them")
+    parser.add_argument("--tmpfs", action="store_true", help="Give each sandboxed run a fresh working directory on tmpfs (/dev/shm)")
+    parser.add_argument("--measure-launch", action="store_true", help="Measure the startup cost of every launch profile and exit")
+    parser.add_argument("--no-structured-output", action="store_true",
+                        help="Ask for plain JSON instead of schema-constrained output (Ollama older than 0.5)")
+    parser.add_argument("--no-context-reuse", action="store_true",
+                        help="Send every repair prompt in full instead of continuing the model's conversation")
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="Wall-clock budget per session; LLM timeouts shrink to fit and the best verified state is returned at the deadline")
+    parser.add_argument("--token-budget", type=int, default=None, help="Prompt plus completion token budget per session")
+    parser.add_argument("--watch", nargs="?", const="", default=None, metavar="PATH",
+                        help="Stay running and re-debug on save: the script (or --project), or every file saved under PATH")
+    parser.add_argument("--resume", type=str, default=None, metavar="SESSION",
+                        help="Continue an interrupted session from its checkpoint (session id, checkpoint file, or 'last')")
+    parser.add_argument("--checkpoint", nargs="?", const=SESSIONS_DIR, default=None, metavar="DIR",
+                        help=f"Checkpoint the session after every step so --resume can continue it (default directory {SESSIONS_DIR})")
+    parser.add_argument("--history", type=str, default=None, help="Append this session to a SQLite history database (see history.py)")
+    parser.add_argument("--kb", type=str, default="fix_kb.json", help="Fix knowledge base file")
+    parser.add_argument("--no-kb", action="store_true", help="Disable the fix knowledge base")
+    parser.add_argument("--kb-bootstrap", action="store_true", help="Index the tests/ -> fixed_tests/ pairs into the knowledge base and exit")
     
     args = parser.parse_args()
     
-    controller = DebuggingController(args.script, args.iterations, args.model, args.description)
-    controller.run()
+    knowledge_base = None if args.no_kb else KnowledgeBase(args.kb)
+    if args.kb_bootstrap:
+        if knowledge_base is None:
+            parser.error("--kb-bootstrap cannot be combined with --no-kb")
+        added = knowledge_base.bootstrap("tests", "fixed_tests", Sandbox(), PatchEngine())
+        print(f"Indexed {added} repairs into {args.kb}")
+        return
+    if args.measure_launch:
+        seed = None if args.no_sandbox_seed else args.sandbox_seed
+        print(f"{'profile':<10} {'tmpfs':<6} {'delivery':<9} {'flags':<8} {'median ms':>10} {'best ms':>8}")
+        for row in Sandbox(seed=seed).measure_startup():
+            print(f"{row['profile']:<10} {'yes' if row['tmpfs'] else 'no':<6} {row['delivery']:<9} {row['flags'] or '-':<8} "
+                  f"{row['median_ms']:>10} {row['best_ms']:>8}")
+        return
+    resume = checkpoint = None
+    if args.resume:
+        if args.watch is not None:
+            parser.error("--resume cannot be combined with --watch")
+        try:
+            directory = args.checkpoint or SESSIONS_DIR
+            session = SessionCheckpoint.latest(directory) if args.resume == "last" else args.resume
+            if not session:
+                raise ValueError("No checkpointed sessions to resume")
+            checkpoint, resume = SessionCheckpoint.load(session, directory)
+        except ValueError as e:
+            parser.error(str(e))
+        # The checkpoint knows what was being debugged and how
+        args.script = args.script or resume["script_path"]
+        args.description = args.description or resume["description"]
+        args.optimize = resume["optimize"]
+        if resume["workspace"] and not args.project:
+            args.project = resume["workspace"]["project"]
+    if args.watch and not args.script and os.path.isfile(args.watch):
+        args.script = args.watch
+    if not args.script and not args.watch:
+        parser.error("the script argument is required")
+    if args.project and not args.script:
+        parser.error("--project needs the entry point script")
+    
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.replay:
+        backend = ReplayBackend(args.replay, latency=args.replay_latency)
+    else:
+        backend = BackendPool(BackendPool.parse_urls(args.ollama_url), max_concurrency=args.max_concurrency)
+        if args.record:
+            backend = RecordingBackend(backend, args.record)
+    try:
+        normalizer = OutputNormalizer.parse(args.output_masks, args.float_tolerance)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.project and not os.path.exists(args.script):
+        # The entry point may be given relative to the project or to the current directory
+        args.script = os.path.join(args.project, args.script)
+    mode = "json" if args.json else "plain" if args.plain else "rich"
+    output = make_output(mode, stream=sys.stdout)
+    cascade = build_cascade(args)
+    
+    def build_controller(script):
+        workspace = Workspace(args.project, script) if args.project else None
+        return DebuggingController(script, args.iterations, args.model, args.description, cascade=cascade,
+                                   backend=backend, priority=PRIORITIES[args.priority], knowledge_base=knowledge_base,
+                                   output=output, candidates=args.candidates, prewarm=not (args.no_prewarm or args.replay),
+                                   keep_alive=args.keep_alive, compact_report=args.compact_report or args.compress_report,
+                                   compress_report=args.compress_report,
+                                   history=HistoryStore(args.history) if args.history else None, workspace=workspace,
+                                   output_masks=normalizer.masks if normalizer else (), float_tolerance=args.float_tolerance,
+                                   seed=None if args.no_sandbox_seed else args.sandbox_seed, optimize=args.optimize,
+                                   launch=args.launch_profile, tmpfs=args.tmpfs,
+                                   structured_output=not args.no_structured_output,
+                                   checkpoint=checkpoint or (SessionCheckpoint(new_session_id(script), args.checkpoint) if args.checkpoint else None),
+                                   reuse_context=not args.no_context_reuse,
+                                   budget=Budget(args.time_budget, args.token_budget) if args.time_budget or args.token_budget else None)
+    
+    if args.watch is not None:
+        # One warm process: controllers (and their engine, sandbox and backend) are reused across saves
+        watcher = Watcher(args.watch or args.project or args.script, build_controller,
+                          lambda controller: run_session(controller, output, mode), output,
+                          script=args.script, exclude=["fixed_tests"])
+        controllers = watcher.controllers.values()
+        try:
+            watcher.watch()
+        finally:
+            for controller in controllers:
+                if controller.workspace:
+                    controller.workspace.close()
+        return
+    
+    controller = build_controller(args.script)
+    try:
+        run_session(controller, output, mode, resume)
+    finally:
+        if controller.workspace:
+            controller.workspace.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from .controller import DebuggingController
+from .llm_backend import BackendPool
+from .sandbox import Sandbox
+from .console import make_output
+from .normalize import DEFAULT_MASKS, OutputNormalizer
+
+# Relative slowdown tolerated before a timing metric counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Modules that must stay out of the CLI startup path (loaded lazily by the phase that needs them)
+HEAVY_MODULES = ("rich", "requests", "urllib3")
+
+_STARTUP_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+def measure_startup(module: str = "main", runs: int = 5) -> dict:
+    """
+    Measures how long importing the CLI entry point takes in a fresh interpreter,
+    plus the wall time of the whole interpreter launch, and which heavy modules got loaded.
+    """
+    import_times, launch_times, loaded = [], [], set()
+    probe = _STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+        launch_times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"Startup probe failed: {result.stderr}")
+        elapsed, modules = (result.stdout.strip().split("\n") + [""])[:2]
+        import_times.append(float(elapsed))
+        loaded.update(m for m in modules.split(",") if m)
+    return {
+        "module": module,
+        "runs": runs,
+        "import_seconds": round(statistics.median(import_times), 5),
+        "launch_seconds": round(statistics.median(launch_times), 5),
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+def _iterations_used(traces: List[dict], max_iterations: int) -> int:
+    repair = [t["iteration"] for t in traces if t["iteration"] <= max_iterations]
+    return max(repair) if repair else 0
+
+def _matches_reference(code: str, reference_path: str, sandbox: Sandbox) -> Optional[bool]:
+    """
+    Whether the repaired code prints the same stdout as the accepted fix in fixed_tests/,
+    modulo the masks verification uses (DEFAULT_MASKS), so printed timings do not count.
+    """
+    if not code or not os.path.exists(reference_path):
+        return None
+    with open(reference_path, "r") as f:
+        reference = f.read()
+    ours = sandbox.run(code)
+    theirs = sandbox.run(reference)
+    if theirs.return_code != 0:
+        return None
+    return ours.return_code == 0 and OutputNormalizer(DEFAULT_MASKS).compare(theirs.stdout, ours.stdout)[0]
+
+def run_script(script_path: str, fixed_dir: str, model: str, backend: BackendPool, iterations: int, workdir: str, knowledge_base=None,
+               prewarm: bool = True) -> dict:
+    """Runs one debugging session and returns its metrics."""
+    name = os.path.splitext(os.path.basename(script_path))[0]
+    controller = DebuggingController(
+        script_path, iterations, model,
+        backend=backend, knowledge_base=knowledge_base, output=make_output("plain"),
+        fixed_dir=os.path.join(workdir, "fixed"),
+        report_path=os.path.join(workdir, f"{name}_report.json"),
+        prewarm=prewarm,
+    )
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller.run()
+    elapsed = time.perf_counter() - start
+
+    report = controller.logger.report
+    traces = report["traces"]
+    telemetry = report.get("telemetry") or controller.telemetry.snapshot()
+    repaired = report.get("repaired_code", "")
+    optimization = [t for t in traces if t["error_type"] == "Optimization"]
+    return {
+        "script": os.path.basename(script_path),
+        "success": bool(repaired),
+        "time_to_fix": round(elapsed, 4),
+        "iterations": _iterations_used(traces, iterations),
+        "llm_calls": telemetry["llm_calls"],
+        "prompt_tokens": telemetry["prompt_tokens"],
+        "completion_tokens": telemetry["completion_tokens"],
+        "sandbox_runs": telemetry["sandbox_runs"],
+        "optimization_attempted": bool(optimization),
+        "optimization_accepted": any(t["status"] == "Accepted" for t in optimization),
+        "matches_reference": _matches_reference(repaired, os.path.join(fixed_dir, f"{name}_fixed.py"), Sandbox()),
+    }
+
+def summarize(results: List[dict]) -> dict:
+    total = len(results) or 1
+    times = [r["time_to_fix"] for r in results]
+    attempted = [r for r in results if r["optimization_attempted"]]
+    return {
+        "scripts": len(results),
+        "success_rate": round(sum(r["success"] for r in results) / total, 4),
+        "reference_match_rate": round(sum(bool(r["matches_reference"]) for r in results) / total, 4),
+        "optimization_acceptance_rate": round(sum(r["optimization_accepted"] for r in attempted) / len(attempted), 4) if attempted else None,
+        "total_time": round(sum(times), 4),
+        "median_time_to_fix": round(statistics.median(times), 4) if times else 0.0,
+        "mean_iterations": round(sum(r["iterations"] for r in results) / total, 4),
+        "llm_calls": sum(r["llm_calls"] for r in results),
+        "tokens": sum(r["prompt_tokens"] + r["completion_tokens"] for r in results),
+        "sandbox_runs": sum(r["sandbox_runs"] for r in results),
+    }
+
+def run_benchmark(tests_dir: str = "tests", fixed_dir: str = "fixed_tests", model: str = "llama3", urls: List[str] = None,
+                  iterations: int = 3, scripts: List[str] = None, knowledge_base=None, backend=None, prewarm: bool = True) -> dict:
+    """
+    Drives DebuggingController over every script in `tests_dir` (or the given subset).
+    `backend` (e.g. a ReplayBackend) takes precedence over `urls`. prewarm=False skips the
+    model warm-up requests (replays have no model to load and no recording of them).
+    """
+    backend = backend or BackendPool(urls)
+    names = scripts or sorted(f for f in os.listdir(tests_dir) if f.endswith(".py"))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="debugstellar_bench_") as workdir:
+        for name in names:
+            results.append(run_script(os.path.join(tests_dir, name), fixed_dir, model, backend, iterations, workdir, knowledge_base, prewarm))
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "model": model,
+        "iterations": iterations,
+        "summary": summarize(results),
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Returns human readable regressions of `current` against `baseline` (empty if none)."""
+    regressions = []
+    cur, base = current.get("summary"), baseline.get("summary")
+    if cur and base:
+        for key in ("success_rate", "reference_match_rate", "optimization_acceptance_rate"):
+            if base.get(key) is not None and cur.get(key) is not None and cur[key] < base[key]:
+                regressions.append(f"{key} dropped: {base[key]} -> {cur[key]}")
+        for key in ("llm_calls", "tokens", "sandbox_runs"):
+            if cur[key] > base[key]:
+                regressions.append(f"{key} increased: {base[key]} -> {cur[key]}")
+        for key in ("total_time", "median_time_to_fix"):
+            if base[key] and cur[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{key} regressed: {base[key]}s -> {cur[key]}s (tolerance {tolerance:.0%})")
+
+    cur_startup, base_startup = current.get("startup"), baseline.get("startup")
+    if cur_startup:
+        if cur_startup["heavy_modules_loaded"]:
+            regressions.append(f"heavy modules imported at startup: {', '.join(cur_startup['heavy_modules_loaded'])}")
+        if base_startup and cur_startup["import_seconds"] > base_startup["import_seconds"] * (1 + tolerance):
+            regressions.append(f"startup import time regressed: {base_startup['import_seconds']}s -> {cur_startup['import_seconds']}s")
+
+    base_scripts = {r["script"]: r for r in baseline.get("results", [])}
+    for result in current.get("results", []):
+        before = base_scripts.get(result["script"])
+        if before and before["success"] and not result["success"]:
+            regressions.append(f"{result['script']} no longer fixed")
+    return regressions
+
+def save_results(results: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+
+def load_results(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
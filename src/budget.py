@@ -0,0 +1,164 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Share of the LLM budget left at the start of each phase that the phase may spend.
+# Repair keeps the rest for optimizing (or logic-repairing) the program it repairs; the last phase takes everything.
+PHASE_SHARES = {"repair": 0.6, "logic_repair": 1.0, "optimization": 1.0}
+# Share of the total time kept back from LLM calls for final verification and saving the report
+RESERVE_SHARE = 0.1
+# A call that could run for less than this is not started
+MIN_CALL_SECONDS = 1.0
+
+class BudgetExhausted(Exception):
+    """Raised instead of starting (or while waiting for) an LLM call the session can no longer afford."""
+
+class Budget:
+    """
+    Session-wide deadline and token budget, split across phases.
+    Each LLM call gets a timeout of at most what its phase has left, completions are capped by
+    the tokens left, and a call still running at the deadline is abandoned (its HTTP timeout
+    closes the connection, which stops generation on the server). The controller stops at the
+    deadline with the best state it verified. None for seconds or tokens means unlimited.
+    """
+    def __init__(self, seconds: Optional[float] = None, tokens: Optional[int] = None,
+                 shares: Dict[str, float] = None, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self.tokens = tokens
+        self.shares = dict(PHASE_SHARES, **(shares or {}))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        """Starts (or restarts) the session clock and token count."""
+        self.started = self.clock()
+        self.used_tokens = 0
+        self.phase = None
+        self.phases = {}
+        self._phase_deadline = None
+        self._phase_tokens = None
+        # Why the budget ran out (None while it has not)
+        self.reason = None
+
+    @property
+    def llm_deadline(self) -> Optional[float]:
+        return self.started + self.seconds * (1 - RESERVE_SHARE) if self.seconds else None
+
+    def begin(self, phase: str):
+        """Allocates the phase its share of the time and tokens still left."""
+        now = self.clock()
+        share = self.shares.get(phase, 1.0)
+        self.phase = phase
+        # A new allotment: running out in the previous phase does not carry over by itself
+        self.reason = None
+        self._phase_deadline = now + max(0.0, self.llm_deadline - now) * share if self.seconds else None
+        self._phase_tokens = self.used_tokens + int((self.tokens - self.used_tokens) * share) if self.tokens else None
+        self.phases[phase] = {
+            "allotted_seconds": round(self._phase_deadline - now, 3) if self.seconds else None,
+            "allotted_tokens": self._phase_tokens - self.used_tokens if self.tokens else None,
+            "started": now,
+            "tokens_at_start": self.used_tokens,
+        }
+
+    def remaining(self) -> Optional[float]:
+        """Seconds the current phase may still spend on LLM calls (None if unlimited)."""
+        if not self.seconds:
+            return None
+        deadline = self._phase_deadline if self._phase_deadline is not None else self.llm_deadline
+        return deadline - self.clock()
+
+    def session_remaining(self) -> Optional[float]:
+        """Seconds until the session deadline, reserve included (None if unlimited). Bounds sandbox runs."""
+        return self.started + self.seconds - self.clock() if self.seconds else None
+
+    def remaining_tokens(self) -> Optional[int]:
+        if not self.tokens:
+            return None
+        limit = self._phase_tokens if self._phase_tokens is not None else self.tokens
+        return limit - self.used_tokens
+
+    def exhausted(self) -> bool:
+        """True once the current phase has no time or tokens left for another LLM call."""
+        if self.reason:
+            return True
+        remaining = self.remaining()
+        if remaining is not None and remaining < MIN_CALL_SECONDS:
+            self.reason = f"{self.phase or 'session'} time budget used up"
+        tokens = self.remaining_tokens()
+        if tokens is not None and tokens <= 0:
+            self.reason = f"{self.phase or 'session'} token budget used up"
+        return self.reason is not None
+
+    def timeout(self, default: float) -> float:
+        """Timeout for the next call: `default`, shortened to what the phase has left. Raises BudgetExhausted."""
+        if self.exhausted():
+            raise BudgetExhausted(self.reason)
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    def completion_limit(self, prompt: str) -> Optional[int]:
+        """num_predict for a prompt: the tokens left after it (estimated at 4 characters a token)."""
+        tokens = self.remaining_tokens()
+        if tokens is None:
+            return None
+        limit = tokens - len(prompt) // 4
+        if limit <= 0:
+            self.reason = f"{self.phase or 'session'} token budget too small for the prompt"
+            raise BudgetExhausted(self.reason)
+        return limit
+
+    def charge(self, response_json: Optional[dict]):
+        """Counts a response's prompt and completion tokens."""
+        if not response_json:
+            return
+        with self._lock:
+            self.used_tokens += (response_json.get("prompt_eval_count", 0) or 0) + (response_json.get("eval_count", 0) or 0)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Runs fn (an LLM request) but stops waiting at the phase deadline. fn gets the same deadline
+        from the caller, so a request still queued for an endpoint then is dropped rather than sent,
+        and one in flight ends on its own timeout, which never outlasts the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return fn(*args, **kwargs)
+        outcome = {}
+
+        def target():
+            try:
+                outcome["value"] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+
+        worker = threading.Thread(target=target, name="budgeted-call", daemon=True)
+        worker.start()
+        worker.join(max(0.0, remaining))
+        if worker.is_alive():
+            self.reason = f"{self.phase or 'session'} deadline reached; request cancelled"
+            raise BudgetExhausted(self.reason)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        phases = {}
+        for name, phase in self.phases.items():
+            later = [p for p in self.phases.values() if p["started"] > phase["started"]]
+            following = min(later, key=lambda p: p["started"]) if later else None
+            phases[name] = {
+                "allotted_seconds": phase["allotted_seconds"],
+                "allotted_tokens": phase["allotted_tokens"],
+                "used_seconds": round((following["started"] if following else now) - phase["started"], 3),
+                "used_tokens": (following["tokens_at_start"] if following else self.used_tokens) - phase["tokens_at_start"],
+            }
+        return {
+            "seconds": self.seconds,
+            "tokens": self.tokens,
+            "used_seconds": round(now - self.started, 3),
+            "used_tokens": self.used_tokens,
+            "phases": phases,
+            "exhausted": self.reason,
+        }
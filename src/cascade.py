@@ -0,0 +1,90 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+PHASES = ("repair", "logic_repair", "optimization")
+
+class ModelCascade:
+    """
+    Per-phase list of models ordered from cheapest to most capable.
+    The controller tries the first tier and escalates only after a failed
+    sandbox verification. Success statistics are kept per (phase, error type, model)
+    so tiers that never work for an error class are skipped in later sessions.
+    """
+    def __init__(self, tiers: Dict[str, List[str]], stats_file: Optional[str] = "cascade_stats.json", min_attempts: int = 3):
+        self.tiers = {phase: list(models) for phase, models in tiers.items() if models}
+        self.stats_file = stats_file
+        self.min_attempts = min_attempts
+        self.stats = self._load_stats()
+
+    @classmethod
+    def single(cls, model: str, stats_file: Optional[str] = None) -> "ModelCascade":
+        """Cascade with one tier per phase (the pre-cascade behaviour)."""
+        return cls({phase: [model] for phase in PHASES}, stats_file=stats_file)
+
+    @staticmethod
+    def parse_models(spec: Optional[str]) -> List[str]:
+        """Parses a comma separated model list such as "qwen2.5-coder:1.5b,qwen2.5-coder:7b"."""
+        if not spec:
+            return []
+        return [m.strip() for m in spec.split(",") if m.strip()]
+
+    def _load_stats(self) -> dict:
+        if self.stats_file and os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, "r") as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def save(self):
+        if not self.stats_file:
+            return
+        try:
+            with open(self.stats_file, "w") as f:
+                json.dump(self.stats, f, indent=4)
+        except OSError as e:
+            print(f"Failed to save cascade stats: {e}")
+
+    def _entry(self, phase: str, error_type: str, model: str) -> dict:
+        return self.stats.setdefault(phase, {}).setdefault(error_type, {}).setdefault(
+            model, {"attempts": 0, "successes": 0}
+        )
+
+    def never_works(self, phase: str, error_type: str, model: str) -> bool:
+        entry = self.stats.get(phase, {}).get(error_type, {}).get(model)
+        if not entry:
+            return False
+        return entry["attempts"] >= self.min_attempts and entry["successes"] == 0
+
+    def models_for(self, phase: str, error_type: str) -> List[str]:
+        """
+        Returns the tiers to try for this phase and error type, cheapest first.
+        The most capable tier is always kept so there is something to escalate to.
+        """
+        models = self.tiers.get(phase, [])
+        usable = [m for m in models[:-1] if not self.never_works(phase, error_type, m)]
+        if models:
+            usable.append(models[-1])
+        return usable
+
+    def select(self, phase: str, error_type: str, escalation: int = 0) -> Optional[str]:
+        """Returns the model at the given escalation level (clamped to the largest tier)."""
+        models = self.models_for(phase, error_type)
+        if not models:
+            return None
+        return models[min(escalation, len(models) - 1)]
+
+    def record(self, phase: str, error_type: str, model: str, success: bool):
+        entry = self._entry(phase, error_type, model)
+        entry["attempts"] += 1
+        if success:
+            entry["successes"] += 1
+        self.save()
+
+    def success_rate(self, phase: str, error_type: str, model: str) -> Optional[float]:
+        entry = self.stats.get(phase, {}).get(error_type, {}).get(model)
+        if not entry or not entry["attempts"]:
+            return None
+        return entry["successes"] / entry["attempts"]
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+from .llm_backend import PRIORITY_BATCH
+
+LATENCY_MODES = ("none", "recorded")
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when no recorded interaction matches a request."""
+
+def request_key(payload: dict) -> str:
+    """Stable hash of a request payload (key order independent)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class RecordingBackend:
+    """
+    Wraps a backend and appends every request/response pair, with its latency, to a cassette file.
+    The file is rewritten after each interaction so an interrupted session keeps what it recorded.
+    """
+    def __init__(self, backend, path: str):
+        self.backend = backend
+        self.path = path
+        self.interactions = []
+        self._lock = threading.Lock()
+
+    def generate(self, payload: dict, timeout: float, priority: int = PRIORITY_BATCH, deadline: Optional[float] = None) -> dict:
+        start = time.perf_counter()
+        interaction = {"key": request_key(payload), "request": payload}
+        try:
+            response = self.backend.generate(payload, timeout=timeout, priority=priority, deadline=deadline)
+            interaction["response"] = response
+            return response
+        except Exception as e:
+            interaction["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            interaction["elapsed"] = round(time.perf_counter() - start, 6)
+            with self._lock:
+                self.interactions.append(interaction)
+                self._save()
+
+    def _save(self):
+        with open(self.path, "w") as f:
+            json.dump({"version": 1, "interactions": self.interactions}, f, indent=4)
+
+class ReplayBackend:
+    """
+    Serves recorded interactions back deterministically.
+    Requests are matched by payload hash; identical requests are served in recorded order.
+    latency="recorded" sleeps for the recorded duration, "none" answers immediately.
+    With sequential=True unmatched requests fall back to the next unused interaction.
+    """
+    def __init__(self, path: str, latency: str = "none", sequential: bool = False):
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"latency must be one of {LATENCY_MODES}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cassette {path} not found")
+        with open(path, "r") as f:
+            self.interactions = json.load(f)["interactions"]
+        self.latency = latency
+        self.sequential = sequential
+        self._by_key = defaultdict(deque)
+        for interaction in self.interactions:
+            self._by_key[interaction["key"]].append(interaction)
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def _next(self, payload: dict) -> Optional[dict]:
+        with self._lock:
+            queue = self._by_key.get(request_key(payload))
+            while queue:
+                interaction = queue.popleft()
+                if id(interaction) not in self._used:
+                    self._used.add(id(interaction))
+                    return interaction
+            if self.sequential:
+                for interaction in self.interactions:
+                    if id(interaction) not in self._used:
+                        self._used.add(id(interaction))
+                        return interaction
+        return None
+
+    def generate(self, payload: dict, timeout: float, priority: int = PRIORITY_BATCH, deadline: Optional[float] = None) -> dict:
+        interaction = self._next(payload)
+        if interaction is None:
+            raise CassetteMiss(f"No recorded interaction for model {payload.get('model')} ({request_key(payload)[:12]})")
+        if self.latency == "recorded":
+            time.sleep(min(interaction["elapsed"], timeout))
+        if "error" in interaction:
+            raise RuntimeError(f"Recorded failure: {interaction['error']}")
+        return interaction["response"]
+
+    @property
+    def remaining(self) -> int:
+        return len(self.interactions) - len(self._used)
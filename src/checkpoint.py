@@ -0,0 +1,86 @@
+import json
+import os
+import time
+from dataclasses import asdict
+from typing import Optional, Tuple
+
+from .sandbox import ExecutionResult, HangSite
+from .state_tracker import StateRecord, StateTracker
+
+# Checkpoints live here, one <session id>.json per session
+SESSIONS_DIR = ".debug_sessions"
+CHECKPOINT_VERSION = 1
+
+def new_session_id(script_path: str) -> str:
+    name = os.path.splitext(os.path.basename(script_path))[0]
+    return f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+def encode_result(result: ExecutionResult) -> dict:
+    return asdict(result)
+
+def decode_result(data: dict) -> ExecutionResult:
+    hang = HangSite(**data["hang"]) if data.get("hang") else None
+    return ExecutionResult(**{**data, "hang": hang})
+
+def encode_tracker(tracker: StateTracker) -> dict:
+    return {
+        key: {"code": r.code, "result": encode_result(r.result), "analysis": list(r.analysis),
+              "iteration": r.iteration, "visits": r.visits}
+        for key, r in tracker.states.items()
+    }
+
+def decode_tracker(states: dict) -> StateTracker:
+    tracker = StateTracker()
+    for key, r in states.items():
+        tracker.states[key] = StateRecord(r["code"], decode_result(r["result"]), tuple(r["analysis"]), r["iteration"], r["visits"])
+    return tracker
+
+class SessionCheckpoint:
+    """
+    Controller state of one debugging session, rewritten after every step so an interrupted session
+    (killed worker, UI timeout, host restart) can continue with `--resume <id>` instead of
+    repeating finished sandbox runs and LLM calls.
+    Writes go to a temporary file that replaces the checkpoint, so a kill mid-write keeps the last one.
+    """
+    def __init__(self, session_id: str, directory: str = SESSIONS_DIR):
+        self.session_id = session_id
+        self.directory = directory
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.session_id}.json")
+
+    def save(self, state: dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = f"{self.path}.tmp"
+            with open(temp, "w") as f:
+                json.dump({"version": CHECKPOINT_VERSION, "session": self.session_id,
+                           "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), **state}, f)
+            os.replace(temp, self.path)
+        except OSError as e:
+            print(f"Failed to save session checkpoint: {e}")
+
+    @classmethod
+    def load(cls, session: str, directory: str = SESSIONS_DIR) -> Tuple["SessionCheckpoint", dict]:
+        """Loads a checkpoint by session id or path. Raises ValueError if there is none."""
+        path = session if session.endswith(".json") and os.path.exists(session) else os.path.join(directory, f"{session}.json")
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot resume session {session}: {e}")
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Cannot resume session {session}: unsupported checkpoint version {state.get('version')}")
+        return cls(state["session"], os.path.dirname(path) or "."), state
+
+    @staticmethod
+    def latest(directory: str = SESSIONS_DIR) -> Optional[str]:
+        """Id of the most recently saved checkpoint (None if there are none)."""
+        try:
+            paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+        except OSError:
+            return None
+        if not paths:
+            return None
+        return os.path.splitext(os.path.basename(max(paths, key=os.path.getmtime)))[0]
@@ -0,0 +1,61 @@
+import json
+import re
+import sys
+
+OUTPUT_MODES = ("rich", "plain", "json")
+
+# Rich markup tags such as [bold green] ... [/bold green]
+_MARKUP = re.compile(r"\[/?[a-z0-9 _#]+\]")
+
+def strip_markup(text: str) -> str:
+    return _MARKUP.sub("", str(text))
+
+class RichOutput:
+    """Coloured terminal output. rich is imported only when this output is created."""
+    def __init__(self):
+        from rich.console import Console
+        from rich.panel import Panel
+        self._console = Console()
+        self._panel = Panel
+
+    def print(self, text: str = ""):
+        self._console.print(text)
+
+    def panel(self, text: str, title: str = ""):
+        self._console.print(self._panel(text, title=title))
+
+class PlainOutput:
+    """Markup-free output for logs, batch workers and dumb terminals."""
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def print(self, text: str = ""):
+        print(strip_markup(text), file=self.stream or sys.stdout)
+
+    def panel(self, text: str, title: str = ""):
+        prefix = f"[{title}] " if title else ""
+        print(f"{prefix}{strip_markup(text)}", file=self.stream or sys.stdout)
+
+class JsonOutput:
+    """One JSON object per line; stray prints are expected to be redirected away from `stream`."""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, event: str, **fields):
+        self.stream.write(json.dumps({"event": event, **fields}) + "\n")
+        self.stream.flush()
+
+    def print(self, text: str = ""):
+        text = strip_markup(text).strip()
+        if text:
+            self.emit("message", text=text)
+
+    def panel(self, text: str, title: str = ""):
+        self.emit("panel", title=title, text=strip_markup(text))
+
+def make_output(mode: str = "rich", stream=None):
+    if mode == "plain":
+        return PlainOutput(stream)
+    if mode == "json":
+        return JsonOutput(stream)
+    return RichOutput()
@@ -1,26 +1,104 @@
 from .sandbox import Sandbox
 from .patch_engine import PatchEngine
 from .logger import DebugLogger
+from .cascade import ModelCascade
+from .llm_backend import BackendPool, PRIORITY_BATCH
+from .knowledge_base import KnowledgeBase
+from .telemetry import Telemetry
+from .console import make_output
+from .state_tracker import StateTracker
+from .history import HistoryStore
+from .workspace import Workspace
+from .normalize import DEFAULT_MASKS
+from .perf_analyzer import find_antipatterns, apply_rewrites
+from .recursion_optimizer import RECURSION_TRANSFORMS
+from .budget import Budget
+from .checkpoint import SessionCheckpoint, new_session_id, encode_tracker, decode_tracker
 import os
-from rich.console import Console
-from rich.syntax import Syntax
-from rich.panel import Panel
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# A recursion transform must make the whole program at least this much faster to be kept
+MIN_TRANSFORM_SPEEDUP = 1.05
 
 class DebuggingController:
-    def __init__(self, script_path: str, max_iterations: int = 3, model: str = "llama3", description: str = None):
+    def __init__(self, script_path: str, max_iterations: int = 3, model: str = "llama3", description: str = None, cascade: ModelCascade = None,
+                 backend: BackendPool = None, priority: int = PRIORITY_BATCH, knowledge_base: KnowledgeBase = None,
+                 fixed_dir: str = "fixed_tests", report_path: str = "debug_report.json", output=None,
+                 candidates: int = 1, prewarm: bool = True, keep_alive: str = "30m",
+                 compact_report: bool = False, compress_report: bool = False, history: HistoryStore = None,
+                 workspace: Workspace = None, output_masks: tuple = DEFAULT_MASKS, float_tolerance: float = 1e-9, seed: int = 0,
+                 optimize: str = "time", launch: str = "file", tmpfs: bool = False,
+                 structured_output: bool = True, checkpoint: SessionCheckpoint = None, reuse_context: bool = True,
+                 budget: Budget = None):
         self.script_path = script_path
         self.max_iterations = max_iterations
         self.description = description
-        self.sandbox = Sandbox()
-        self.patch_engine = PatchEngine(model=model)
-        self.logger = DebugLogger()
-        self.console = Console()
+        self.fixed_dir = fixed_dir
+        self.telemetry = Telemetry()
+        # Multi-file project: script_path is its entry point and patches may target any project file
+        self.workspace = workspace
+        self.sandbox = Sandbox(telemetry=self.telemetry, workspace=workspace, seed=seed, launch=launch, tmpfs=tmpfs, budget=budget)
+        self.patch_engine = PatchEngine(model=model, backend=backend, priority=priority, telemetry=self.telemetry, keep_alive=keep_alive,
+                                        output_masks=output_masks, float_tolerance=float_tolerance, structured=structured_output,
+                                        reuse_context=reuse_context, budget=budget)
+        self.prewarm = prewarm
+        # Without an explicit cascade every phase uses the single configured model
+        self.cascade = cascade or ModelCascade.single(model)
+        # error_type -> number of failed LLM verifications in this session (repair phase)
+        self.escalation = {}
+        self.knowledge_base = knowledge_base
+        # Number of optimization candidates requested in parallel (1 = single candidate mode)
+        self.candidates = candidates
+        # What the optimization phase minimizes: "time" or "memory" (peak traced memory)
+        self.optimize = optimize
+        # Every program state explored this session, keyed by normalized AST hash
+        self.tracker = StateTracker()
+        self.logger = DebugLogger(report_path, compact=compact_report, compress=compress_report)
+        # Optional SQLite store every finished session is appended to
+        self.history = history
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        # Session deadline/token budget shared with the patch engine (None: bounded by iterations only)
+        self.budget = budget
+        # Where the session state is saved after every step (None: not checkpointed)
+        self.checkpoint = checkpoint
+        # LLM results of the logic repair/optimization phase by call, checkpointed so a resume does not repeat them
+        self.phase_replies = {}
+        # State of the last checkpoint, which the phase's LLM results are saved with
+        self._checkpoint_state = None
+        # rich is only imported if no lighter output was requested
+        self.console = output or make_output("rich")
+
+    def reset(self):
+        """
+        Starts a new session on this controller (watch mode): fresh report, telemetry and explored
+        states, while the sandbox, patch engine, backend connections and knowledge base stay warm.
+        """
+        self.telemetry = Telemetry()
+        self.sandbox.telemetry = self.patch_engine.telemetry = self.telemetry
+        self.patch_engine.reset_conversations()
+        self.escalation = {}
+        self.tracker = StateTracker()
+        self.logger = DebugLogger(self.logger.log_file, compact=self.logger.compact, compress=self.logger.compress)
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.phase_replies = {}
+        self._checkpoint_state = None
+        if self.checkpoint:
+            self.checkpoint = SessionCheckpoint(new_session_id(self.script_path), self.checkpoint.directory)
+        if self.workspace:
+            self.workspace.refresh()
 
     def save_fixed_code(self, code: str):
         # Create fixed_tests directory if it doesn't exist
-        fixed_dir = "fixed_tests"
+        fixed_dir = self.fixed_dir
         if not os.path.exists(fixed_dir):
             os.makedirs(fixed_dir)
+        
+        if self.workspace:
+            project_dir = os.path.join(fixed_dir, os.path.basename(self.workspace.root) + "_fixed")
+            written = self.workspace.export(project_dir, code)
+            self.console.panel(f"[bold green]Success! Fixed project files saved to {project_dir} ({len(written)} files)[/bold green]", title="File Saved")
+            return
             
         base = os.path.basename(self.script_path)
         name, ext = os.path.splitext(base)
@@ -30,150 +108,676 @@ class DebuggingController:
             with open(fixed_path, 'w') as f:
                 f.write(code)
             
-            self.console.print(Panel(f"[bold green]Success! Fixed code saved to {fixed_path}[/bold green]", title="File Saved"))
+            self.console.panel(f"[bold green]Success! Fixed code saved to {fixed_path}[/bold green]", title="File Saved")
         except Exception as e:
             self.console.print(f"[bold red]Failed to save fixed code: {e}[/bold red]")
 
-    def run(self):
-        self.console.print(f"[bold blue]Starting debugging session for {self.script_path}...[/bold blue]")
-        
-        try:
-            with open(self.script_path, 'r') as f:
-                current_code = f.read()
-        except FileNotFoundError:
-            self.console.print(f"[bold red]Error: File {self.script_path} not found.[/bold red]")
-            return
+    def save_report(self):
+        if self.workspace:
+            self.logger.log_workspace(self.workspace.root, self.workspace.entry, dict(self.workspace.overrides))
+        self.logger.log_telemetry(self.telemetry.snapshot())
+        if self.budget:
+            self.logger.log_budget(self.budget.snapshot())
+        self.logger.save()
+        if self.history:
+            try:
+                self.history.record_session(self.script_path, self.patch_engine.model, self.logger.report, self.started_at)
+            except Exception as e:
+                self.console.print(f"[yellow]Could not record session history: {e}[/yellow]")
+
+    def run(self, resume: dict = None):
+        """Runs the session, or continues the one checkpointed in `resume` (see checkpoint.py)."""
+        if resume:
+            if resume["phase"] == "done":
+                self.console.print(f"[bold blue]Session {resume['session']} already finished; see {self.logger.log_file}.[/bold blue]")
+                return
+            current_code, start, success_code, pending_llm, first_failure = self._restore_checkpoint(resume)
+            self.console.print(f"[bold blue]Resuming session {resume['session']} for {self.script_path} "
+                               f"({resume['phase'].replace('_', ' ')}, iteration {start})...[/bold blue]")
+        else:
+            self.console.print(f"[bold blue]Starting debugging session for {self.script_path}...[/bold blue]")
+            
+            try:
+                with open(self.script_path, 'r') as f:
+                    current_code = f.read()
+            except FileNotFoundError:
+                self.console.print(f"[bold red]Error: File {self.script_path} not found.[/bold red]")
+                return
 
-        self.logger.log_original_code(current_code)
+            self.logger.log_original_code(current_code)
+            start = 1
+            success_code = None
+            # (error_type, model) of the last LLM patch, verified by the next sandbox run
+            pending_llm = None
+            # (code, error_type, line_number, message) of the first failure, learned once repaired
+            first_failure = None
+        if self.checkpoint:
+            self.logger.report["session"] = self.checkpoint.session_id
+            self.console.print(f"Session {self.checkpoint.session_id} (continue an interrupted run with --resume {self.checkpoint.session_id})")
+        if self.budget:
+            self.budget.start()
+        # Model loading overlaps with the first sandbox run
+        self.start_prewarm()
         
-        success_code = None
+        # Sandbox result of a knowledge base fix that was already verified
+        verified_result = None
+        # (code, analysis) a recursion-to-loop rewrite started from, until the rewrite has run
+        rewritten_from = None
         
-        for i in range(1, self.max_iterations + 1):
-            self.console.print(f"\n[bold yellow]--- Iteration {i} ---[/bold yellow]")
+        # Repair phase (skipped when resuming a session that already reached a working version)
+        if not success_code:
+            if self.budget:
+                self.budget.begin("repair")
+            for i in range(start, self.max_iterations + 1):
+                if self._out_of_budget(current_code):
+                    break
+                self.console.print(f"\n[bold yellow]--- Iteration {i} ---[/bold yellow]")
             
-            # 1. Run
-            result = self.sandbox.run(current_code)
+                # 1. Run (states already explored this session are not run again)
+                known = self.tracker.get(self._state(current_code))
+                if known:
+                    self.console.print(f"[yellow]State already explored in iteration {known.iteration}; skipping sandbox run.[/yellow]")
+                    result = known.result
+                else:
+                    result = verified_result or self.sandbox.run(current_code)
+                verified_result = None
             
-            if result.return_code == 0:
-                self.console.print(Panel("[bold green]Success! Code executed without errors.[/bold green]", title="Execution Result"))
+                if pending_llm:
+                    self._record_repair(pending_llm, result.return_code == 0)
+                    pending_llm = None
+            
+                if result.return_code == 0:
+                    self.console.panel("[bold green]Success! Code executed without errors.[/bold green]", title="Execution Result")
                 
-                # Log success
-                self.logger.log_repaired_code(current_code)
-                self.logger.set_best_attempt(current_code, "Success")
-                self.logger.add_trace(i, "None", "Code ran successfully", "None", True)
-                success_code = current_code
-                break # Exit loop to proceed to optimization
-            
-            self.console.print(f"[red]Error detected (Return Code: {result.return_code})[/red]")
-            
-            if result.timed_out:
-                self.console.print("[red]Execution timed out.[/red]")
-                error_type = "TimeoutError"
-                message = "Execution timed out (possible infinite loop)"
-                line_number = None
-            else:
-                # 2. Observe & Analyze
-                error_type, line_number, message = self.patch_engine.analyze_error(result.stderr)
+                    # Log success
+                    self.logger.log_repaired_code(current_code)
+                    self.logger.set_best_attempt(current_code, "Success")
+                    self.logger.add_trace(i, "None", "Code ran successfully", "None", True)
+                    success_code = current_code
+                    self._learn_repair(first_failure, success_code)
+                    break # Exit loop to proceed to optimization
             
-            if not error_type:
-                self.console.print("[red]Could not analyze error type from stderr.[/red]")
-                self.logger.add_trace(i, "Unknown", "Could not parse stderr", "None", False)
-                break
+                self.console.print(f"[red]Error detected (Return Code: {result.return_code})[/red]")
+            
+                if known:
+                    error_type, line_number, message = known.analysis
+                elif result.timed_out:
+                    self.console.print("[red]Execution timed out.[/red]")
+                    error_type = "TimeoutError"
+                    message = "Execution timed out (possible infinite loop)"
+                    line_number = None
+                    if result.hang:
+                        # Stack samples taken before the kill point at the loop the program was stuck in
+                        message = f"Execution timed out, stuck in a loop at {result.hang.describe()}"
+                        line_number = result.hang.line
+                else:
+                    # 2. Observe & Analyze
+                    error_type, line_number, message = self.patch_engine.analyze_error(result.stderr)
+            
+                if not error_type:
+                    self.console.print("[red]Could not analyze error type from stderr.[/red]")
+                    self.logger.add_trace(i, "Unknown", "Could not parse stderr", "None", False)
+                    break
                 
-            self.console.print(f"Analyzed: [bold]{error_type}[/bold] at line {line_number}: {message}")
+                self.console.print(f"Analyzed: [bold]{error_type}[/bold] at line {line_number}: {message}")
+                if first_failure is None:
+                    first_failure = (current_code, error_type, line_number, message)
+                self.tracker.record(self._state(current_code), result, (error_type, line_number, message), i)
             
-            # 3. Generate Patch
-            patch, strategy = self.patch_engine.generate_patch(current_code, error_type, line_number, message)
+                use_heuristics = True
+                if rewritten_from and result.timed_out and not known:
+                    # The loop the rewrite introduced hangs: the LLM gets the program it was given instead
+                    self.console.print("[yellow]Recursion-to-loop rewrite timed out; reverting it and asking the LLM.[/yellow]")
+                    current_code, (error_type, line_number, message) = rewritten_from
+                    use_heuristics = False
+                rewritten_from = None
+
+                hints = None
+                if known:
+                    # Cycle: back off to the most promising earlier state and tell the LLM what was tried
+                    best = self.tracker.best_failure()
+                    self.console.print(f"[yellow]Cycle detected. Backtracking to the state from iteration {best.iteration}.[/yellow]")
+                    current_code = self._restore(best.code)
+                    error_type, line_number, message = best.analysis
+                    result = best.result
+                    hints = self.tracker.hints()
             
-            if not patch:
-                self.console.print("[red]No patch generated.[/red]")
-                self.logger.add_trace(i, f"{error_type}: {message}", "No patch strategy found", "None", False)
-                break
+                # Failures raised inside another workspace file are patched in that file
+                target = self._failing_file(result)
+                target_code = self.workspace.read(target) if target else current_code
+                if target:
+                    self.console.print(f"Failure is in project file [bold]{target}[/bold]; patching it.")
             
-            # 4. Apply Patch
-            new_code = patch
-            self.logger.add_trace(i, f"{error_type}: {message}", strategy, patch, False)
-            current_code = new_code
+                # 3. Generate Patch (known fixes are tried in the sandbox before any LLM call)
+                patch, strategy, verified_result = (None, None, None) if target else self._try_knowledge_base(current_code, error_type, line_number, message)
+                if not patch:
+                    model = self.cascade.select("repair", error_type, self.escalation.get(error_type, 0))
+                    patch, strategy = self.patch_engine.generate_patch(target_code, error_type, line_number, message, model=model,
+                                                                       hints=hints, use_heuristics=use_heuristics and not hints)
+                    if patch and self.tracker.is_known_failure(self._state(current_code, target, patch)):
+                        # The patch leads back to a state that already failed: ask the LLM for something new instead
+                        self.console.print("[yellow]Patch reproduces an already failed state. Asking for a different fix...[/yellow]")
+                        patch, strategy = self.patch_engine.generate_patch(target_code, error_type, line_number, message, model=model,
+                                                                           hints=self.tracker.hints(), use_heuristics=False)
+            
+                if not patch:
+                    self.console.print("[red]No patch generated.[/red]")
+                    self.logger.add_trace(i, f"{error_type}: {message}", "No patch strategy found", "None", False)
+                    self._out_of_budget(current_code)
+                    break
+            
+                # 4. Apply Patch
+                if target:
+                    self.workspace.write(target, patch)
+                    strategy = f"{strategy} [{target}]"
+                else:
+                    if strategy == "Heuristic: Recursion To Iteration":
+                        rewritten_from = (current_code, (error_type, line_number, message))
+                    current_code = patch
+                self.logger.add_trace(i, f"{error_type}: {message}", strategy, patch, False)
+                if strategy.startswith("Ollama"):
+                    pending_llm = (error_type, model)
+                self._save_checkpoint("repair", i + 1, current_code, pending_llm=pending_llm, first_failure=first_failure)
             
-        else:
-            # Loop finished without break (max iterations reached)
-            self.console.print("\n[bold orange3]Max iterations reached. Running final verification...[/bold orange3]")
-            result = self.sandbox.run(current_code)
-            if result.return_code == 0:
-                self.console.print(Panel("[bold green]Success! Final patch worked.[/bold green]", title="Final Verification"))
-                self.logger.log_repaired_code(current_code)
-                self.logger.set_best_attempt(current_code, "Success (Final)")
-                success_code = current_code
             else:
-                self.console.print(f"[bold red]Final run failed (Return Code: {result.return_code}).[/bold red]")
-                self.logger.set_best_attempt(current_code, "Max iterations reached & Final run failed")
-                self.logger.save()
-                return
+                # Loop finished without break (max iterations reached)
+                self.console.print("\n[bold orange3]Max iterations reached. Running final verification...[/bold orange3]")
+                known = self.tracker.get(self._state(current_code))
+                result = known.result if known else self.sandbox.run(current_code)
+                if pending_llm:
+                    self._record_repair(pending_llm, result.return_code == 0)
+                if result.return_code == 0:
+                    self.console.panel("[bold green]Success! Final patch worked.[/bold green]", title="Final Verification")
+                    self.logger.log_repaired_code(current_code)
+                    self.logger.set_best_attempt(current_code, "Success (Final)")
+                    success_code = current_code
+                    self._learn_repair(first_failure, success_code)
+                else:
+                    self.console.print(f"[bold red]Final run failed (Return Code: {result.return_code}).[/bold red]")
+                    self.logger.set_best_attempt(current_code, "Max iterations reached & Final run failed")
+                    self.save_report()
+                    self._save_checkpoint("done", self.max_iterations, current_code)
+                    return
+
+            if success_code:
+                self._save_checkpoint("logic_repair" if self.description else "optimization", self.max_iterations, current_code,
+                                      success_code=success_code)
 
         # --- Logic Repair or Optimization Phase ---
         if success_code:
+            if self.budget:
+                self.budget.begin("logic_repair" if self.description else "optimization")
             # Check if user provided a description (Logic Repair Mode)
             if self.description:
                 self.console.print("\n[bold cyan]--- Logic Repair Mode ---[/bold cyan]")
                 self.console.print(f"User Description: {self.description}")
-                
-                repaired_code = self.patch_engine.get_logic_repair_prompt(success_code, self.description)
-                
-                if repaired_code:
-                    self.console.print("Logic repair proposed. Testing...")
-                    
-                    # Test the repaired code
-                    result = self.sandbox.run(repaired_code)
-                    
-                    if result.return_code == 0:
-                        self.console.print(Panel("[bold green]Logic Repair Successful![/bold green]", title="Repair Success"))
-                        self.logger.log_repaired_code(repaired_code)
-                        self.logger.add_trace(self.max_iterations + 1, "Logic Repair", f"LLM Logic Repair: {self.description}", repaired_code, True, "Accepted")
-                        self.save_fixed_code(repaired_code)
-                    else:
-                        self.console.print(Panel("[bold red]Logic Repair Failed.[/bold red]", title="Repair Failed"))
-                        self.console.print(f"[red]Repaired code failed execution.[/red]")
-                        self.logger.add_trace(self.max_iterations + 1, "Logic Repair", f"LLM Logic Repair: {self.description}", repaired_code, False, "Failed: Code did not execute")
-                        self.logger.log_repaired_code(success_code)
-                        self.save_fixed_code(success_code)
-                else:
-                    self.console.print("[yellow]Logic repair failed to generate valid output.[/yellow]")
-                    self.save_fixed_code(success_code)
+                self.run_logic_repair(success_code)
             else:
-                # No description provided, proceed with Optimization Mode (existing logic)
+                # No description provided, proceed with Optimization Mode
                 self.console.print("\n[bold magenta]--- Optimization Pass ---[/bold magenta]")
-                opt_data = self.patch_engine.optimize_code(success_code)
+                self.run_optimization(success_code)
+        
+        self.save_report()
+        self._save_checkpoint("done", self.max_iterations, success_code or current_code, success_code=success_code)
+
+    def _out_of_budget(self, current_code) -> bool:
+        """
+        Whether the session budget ran out during repair. If so, the best state actually run
+        (the failing state that got furthest) becomes the reported best attempt.
+        """
+        if not (self.budget and self.budget.exhausted()):
+            return False
+        best = self.tracker.best_failure()
+        code = self._restore(best.code) if best else current_code
+        self.console.print(f"[bold orange3]Session budget exhausted ({self.budget.reason}); stopping with the best verified state"
+                           f"{f' from iteration {best.iteration}' if best else ''}.[/bold orange3]")
+        self.logger.set_best_attempt(code, f"Budget exhausted: {self.budget.reason}" + (f"; best state failed with {best.summary()}" if best else ""))
+        return True
+
+    def _phase_out_of_budget(self) -> bool:
+        """Whether a logic repair/optimization phase ran out of budget; the verified program is kept."""
+        if not (self.budget and self.budget.exhausted()):
+            return False
+        self.console.print(f"[bold orange3]Session budget exhausted ({self.budget.reason}); keeping the verified program.[/bold orange3]")
+        return True
+
+    def _skip_for_budget(self, step: str) -> bool:
+        """Whether the budget ran out before `step` (sandbox verification or benchmarking), which is then skipped."""
+        if not (self.budget and self.budget.exhausted()):
+            return False
+        self.console.print(f"[bold orange3]Session budget exhausted ({self.budget.reason}); skipping {step}.[/bold orange3]")
+        return True
+
+    def _save_checkpoint(self, phase: str, iteration: int, current_code: str, success_code: str = None,
+                         pending_llm=None, first_failure=None):
+        """
+        Saves everything needed to continue after `phase` at `iteration`: code, explored states,
+        report so far and escalation counts. Finished LLM calls are only in here, never repeated.
+        """
+        if not self.checkpoint:
+            return
+        self._checkpoint_state = {
+            "phase": phase,
+            "iteration": iteration,
+            "script_path": self.script_path,
+            "description": self.description,
+            "optimize": self.optimize,
+            "workspace": {"project": self.workspace.root, "entry": self.workspace.entry,
+                          "overrides": dict(self.workspace.overrides)} if self.workspace else None,
+            "current_code": current_code,
+            "success_code": success_code,
+            "pending_llm": pending_llm,
+            "first_failure": first_failure,
+            "escalation": self.escalation,
+            "tracker": encode_tracker(self.tracker),
+            "report": self.logger.report,
+            "telemetry": self.telemetry.snapshot(),
+            "started_at": self.started_at,
+            "phase_replies": self.phase_replies,
+        }
+        self.checkpoint.save(self._checkpoint_state)
+
+    def _phase_call(self, key: str, fn, *args, **kwargs):
+        """
+        Runs an LLM call of the logic repair/optimization phase, or returns its result from before
+        a resume. Each result is checkpointed as soon as it arrives (failed calls are retried).
+        """
+        if key in self.phase_replies:
+            self.console.print(f"[dim]Reusing the {key.replace('_', ' ')} result saved before the session was interrupted.[/dim]")
+            return self.phase_replies[key]
+        value = fn(*args, **kwargs)
+        if value and self.checkpoint and self._checkpoint_state:
+            self.phase_replies[key] = value
+            self.checkpoint.save({**self._checkpoint_state, "phase_replies": self.phase_replies, "telemetry": self.telemetry.snapshot()})
+        return value
+
+    def _restore_checkpoint(self, state: dict):
+        """Restores a checkpoint; returns (current_code, next iteration, success_code, pending_llm, first_failure)."""
+        self.escalation = dict(state["escalation"])
+        self.tracker = decode_tracker(state["tracker"])
+        self.logger.report = state["report"]
+        self.telemetry.restore(state["telemetry"])
+        self.started_at = state.get("started_at", self.started_at)
+        self.phase_replies = dict(state.get("phase_replies") or {})
+        self._checkpoint_state = {k: v for k, v in state.items() if k not in ("version", "session", "saved_at")}
+        if self.workspace and state.get("workspace"):
+            self.workspace.overrides = dict(state["workspace"]["overrides"])
+        pending_llm = tuple(state["pending_llm"]) if state.get("pending_llm") else None
+        first_failure = tuple(state["first_failure"]) if state.get("first_failure") else None
+        return state["current_code"], state["iteration"], state.get("success_code"), pending_llm, first_failure
+
+    def start_prewarm(self):
+        """Warms the first tier of each phase this session can reach, in background threads."""
+        if not self.prewarm:
+            return
+        phases = ["repair", "logic_repair" if self.description else "optimization"]
+        models = []
+        for phase in phases:
+            tiers = self.cascade.tiers.get(phase, [])
+            if tiers and tiers[0] not in models:
+                models.append(tiers[0])
+        if not models:
+            return
+        pool = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="prewarm")
+        for model in models:
+            pool.submit(self.patch_engine.warm, model)
+        # Do not wait: the session continues while models load
+        pool.shutdown(wait=False)
+
+    def _state(self, code: str, target: str = None, target_code: str = None):
+        """The program state the tracker keys on: the code, or every file of a workspace session."""
+        if not self.workspace:
+            return target_code if target_code is not None else code
+        state = self.workspace.state(code)
+        if target:
+            state[target] = target_code
+        return state
+    
+    def _restore(self, state) -> str:
+        """Returns to a tracked state and gives back its entry point code."""
+        return self.workspace.restore(state) if self.workspace else state
+    
+    def _failing_file(self, result):
+        """Workspace file (other than the entry point) the failure was raised in, or hung in, if any."""
+        if not self.workspace:
+            return None
+        if result.timed_out:
+            target = result.hang.file if result.hang else None
+        else:
+            target = self.workspace.locate(result.stderr)
+        return target if target and target != self.workspace.entry else None
+
+    def _try_knowledge_base(self, code: str, error_type: str, line_number, message: str):
+        """
+        Adapts stored fixes for this failure and runs them in the sandbox.
+        Returns (patch, strategy, result) for the first candidate that executes, else (None, None, None).
+        """
+        if not self.knowledge_base:
+            return None, None, None
+        for candidate, entry in self.knowledge_base.suggest(code, error_type, line_number, message):
+            self.console.print(f"Trying known fix from knowledge base ({entry.get('source') or 'learned'})...")
+            result = self.sandbox.run(candidate)
+            self.knowledge_base.mark(entry, result.return_code == 0)
+            if result.return_code == 0:
+                return candidate, f"Knowledge Base ({entry.get('source') or 'learned'})", result
+        return None, None, None
+
+    def _learn_repair(self, first_failure, success_code: str):
+        """Indexes the accepted repair so the next session with the same failure starts warm."""
+        if not self.knowledge_base or not first_failure:
+            return
+        if self.workspace and self.workspace.overrides:
+            # The fix spans other project files; a single-file entry would not reproduce it
+            return
+        code, error_type, line_number, message = first_failure
+        self.knowledge_base.record(code, error_type, line_number, message, success_code, source=os.path.basename(self.script_path))
+
+    def _record_repair(self, pending_llm, success: bool):
+        """Feeds the sandbox verdict on an LLM patch back into the cascade and escalates on failure."""
+        error_type, model = pending_llm
+        self.cascade.record("repair", error_type, model, success)
+        if not success:
+            self.escalation[error_type] = self.escalation.get(error_type, 0) + 1
+
+    def run_logic_repair(self, success_code: str):
+        """Tries each logic repair tier, cheapest first, until one executes successfully."""
+        models = self.cascade.models_for("logic_repair", "LogicRepair")
+        for model in models:
+            repaired_code = self._phase_call(f"logic_repair:{model}", self.patch_engine.get_logic_repair_prompt,
+                                                 success_code, self.description, model=model)
+            
+            if not repaired_code:
+                self.console.print(f"[yellow]Logic repair ({model}) failed to generate valid output.[/yellow]")
+                if self._phase_out_of_budget():
+                    break
+                self.cascade.record("logic_repair", "LogicRepair", model, False)
+                continue
+            
+            if self._skip_for_budget("testing the logic repair"):
+                break
+            self.console.print(f"Logic repair proposed by {model}. Testing...")
+            
+            # Test the repaired code
+            result = self.sandbox.run(repaired_code)
+            
+            if result.return_code == 0:
+                self.console.panel("[bold green]Logic Repair Successful![/bold green]", title="Repair Success")
+                self.cascade.record("logic_repair", "LogicRepair", model, True)
+                self.logger.log_repaired_code(repaired_code)
+                self.logger.add_trace(self.max_iterations + 1, "Logic Repair", f"LLM Logic Repair ({model}): {self.description}", repaired_code, True, "Accepted")
+                self.save_fixed_code(repaired_code)
+                return
+            
+            self.console.panel("[bold red]Logic Repair Failed.[/bold red]", title="Repair Failed")
+            self.console.print(f"[red]Repaired code from {model} failed execution.[/red]")
+            self.cascade.record("logic_repair", "LogicRepair", model, False)
+            self.logger.add_trace(self.max_iterations + 1, "Logic Repair", f"LLM Logic Repair ({model}): {self.description}", repaired_code, False, "Failed: Code did not execute")
+        
+        self.logger.log_repaired_code(success_code)
+        self.save_fixed_code(success_code)
+
+    def run_optimization(self, success_code: str):
+        """Tries each optimization tier, cheapest first, until one passes verification."""
+        if self.optimize == "memory":
+            return self.run_memory_optimization(success_code)
+        static_code, open_findings = self.run_static_optimization(success_code)
+        if static_code is not None:
+            if not open_findings:
+                self.console.print("Static rewrites left nothing for the LLM; skipping LLM optimization.")
+                self.logger.log_repaired_code(static_code)
+                self.save_fixed_code(static_code)
+                return
+            # The LLM starts from the verified rewrite and only has to handle what the rules could not
+            success_code = static_code
+        if self.candidates > 1:
+            return self.run_parallel_optimization(success_code)
+        focus = "Fix these flagged anti-patterns: " + "; ".join(f.describe() for f in open_findings) if open_findings else None
+        models = self.cascade.models_for("optimization", "Optimization")
+        for model in models:
+            opt_data = self._phase_call(f"optimization:{model}", self.patch_engine.optimize_code, success_code, model=model, strategy=focus)
+            
+            if not (opt_data and "optimized_code" in opt_data):
+                self.console.print(f"[yellow]Optimization ({model}) failed to generate valid output.[/yellow]")
+                if self._phase_out_of_budget():
+                    break
+                self.cascade.record("optimization", "Optimization", model, False)
+                continue
+            
+            optimized_code = opt_data["optimized_code"]
+            if self._skip_for_budget("verifying the optimization"):
+                break
+            self.console.print(f"Optimization proposed by {model}. Verifying...")
+            
+            # Verify Optimization
+            verified, reason = self.patch_engine.verify_optimization(success_code, optimized_code, self.sandbox)
+            self.cascade.record("optimization", "Optimization", model, verified)
+            
+            if verified:
+                self.console.panel("[bold green]Optimization Verified![/bold green]", title="Optimization Success")
+                self.console.print(f"Complexity: {opt_data.get('original_complexity')} -> {opt_data.get('optimized_complexity')}")
+                self.console.print(f"Changes: {', '.join(opt_data.get('changes_summary', []))}")
                 
-                if opt_data and "optimized_code" in opt_data:
-                    optimized_code = opt_data["optimized_code"]
-                    self.console.print(f"Optimization proposed. Verifying...")
-                    
-                    # Verify Optimization
-                    verified, reason = self.patch_engine.verify_optimization(success_code, optimized_code, self.sandbox)
-                    
-                    if verified:
-                        self.console.print(Panel("[bold green]Optimization Verified![/bold green]", title="Optimization Success"))
-                        self.console.print(f"Complexity: {opt_data.get('original_complexity')} -> {opt_data.get('optimized_complexity')}")
-                        self.console.print(f"Changes: {', '.join(opt_data.get('changes_summary', []))}")
-                        
-                        # Save optimized code
-                        self.logger.log_optimization(
-                            opt_data.get('original_complexity'),
-                            opt_data.get('optimized_complexity'),
-                            opt_data.get('changes_summary'),
-                            optimized_code
-                        )
-                        self.logger.log_repaired_code(optimized_code) # Update main repaired code to optimized version
-                        self.logger.add_trace(self.max_iterations + 1, "Optimization", "LLM Optimization", optimized_code, True, "Accepted")
-                        self.save_fixed_code(optimized_code)
-                    else:
-                        self.console.print(Panel("[bold red]Optimization Rejected.[/bold red]", title="Optimization Failed"))
-                        self.console.print(f"[red]Reason: {reason}[/red]")
-                        self.logger.add_trace(self.max_iterations + 1, "Optimization", "LLM Optimization", optimized_code, False, f"Rejected: {reason}")
-                        self.logger.log_repaired_code(success_code)
-                        self.save_fixed_code(success_code)
+                # Save optimized code
+                self.logger.log_optimization(
+                    opt_data.get('original_complexity'),
+                    opt_data.get('optimized_complexity'),
+                    opt_data.get('changes_summary'),
+                    optimized_code
+                )
+                self.logger.log_repaired_code(optimized_code) # Update main repaired code to optimized version
+                self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Optimization ({model})", optimized_code, True, "Accepted")
+                self.save_fixed_code(optimized_code)
+                return
+            
+            self.console.panel("[bold red]Optimization Rejected.[/bold red]", title="Optimization Failed")
+            self.console.print(f"[red]Reason: {reason}[/red]")
+            self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Optimization ({model})", optimized_code, False, f"Rejected: {reason}")
+        
+        self.logger.log_repaired_code(success_code)
+        self.save_fixed_code(success_code)
+
+    def run_static_optimization(self, success_code: str):
+        """
+        Applies the deterministic rewrites (anti-pattern rules, then recursion transforms), each
+        verified like any other optimization. Returns (verified rewrite or None, findings left open).
+        """
+        findings = find_antipatterns(success_code)
+        code, applied, metrics = success_code, [], {}
+        if findings:
+            self.console.print(f"Static analysis flagged {len(findings)} anti-pattern(s):")
+            for finding in findings:
+                fix = "rule rewrite" if finding.fixable else "left to the LLM"
+                self.console.print(f"  {finding.describe()} - {fix}")
+            
+            rewritten, rule_fixes = apply_rewrites(success_code)
+            if rule_fixes and not self._skip_for_budget("verifying the rule rewrites"):
+                strategy = f"Static Rewrite ({', '.join(sorted({f.rule for f in rule_fixes}))})"
+                verified, reason = self.patch_engine.verify_optimization(success_code, rewritten, self.sandbox)
+                if verified:
+                    self.logger.add_trace(self.max_iterations + 1, "Optimization", strategy, rewritten, True, "Accepted")
+                    code = rewritten
+                    applied.extend(rule_fixes)
                 else:
-                    self.console.print("[yellow]Optimization failed to generate valid output.[/yellow]")
-                    self.save_fixed_code(success_code)
+                    self.console.print(f"[yellow]Rule rewrites rejected: {reason}[/yellow]")
+                    self.logger.add_trace(self.max_iterations + 1, "Optimization", strategy, rewritten, False, f"Rejected: {reason}")
         
-        self.logger.save()
+        code, recursion_fixes, metrics = self._optimize_recursion(code)
+        applied.extend(recursion_fixes)
+        if not applied:
+            return None, findings
+        
+        self.console.panel(f"[bold green]{len(applied)} static rewrite(s) verified.[/bold green]", title="Static Optimization")
+        original_complexity, optimized_complexity = applied[0].complexity.split(" -> ")
+        open_findings = find_antipatterns(code)
+        self.logger.log_optimization(
+            original_complexity,
+            optimized_complexity,
+            [f.describe() for f in applied],
+            code,
+            rule_rewrites=len(applied),
+            open_findings=[f.describe() for f in open_findings],
+            **metrics
+        )
+        return code, open_findings
+
+    def _optimize_recursion(self, code: str):
+        """
+        Tries memoization and recursion-to-loop rewrites, keeping each one whose output matches
+        and whose measured runtime is at least MIN_TRANSFORM_SPEEDUP times faster.
+        Returns (code, applied findings, speedup metrics of the last accepted transform).
+        """
+        applied, metrics = [], {}
+        for transform in RECURSION_TRANSFORMS:
+            candidate = transform(code)
+            if not candidate:
+                continue
+            finding, transformed = candidate
+            if self._skip_for_budget("the recursion transforms"):
+                break
+            self.console.print(f"Recursion transform: {finding.describe()}. Verifying and benchmarking...")
+            strategy = f"Static Rewrite ({finding.rule})"
+            verified, reason = self.patch_engine.verify_optimization(code, transformed, self.sandbox)
+            if verified and self._skip_for_budget("benchmarking the recursion transform"):
+                break
+            if verified:
+                original_runtime, runtime = self.patch_engine.benchmark(code, transformed, self.sandbox)
+                speedup = round(original_runtime / runtime, 3) if runtime > 0 else 0
+                if speedup >= MIN_TRANSFORM_SPEEDUP:
+                    self.console.print(f"  accepted: {original_runtime:.4f}s -> {runtime:.4f}s ({speedup}x)")
+                    self.logger.add_trace(self.max_iterations + 1, "Optimization", strategy, transformed, True, "Accepted")
+                    code = transformed
+                    applied.append(finding)
+                    metrics = {"speedup": speedup, "original_runtime": round(original_runtime, 5), "optimized_runtime": round(runtime, 5)}
+                    continue
+                reason = f"No measurable speedup ({speedup}x, need {MIN_TRANSFORM_SPEEDUP}x)"
+            self.console.print(f"  rejected: {reason.splitlines()[0]}")
+            self.logger.add_trace(self.max_iterations + 1, "Optimization", strategy, transformed, False, f"Rejected: {reason}")
+        return code, applied, metrics
+
+    def run_memory_optimization(self, success_code: str):
+        """Profiles peak memory, then tries each optimization tier until one lowers the measured peak."""
+        if self._skip_for_budget("memory optimization"):
+            self.logger.log_repaired_code(success_code)
+            self.save_fixed_code(success_code)
+            return
+        self.console.print("Profiling memory with tracemalloc...")
+        sites = self.sandbox.profile_memory(success_code, top=5)
+        baseline = self.sandbox.profile_memory(success_code)
+        if baseline.peak_bytes is None:
+            self.console.print(f"[yellow]Memory profiling failed; skipping memory optimization.[/yellow] {baseline.result.stderr.strip()}")
+            self.logger.log_repaired_code(success_code)
+            self.save_fixed_code(success_code)
+            return
+        sites.peak_bytes = baseline.peak_bytes
+        self.console.print(f"Peak traced memory: {baseline.peak_bytes / 1024:.1f} KiB")
+        for site in sites.sites:
+            self.console.print(f"  line {site['line']} ({site['file']}): {site['size_bytes'] / 1024:.1f} KiB in {site['count']} blocks")
+        
+        models = self.cascade.models_for("optimization", "MemoryOptimization")
+        for model in models:
+            opt_data = self._phase_call(f"memory_optimization:{model}", self.patch_engine.optimize_memory, success_code, sites, model=model)
+            
+            if not (opt_data and "optimized_code" in opt_data):
+                self.console.print(f"[yellow]Memory optimization ({model}) failed to generate valid output.[/yellow]")
+                if self._phase_out_of_budget():
+                    break
+                self.cascade.record("optimization", "MemoryOptimization", model, False)
+                continue
+            
+            optimized_code = opt_data["optimized_code"]
+            if self._skip_for_budget("verifying the memory optimization"):
+                break
+            self.console.print(f"Memory optimization proposed by {model}. Verifying...")
+            verified, reason, metrics = self.patch_engine.verify_memory_optimization(
+                success_code, optimized_code, self.sandbox, original_peak=baseline.peak_bytes)
+            self.cascade.record("optimization", "MemoryOptimization", model, verified)
+            
+            if verified:
+                self.console.panel("[bold green]Memory Optimization Verified![/bold green]", title="Optimization Success")
+                self.console.print(f"Peak memory: {metrics['original_peak_bytes'] / 1024:.1f} KiB -> "
+                                   f"{metrics['optimized_peak_bytes'] / 1024:.1f} KiB ({metrics['peak_reduction']:.0%} less)")
+                self.console.print(f"Changes: {', '.join(opt_data.get('changes_summary', []))}")
+                self.logger.log_optimization(
+                    opt_data.get('original_complexity'),
+                    opt_data.get('optimized_complexity'),
+                    opt_data.get('changes_summary'),
+                    optimized_code,
+                    goal="memory",
+                    allocation_sites=sites.sites,
+                    **metrics
+                )
+                self.logger.log_repaired_code(optimized_code)
+                self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Memory Optimization ({model})", optimized_code, True, "Accepted")
+                self.save_fixed_code(optimized_code)
+                return
+            
+            self.console.panel("[bold red]Memory Optimization Rejected.[/bold red]", title="Optimization Failed")
+            self.console.print(f"[red]Reason: {reason}[/red]")
+            self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Memory Optimization ({model})", optimized_code, False, f"Rejected: {reason}")
+        
+        self.logger.log_repaired_code(success_code)
+        self.save_fixed_code(success_code)
+
+    def run_parallel_optimization(self, success_code: str):
+        """
+        Requests several optimization candidates concurrently per tier, verifies them in parallel
+        sandboxes, benchmarks the verified ones one at a time, and keeps the fastest if it is at least
+        MIN_TRANSFORM_SPEEDUP times faster than the original.
+        """
+        table = []
+        for model in self.cascade.models_for("optimization", "Optimization"):
+            self.console.print(f"Requesting {self.candidates} optimization candidates from {model}...")
+            candidates = self._phase_call(f"optimization_candidates:{model}", self.patch_engine.optimize_candidates,
+                                          success_code, self.candidates, model=model)
+            if not candidates:
+                self.console.print(f"[yellow]Optimization ({model}) failed to generate valid output.[/yellow]")
+                if self._phase_out_of_budget():
+                    break
+                self.cascade.record("optimization", "Optimization", model, False)
+                continue
+            
+            if self._skip_for_budget("verifying the candidates"):
+                break
+            self.console.print(f"Verifying and benchmarking {len(candidates)} candidates...")
+            rows = self.patch_engine.evaluate_candidates(success_code, candidates, self.sandbox)
+            for row in rows:
+                row["model"] = model
+            table.extend(rows)
+            self.logger.log_optimization_candidates(table)
+            
+            for row in rows:
+                speedup = f"{row['speedup']}x" if row["speedup"] else "-"
+                verdict = "[green]verified[/green]" if row["verified"] else f"[red]{row['reason'].splitlines()[0]}[/red]"
+                self.console.print(f"  #{row['candidate']} {speedup:>8} {row['runtime']:.4f}s  {verdict}  ({row['strategy']})")
+            
+            # A verified candidate that is not measurably faster would deliver code slower than the user's
+            passing = [(row, c) for row, c in zip(rows, candidates)
+                       if row["verified"] and row["speedup"] and row["speedup"] >= MIN_TRANSFORM_SPEEDUP]
+            self.cascade.record("optimization", "Optimization", model, bool(passing))
+            if not passing:
+                self.console.panel("[bold red]All optimization candidates rejected.[/bold red]", title="Optimization Failed")
+                for row, c in zip(rows, candidates):
+                    reason = row["reason"] if not row["verified"] else f"No measurable speedup ({row['speedup']}x, need {MIN_TRANSFORM_SPEEDUP}x)"
+                    self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Optimization ({model}, candidate {row['candidate']})", c["optimized_code"], False, f"Rejected: {reason}")
+                continue
+            
+            best_row, best = min(passing, key=lambda pair: pair[0]["runtime"])
+            optimized_code = best["optimized_code"]
+            self.console.panel(f"[bold green]Candidate #{best_row['candidate']} selected ({best_row['speedup']}x).[/bold green]", title="Optimization Success")
+            self.logger.log_optimization(
+                best.get('original_complexity'),
+                best.get('optimized_complexity'),
+                best.get('changes_summary'),
+                optimized_code,
+                speedup=best_row["speedup"],
+                original_runtime=best_row["original_runtime"],
+                optimized_runtime=best_row["runtime"],
+                selected_candidate=best_row["candidate"]
+            )
+            self.logger.log_repaired_code(optimized_code)
+            self.logger.add_trace(self.max_iterations + 1, "Optimization", f"LLM Optimization ({model}, candidate {best_row['candidate']})", optimized_code, True, "Accepted")
+            self.save_fixed_code(optimized_code)
+            return
+        
+        self.logger.log_repaired_code(success_code)
+        self.save_fixed_code(success_code)
@@ -0,0 +1,188 @@
+import math
+import re
+import sqlite3
+import time
+from typing import List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    script TEXT NOT NULL,
+    model TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    error_type TEXT,
+    iterations INTEGER NOT NULL,
+    time_to_fix REAL,
+    wall_seconds REAL NOT NULL,
+    llm_calls INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    sandbox_runs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS iterations (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    iteration INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    error_type TEXT,
+    strategy TEXT NOT NULL,
+    strategy_kind TEXT NOT NULL,
+    model TEXT,
+    success INTEGER NOT NULL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_error_type ON sessions(error_type, success);
+CREATE INDEX IF NOT EXISTS idx_sessions_model_time ON sessions(model, time_to_fix);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_script ON sessions(script, wall_seconds, tokens);
+CREATE INDEX IF NOT EXISTS idx_iterations_strategy ON iterations(strategy_kind, success);
+CREATE INDEX IF NOT EXISTS idx_iterations_session ON iterations(session_id);
+"""
+
+# "Ollama (qwen2.5-coder:7b)" -> kind "Ollama", model "qwen2.5-coder:7b"; a trailing "[file]" names a patched workspace file
+_DETAIL = re.compile(r"\s*\(([^)]*)\)")
+_FILE_SUFFIX = re.compile(r"\s*\[[^\]]*\]$")
+_LLM_KINDS = ("Ollama", "LLM Optimization", "LLM Memory Optimization", "LLM Logic Repair")
+
+def split_strategy(strategy: str):
+    """Splits a trace strategy into its kind (the part analytics group by) and the model, if any."""
+    strategy = _FILE_SUFFIX.sub("", strategy or "")
+    match = _DETAIL.search(strategy)
+    if not match:
+        return strategy, None
+    kind = strategy[:match.start()].strip()
+    model = match.group(1).split(",")[0].strip() if kind in _LLM_KINDS else None
+    return kind, model
+
+def _phase(trace: dict) -> str:
+    if trace["error_type"] == "Optimization":
+        return "optimization"
+    if trace["error_type"] == "Logic Repair":
+        return "logic_repair"
+    return "repair"
+
+class HistoryStore:
+    """
+    SQLite history of debugging sessions and their iterations.
+    Aggregate queries are answered from indexes so they stay fast with hundreds of thousands of sessions.
+    """
+    def __init__(self, path: str = "debug_history.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def record_session(self, script: str, model: str, report: dict, started_at: Optional[str] = None) -> int:
+        """
+        Stores a finished session from its (full format) report. Returns the session id.
+        The session's model is the cascade tier whose patch was accepted (the last verified LLM
+        repair, else an accepted LLM logic repair or optimization); `model` is used when no LLM
+        call produced the result. Every call's model stays in the iterations table.
+        """
+        traces = report.get("traces", [])
+        telemetry = report.get("telemetry") or {}
+        success = bool(report.get("repaired_code"))
+        optimized = any(t["error_type"] == "Optimization" and t["status"] == "Accepted" for t in traces)
+        logic = any(t["error_type"] == "Logic Repair" and t["status"] == "Accepted" for t in traces)
+        outcome = "optimized" if optimized else "logic_repaired" if logic else "repaired" if success else "failed"
+
+        repair_traces = [t for t in traces if _phase(t) == "repair"]
+        failures = [t for t in repair_traces if t["error_type"] not in ("None", "Unknown")]
+        error_type = failures[0]["error_type"].split(":")[0] if failures else None
+        wall = telemetry.get("wall_seconds", 0.0)
+
+        rows = []
+        for index, trace in enumerate(traces):
+            if trace["strategy"] == "Code ran successfully":
+                continue
+            phase = _phase(trace)
+            if phase == "repair":
+                # A repair patch succeeded if the next run was clean (or it was the last patch of a fixed session)
+                following = traces[index + 1] if index + 1 < len(traces) else None
+                if following and _phase(following) == "repair":
+                    verified = following["error_type"] == "None"
+                else:
+                    verified = success and trace["patch"] != "None"
+            else:
+                verified = bool(trace["success"])
+            kind, model_used = split_strategy(trace["strategy"])
+            rows.append((trace["iteration"], phase, trace["error_type"].split(":")[0], trace["strategy"], kind,
+                         model_used, int(verified), trace.get("status")))
+
+        repaired_by = [model_used for _, phase, _, _, _, model_used, verified, _ in rows if phase == "repair" and model_used and verified]
+        improved_by = [model_used for _, phase, _, _, _, model_used, verified, _ in rows if phase != "repair" and model_used and verified]
+        model = (repaired_by[-1:] or improved_by[:1] or [model])[0]
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO sessions (script, model, started_at, outcome, success, error_type, iterations, time_to_fix,"
+                " wall_seconds, llm_calls, tokens, sandbox_runs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (script, model, started_at or time.strftime("%Y-%m-%d %H:%M:%S"), outcome, int(success), error_type,
+                 max([t["iteration"] for t in repair_traces] or [0]), wall if success else None, wall,
+                 telemetry.get("llm_calls", 0), telemetry.get("prompt_tokens", 0) + telemetry.get("completion_tokens", 0),
+                 telemetry.get("sandbox_runs", 0)),
+            )
+            session_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO iterations (session_id, iteration, phase, error_type, strategy, strategy_kind, model, success, status)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(session_id,) + row for row in rows],
+            )
+        return session_id
+
+    @staticmethod
+    def _since(since: Optional[str], column: str = "started_at"):
+        return (f" AND {column} >= ?", [since]) if since else ("", [])
+
+    def strategy_success(self) -> List[dict]:
+        """Success rate per strategy kind (Ollama, Heuristic: ..., Knowledge Base, LLM Optimization, ...)."""
+        rows = self.conn.execute(
+            "SELECT strategy_kind, COUNT(*), SUM(success) FROM iterations GROUP BY strategy_kind ORDER BY COUNT(*) DESC"
+        ).fetchall()
+        return [{"strategy": kind, "attempts": n, "successes": ok, "success_rate": round(ok / n, 4)} for kind, n, ok in rows]
+
+    def error_types(self, since: Optional[str] = None) -> List[dict]:
+        where, params = self._since(since)
+        rows = self.conn.execute(
+            f"SELECT error_type, COUNT(*), SUM(success) FROM sessions WHERE error_type IS NOT NULL{where}"
+            " GROUP BY error_type ORDER BY COUNT(*) DESC", params
+        ).fetchall()
+        return [{"error_type": e, "sessions": n, "success_rate": round(ok / n, 4)} for e, n, ok in rows]
+
+    def percentile_time_to_fix(self, percentile: float = 0.95) -> List[dict]:
+        """Per-model percentile of time-to-fix, read straight off the (model, time_to_fix) index."""
+        results = []
+        models = [row[0] for row in self.conn.execute("SELECT DISTINCT model FROM sessions")]
+        for model in models:
+            n = self.conn.execute(
+                "SELECT COUNT(time_to_fix) FROM sessions WHERE model = ? AND time_to_fix IS NOT NULL", (model,)
+            ).fetchone()[0]
+            if not n:
+                continue
+            offset = max(math.ceil(percentile * n) - 1, 0)
+            value = self.conn.execute(
+                "SELECT time_to_fix FROM sessions WHERE model = ? AND time_to_fix IS NOT NULL"
+                " ORDER BY time_to_fix LIMIT 1 OFFSET ?", (model, offset)
+            ).fetchone()[0]
+            results.append({"model": model, "sessions": n, f"p{round(percentile * 100)}_time_to_fix": round(value, 4)})
+        return results
+
+    def expensive_scripts(self, limit: int = 10, by: str = "wall_seconds") -> List[dict]:
+        if by not in ("wall_seconds", "tokens"):
+            raise ValueError("by must be 'wall_seconds' or 'tokens'")
+        rows = self.conn.execute(
+            f"SELECT script, COUNT(*), SUM({by}), AVG({by}) FROM sessions GROUP BY script ORDER BY SUM({by}) DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [{"script": s, "sessions": n, f"total_{by}": round(total, 4), f"mean_{by}": round(mean, 4)} for s, n, total, mean in rows]
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        cursor = self.conn.execute(
+            "SELECT id, started_at, script, model, outcome, error_type, iterations, wall_seconds, llm_calls"
+            " FROM sessions ORDER BY started_at DESC LIMIT ?", (limit,)
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,241 @@
+import ast
+import builtins
+import copy
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+BUILTIN_NAMES = set(dir(builtins))
+
+def error_signature(error_type: str, message: Optional[str]) -> str:
+    """
+    Normalizes an error so recurring bugs share a signature.
+    Quoted names and numbers are abstracted: "name 'foo' is not defined" -> "NameError: name '<S>' is not defined".
+    """
+    message = message or ""
+    message = re.sub(r"'[^']*'", "'<S>'", message)
+    message = re.sub(r'"[^"]*"', '"<S>"', message)
+    message = re.sub(r"\b\d+(\.\d+)?\b", "<N>", message)
+    return f"{error_type}: {message.strip()}"
+
+def _strip_docstring(node: ast.AST):
+    body = getattr(node, "body", None)
+    if (isinstance(body, list) and body and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str)):
+        node.body = body[1:] or [ast.Pass()]
+
+class _Abstractor(ast.NodeTransformer):
+    """Replaces user identifiers and literal values with placeholders (builtins are kept)."""
+    def visit_Name(self, node):
+        if node.id not in BUILTIN_NAMES:
+            node.id = "_"
+        return node
+
+    def visit_arg(self, node):
+        node.arg = "_"
+        node.annotation = None
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = "_"
+        _strip_docstring(node)
+        self.generic_visit(node)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Constant(self, node):
+        node.value = type(node.value).__name__
+        return node
+
+def fingerprint(node: ast.AST) -> str:
+    """Structural hash of a function (or module) with identifiers and literals abstracted."""
+    node = _Abstractor().visit(copy.deepcopy(node))
+    if isinstance(node, ast.Module):
+        _strip_docstring(node)
+    return hashlib.sha1(ast.dump(node, annotate_fields=False).encode()).hexdigest()
+
+def _symbols(node: ast.AST) -> List[Tuple[str, object]]:
+    """Identifiers and literals in traversal order; aligned between two nodes with the same fingerprint."""
+    symbols = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id not in BUILTIN_NAMES:
+            symbols.append(("name", child.id))
+        elif isinstance(child, ast.arg):
+            symbols.append(("name", child.arg))
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(("name", child.name))
+        elif isinstance(child, ast.Constant):
+            symbols.append(("const", child.value))
+    return symbols
+
+def find_unit(tree: ast.Module, line_number: Optional[int]) -> ast.AST:
+    """Innermost function containing the failing line, or the whole module for top-level code."""
+    unit = tree
+    if line_number is None:
+        return unit
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.lineno <= line_number <= (node.end_lineno or node.lineno):
+                if unit is tree or node.lineno >= unit.lineno:
+                    unit = node
+    return unit
+
+def find_function(tree: ast.Module, name: str) -> Optional[ast.AST]:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+            return node
+    return None
+
+class _Renamer(ast.NodeTransformer):
+    def __init__(self, names: Dict[str, str], consts: Dict[object, object]):
+        self.names = names
+        self.consts = consts
+
+    def visit_Name(self, node):
+        node.id = self.names.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.names.get(node.arg, node.arg)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.names.get(node.name, node.name)
+        self.generic_visit(node)
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Constant(self, node):
+        key = (type(node.value), node.value)
+        if key in self.consts:
+            node.value = self.consts[key]
+        return node
+
+class KnowledgeBase:
+    """
+    Local store of accepted repairs.
+    Entries are keyed by "<error signature>|<AST fingerprint>" so lookup is a single dict access.
+    A stored fix is adapted to a new failure by mapping the stored unit's identifiers
+    and literals onto the new unit's (their fingerprints guarantee the two align).
+    """
+    def __init__(self, path: str = "fix_kb.json"):
+        self.path = path
+        self.entries: Dict[str, List[dict]] = {}
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Failed to load knowledge base {self.path}: {e}")
+                self.entries = {}
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, indent=4)
+
+    @staticmethod
+    def _key(error_type: str, message: str, unit: ast.AST) -> str:
+        return f"{error_signature(error_type, message)}|{fingerprint(unit)}"
+
+    def record(self, code: str, error_type: str, line_number: Optional[int], message: str, fixed_code: str, source: str = "") -> bool:
+        """Stores the repair of the unit that failed in `code`. Returns False if it could not be indexed."""
+        try:
+            tree = ast.parse(code)
+            fixed_tree = ast.parse(fixed_code)
+        except SyntaxError:
+            return False
+        unit = find_unit(tree, line_number)
+        if isinstance(unit, ast.Module):
+            fixed_unit = fixed_tree
+        else:
+            fixed_unit = find_function(fixed_tree, unit.name)
+        if fixed_unit is None:
+            return False
+        original_src = ast.unparse(unit)
+        fixed_src = ast.unparse(fixed_unit)
+        if original_src == fixed_src:
+            return False
+        bucket = self.entries.setdefault(self._key(error_type, message, unit), [])
+        for entry in bucket:
+            if entry["fixed"] == fixed_src:
+                return True
+        bucket.append({"original": original_src, "fixed": fixed_src, "source": source, "hits": 0, "successes": 0})
+        self.save()
+        return True
+
+    def suggest(self, code: str, error_type: str, line_number: Optional[int], message: str) -> List[Tuple[str, dict]]:
+        """Returns (adapted_code, entry) candidates for this failure, most successful first."""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return []
+        unit = find_unit(tree, line_number)
+        bucket = self.entries.get(self._key(error_type, message, unit), [])
+        candidates = []
+        for entry in sorted(bucket, key=lambda e: -e["successes"]):
+            adapted = self._adapt(code, unit, entry)
+            if adapted and adapted != code:
+                candidates.append((adapted, entry))
+        return candidates
+
+    def mark(self, entry: dict, success: bool):
+        entry["hits"] += 1
+        if success:
+            entry["successes"] += 1
+        self.save()
+
+    def _adapt(self, code: str, unit: ast.AST, entry: dict) -> Optional[str]:
+        stored = ast.parse(entry["original"])
+        if not isinstance(unit, ast.Module):
+            stored = stored.body[0]
+        names, consts = {}, {}
+        for (kind_a, old), (kind_b, new) in zip(_symbols(stored), _symbols(unit)):
+            if kind_a != kind_b:
+                return None
+            if kind_a == "name":
+                if names.setdefault(old, new) != new:
+                    return None
+            else:
+                key = (type(old), old)
+                # Literals that map ambiguously are left as stored
+                if consts.setdefault(key, new) != new:
+                    consts[key] = old
+        fixed = ast.parse(entry["fixed"])
+        fixed = _Renamer(names, consts).visit(fixed)
+        fixed_src = ast.unparse(ast.fix_missing_locations(fixed))
+        if isinstance(unit, ast.Module):
+            return fixed_src + "\n"
+        lines = code.split("\n")
+        start = min([unit.lineno] + [d.lineno for d in unit.decorator_list]) - 1
+        indent = lines[start][:len(lines[start]) - len(lines[start].lstrip())]
+        replacement = [indent + line if line else line for line in fixed_src.split("\n")]
+        return "\n".join(lines[:start] + replacement + lines[unit.end_lineno:])
+
+    def bootstrap(self, tests_dir: str, fixed_dir: str, sandbox, patch_engine) -> int:
+        """Indexes every tests/<name>.py that has a fixed_tests/<name>_fixed.py counterpart."""
+        added = 0
+        for filename in sorted(os.listdir(tests_dir)):
+            name, ext = os.path.splitext(filename)
+            fixed_path = os.path.join(fixed_dir, f"{name}_fixed{ext}")
+            if ext != ".py" or not os.path.exists(fixed_path):
+                continue
+            with open(os.path.join(tests_dir, filename), "r") as f:
+                code = f.read()
+            with open(fixed_path, "r") as f:
+                fixed_code = f.read()
+            result = sandbox.run(code)
+            if result.return_code == 0 or result.timed_out:
+                continue
+            error_type, line_number, message = patch_engine.analyze_error(result.stderr)
+            if error_type and self.record(code, error_type, line_number, message, fixed_code, source=filename):
+                added += 1
+        return added
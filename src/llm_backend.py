@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+class QueueTimeout(TimeoutError):
+    """Raised when a request's deadline passes before it is sent (while it waits for a free endpoint)."""
+
+def _requests():
+    """requests (and urllib3) is only imported once the first LLM call is made."""
+    import requests
+    return requests
+
+@dataclass
+class Endpoint:
+    url: str
+    max_concurrency: int = 2
+    outstanding: int = 0
+    healthy: bool = True
+    last_check: float = 0.0
+    requests_served: int = 0
+    failures: int = 0
+    # Keep-alive connections reused by every request to this endpoint (created on first use)
+    session: object = field(default=None, repr=False)
+
+    @property
+    def load(self) -> float:
+        return self.outstanding / self.max_concurrency
+
+class BackendPool:
+    """
+    Pool of Ollama endpoints.
+    Requests go to the healthy endpoint with the fewest outstanding requests
+    (relative to its concurrency limit). When every endpoint is saturated callers
+    wait in a priority queue so interactive jobs overtake batch jobs.
+    """
+    def __init__(self, urls: List[str] = None, max_concurrency: int = 2, health_interval: float = 30.0, health_timeout: float = 2.0):
+        urls = urls or [DEFAULT_OLLAMA_URL]
+        self.endpoints = [Endpoint(url.rstrip("/"), max_concurrency) for url in urls]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    @staticmethod
+    def parse_urls(specs: Optional[List[str]]) -> List[str]:
+        """Accepts repeated and/or comma separated URLs; bare host:port gets an http:// scheme."""
+        urls = []
+        for spec in specs or []:
+            for url in spec.split(","):
+                url = url.strip()
+                if not url:
+                    continue
+                if "://" not in url:
+                    url = f"http://{url}"
+                urls.append(url)
+        return urls
+
+    def check_health(self, endpoint: Endpoint) -> bool:
+        """Probes an endpoint with a cheap model listing request."""
+        requests = _requests()
+        try:
+            response = requests.get(f"{endpoint.url}/api/tags", timeout=self.health_timeout)
+            healthy = response.status_code == 200
+        except requests.RequestException:
+            healthy = False
+        with self._cond:
+            endpoint.healthy = healthy
+            endpoint.last_check = time.monotonic()
+            self._cond.notify_all()
+        return healthy
+
+    def _refresh_health(self):
+        """Re-probes unhealthy endpoints whose last check is older than the health interval."""
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and now - endpoint.last_check >= self.health_interval:
+                self.check_health(endpoint)
+
+    def _pick(self, exclude) -> Optional[Endpoint]:
+        candidates = [e for e in self.endpoints if e not in exclude]
+        # If nothing is known to be healthy, try the unhealthy ones rather than fail outright
+        healthy = [e for e in candidates if e.healthy] or candidates
+        free = [e for e in healthy if e.outstanding < e.max_concurrency]
+        if not free:
+            return None
+        return min(free, key=lambda e: (e.load, e.outstanding))
+
+    def _acquire(self, priority: int, exclude=(), deadline: Optional[float] = None) -> Endpoint:
+        """Waits for a free endpoint; a request whose deadline (time.monotonic()) passes leaves the queue."""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        endpoint = self._pick(exclude)
+                        if endpoint:
+                            endpoint.outstanding += 1
+                            return endpoint
+                    wait = None if deadline is None else deadline - time.monotonic()
+                    if wait is not None and wait <= 0:
+                        raise QueueTimeout("Deadline passed while waiting for a free endpoint")
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _release(self, endpoint: Endpoint):
+        with self._cond:
+            endpoint.outstanding -= 1
+            self._cond.notify_all()
+
+    def _session(self, endpoint: Endpoint):
+        if endpoint.session is None:
+            requests = _requests()
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=endpoint.max_concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with self._cond:
+                if endpoint.session is None:
+                    endpoint.session = session
+        return endpoint.session
+
+    def generate(self, payload: dict, timeout: float, priority: int = PRIORITY_BATCH, deadline: Optional[float] = None) -> dict:
+        """
+        Sends an /api/generate request and returns the decoded JSON response.
+        Connection failures mark the endpoint unhealthy and fail over to the next one.
+        With a deadline (time.monotonic()) the request is dropped if it is still queued then,
+        and the HTTP timeout is cut to the time left once it is sent.
+        """
+        requests = _requests()
+        self._refresh_health()
+        tried = []
+        while True:
+            endpoint = self._acquire(priority, exclude=tried, deadline=deadline)
+            try:
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        raise QueueTimeout("Deadline passed before the request was sent")
+                response = self._session(endpoint).post(f"{endpoint.url}/api/generate", json=payload, timeout=timeout)
+                response.raise_for_status()
+                endpoint.requests_served += 1
+                return response.json()
+            except requests.ConnectionError:
+                with self._cond:
+                    endpoint.failures += 1
+                    endpoint.healthy = False
+                    endpoint.last_check = time.monotonic()
+                tried.append(endpoint)
+                if len(tried) >= len(self.endpoints):
+                    raise
+            finally:
+                self._release(endpoint)
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "url": e.url,
+                "healthy": e.healthy,
+                "outstanding": e.outstanding,
+                "requests_served": e.requests_served,
+                "failures": e.failures,
+            }
+            for e in self.endpoints
+        ]
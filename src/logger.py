@@ -2,6 +2,7 @@ import json
 import time
 from typing import List, Dict, Any
 from dataclasses import dataclass, asdict
+from .report_codec import encode_report
 
 @dataclass
 class RepairTrace:
@@ -12,15 +13,19 @@ class RepairTrace:
     success: bool
 
 class DebugLogger:
-    def __init__(self, log_file: str = "debug_report.json"):
+    def __init__(self, log_file: str = "debug_report.json", compact: bool = False, compress: bool = False):
         self.log_file = log_file
+        # compact: store code versions as deltas against their parent (see report_codec)
+        self.compact = compact
+        self.compress = compress
         self.report = {
             "original_code": "",
             "repaired_code": "",
             "traces": [],
             "best_attempt": "",
             "failure_explanation": "",
-            "optimization_report": None
+            "optimization_report": None,
+            "telemetry": None
         }
 
     def log_original_code(self, code: str):
@@ -29,14 +34,19 @@ class DebugLogger:
     def log_repaired_code(self, code: str):
         self.report["repaired_code"] = code
 
-    def log_optimization(self, original_complexity: str, optimized_complexity: str, changes: list, optimized_code: str):
+    def log_optimization(self, original_complexity: str, optimized_complexity: str, changes: list, optimized_code: str, **metrics):
+        # metrics: measured results such as speedup, added next to the LLM's own estimates
         self.report["optimization_report"] = {
             "original_complexity": original_complexity,
             "optimized_complexity": optimized_complexity,
             "changes_summary": changes,
-            "optimized_code": optimized_code
+            "optimized_code": optimized_code,
+            **metrics
         }
 
+    def log_optimization_candidates(self, candidates: list):
+        self.report["optimization_candidates"] = candidates
+
     def add_trace(self, iteration: int, error_type: str, strategy: str, patch: str, success: bool, status: str = "Attempted"):
         trace = {
             "iteration": iteration,
@@ -48,12 +58,23 @@ class DebugLogger:
         }
         self.report["traces"].append(trace)
 
+    def log_workspace(self, project: str, entry: str, files: dict):
+        # files: relative path -> patched source of every workspace file other than the entry point
+        self.report["workspace"] = {"project": project, "entry": entry, "patched_files": files}
+
+    def log_telemetry(self, telemetry: dict):
+        self.report["telemetry"] = telemetry
+
+    def log_budget(self, budget: dict):
+        self.report["budget"] = budget
+
     def set_best_attempt(self, code: str, explanation: str):
         self.report["best_attempt"] = code
         self.report["failure_explanation"] = explanation
 
     def save(self):
         self.report["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        report = encode_report(self.report, self.compress) if self.compact else self.report
         with open(self.log_file, "w") as f:
-            json.dump(self.report, f, indent=4)
+            json.dump(report, f, indent=None if self.compact else 4)
         print(f"Debug report saved to {self.log_file}")
@@ -0,0 +1,186 @@
+import ast
+import functools
+import math
+import re
+from typing import Iterable, Optional, Tuple
+
+MASKS = ("timings", "addresses", "floats", "ordering")
+# Masks applied unless a run chooses its own: ordering can hide real output changes, so it is opt-in
+DEFAULT_MASKS = ("timings", "addresses", "floats")
+
+# Only values that cannot be counts: a decimal point or an exponent
+_DECIMAL = r"(?:\d+\.\d+|\.\d+|\d+(?:\.\d*)?[eE][-+]?\d+)"
+_UNIT = r"(?:ns|us|µs|ms|s|secs?|seconds?|mins?|minutes?)(?![A-Za-z])"
+# "0.000012 seconds", "12.5ms", "3.5 s" (an integer with a unit may be a count, e.g. "5 mins" of a schedule)
+_DURATION = re.compile(rf"(?<![\w.]){_DECIMAL}\s*{_UNIT}")
+# "Time taken: 0.000012", "elapsed=12.5", "took 3s", "Runtime (s): 0.4"; "took 3 steps" and "Total time: 5" are compared
+_TIMING_LABEL = re.compile(rf"(?i)\b(time|taken|took|elapsed|duration|runtime)\b(\s*(?:\([^)\n]*\))?[\s:=]*)"
+                           rf"(?:{_DECIMAL}(?:\s*{_UNIT})?|\d+\s*{_UNIT})(?![\w.])")
+# Object reprs such as <Node object at 0x7f3a2c1d0e50>
+_ADDRESS = re.compile(r"\b0x[0-9a-fA-F]{6,}\b")
+_FLOAT = re.compile(r"([-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?\d+[eE][-+]?\d+)")
+
+def _canonical(value) -> str:
+    """repr() with set elements and dict items sorted, recursively."""
+    if isinstance(value, dict):
+        items = sorted((_canonical(k), _canonical(v)) for k, v in value.items())
+        return "{" + ", ".join(f"{k}: {v}" for k, v in items) + "}"
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            return "set()" if isinstance(value, set) else "frozenset()"
+        body = "{" + ", ".join(sorted(_canonical(v) for v in value)) + "}"
+        return body if isinstance(value, set) else f"frozenset({body})"
+    if isinstance(value, list):
+        return "[" + ", ".join(_canonical(v) for v in value) + "]"
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_canonical(v) for v in value) + ("," if len(value) == 1 else "") + ")"
+    return repr(value)
+
+def _matching_brace(line: str, start: int) -> int:
+    """Index of the brace closing the one at `start` (quotes respected), or -1."""
+    depth = 0
+    quote = None
+    i = start
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+@functools.lru_cache(maxsize=4096)
+def _canonical_segment(segment: str) -> str:
+    try:
+        value = ast.literal_eval(segment)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return segment
+    return _canonical(value) if isinstance(value, (dict, set)) else segment
+
+def canonicalize_ordering(line: str) -> str:
+    """Rewrites every printed set or dict literal on the line with its elements in sorted order."""
+    out = []
+    i = 0
+    while i < len(line):
+        start = line.find("{", i)
+        if start < 0:
+            break
+        end = _matching_brace(line, start)
+        if end < 0:
+            break
+        out.append(line[i:start] + _canonical_segment(line[start:end + 1]))
+        i = end + 1
+    out.append(line[i:])
+    return "".join(out)
+
+class OutputNormalizer:
+    """
+    Decides whether two program outputs are equivalent for verification purposes.
+    Each mask removes one source of run-to-run noise:
+      timings   - durations and "time taken"-style values
+      addresses - 0x... object addresses
+      floats    - floats compare equal within rel_tol/abs_tol
+      ordering  - printed sets and dicts compare independent of element order
+    ordering is opt-in: it suits programs known to print unordered collections. timings only masks
+    real durations (a decimal with a time unit, or a timing label followed by one); integer counts
+    next to timing words are still compared:
+
+    >>> timings = OutputNormalizer()
+    >>> timings.lines_equal("Time taken: 0.0012 seconds", "Time taken: 0.0009 seconds")
+    True
+    >>> timings.lines_equal("took 3s", "took 5s")
+    True
+    >>> timings.lines_equal("Total time: 5", "Total time: 6")
+    False
+    >>> timings.lines_equal("It took 3 steps", "It took 4 steps")
+    False
+    >>> timings.lines_equal("duration = 12 frames", "duration = 7 frames")
+    False
+    >>> timings.lines_equal("speed 3s", "speed 9s")
+    False
+    >>> timings.lines_equal("count=5 mins", "count=7 mins")
+    False
+    >>> OutputNormalizer(["addresses", "floats"]).lines_equal("Time taken: 0.0012 seconds", "Time taken: 0.0009 seconds")
+    False
+    """
+    def __init__(self, masks: Iterable[str] = DEFAULT_MASKS, rel_tol: float = 1e-9, abs_tol: float = 1e-12):
+        self.masks = tuple(masks)
+        unknown = set(self.masks) - set(MASKS)
+        if unknown:
+            raise ValueError(f"Unknown output masks: {', '.join(sorted(unknown))} (choose from {', '.join(MASKS)})")
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+
+    @classmethod
+    def parse(cls, spec: Optional[str], rel_tol: float = 1e-9) -> Optional["OutputNormalizer"]:
+        """Builds a normalizer from a comma separated mask list; "none" or an empty spec means exact comparison."""
+        masks = [m.strip() for m in (spec or "").split(",") if m.strip()]
+        if not masks or masks == ["none"]:
+            return None
+        return cls(masks, rel_tol=rel_tol)
+
+    def _mask_timings(self, line: str) -> str:
+        line = _TIMING_LABEL.sub(lambda m: f"{m.group(1)}{m.group(2)}<time>", line)
+        return _DURATION.sub("<time>", line)
+
+    @staticmethod
+    def _mask_addresses(line: str) -> str:
+        return _ADDRESS.sub("0x<addr>", line)
+
+    @staticmethod
+    def _mask_ordering(line: str) -> str:
+        return canonicalize_ordering(line) if "{" in line else line
+
+    def _steps(self):
+        # Cheapest first: comparison stops at the first step that makes the lines equal
+        return [step for mask, step in (("timings", self._mask_timings), ("addresses", self._mask_addresses),
+                                        ("ordering", self._mask_ordering)) if mask in self.masks]
+
+    def normalize_line(self, line: str) -> str:
+        for step in self._steps():
+            line = step(line)
+        return line
+
+    def lines_equal(self, a: str, b: str) -> bool:
+        if a == b:
+            return True
+        for step in self._steps():
+            a, b = step(a), step(b)
+            if a == b:
+                return True
+        if "floats" not in self.masks:
+            return False
+        parts_a, parts_b = _FLOAT.split(a), _FLOAT.split(b)
+        if len(parts_a) != len(parts_b):
+            return False
+        # split() with a group alternates text and captured floats
+        for index, (x, y) in enumerate(zip(parts_a, parts_b)):
+            if index % 2 == 0:
+                if x != y:
+                    return False
+            elif not math.isclose(float(x), float(y), rel_tol=self.rel_tol, abs_tol=self.abs_tol):
+                return False
+        return True
+
+    def compare(self, expected: str, actual: str) -> Tuple[bool, Optional[int], str, str]:
+        """Line by line comparison. Returns (equivalent, first differing line, expected line, actual line)."""
+        if expected == actual:
+            return True, None, "", ""
+        lines_a, lines_b = expected.split("\n"), actual.split("\n")
+        for number, (a, b) in enumerate(zip(lines_a, lines_b), start=1):
+            if not self.lines_equal(a, b):
+                return False, number, a, b
+        if len(lines_a) != len(lines_b):
+            number = min(len(lines_a), len(lines_b)) + 1
+            return False, number, (lines_a[number - 1:] or [""])[0], (lines_b[number - 1:] or [""])[0]
+        return True, None, "", ""
@@ -0,0 +1,224 @@
+import ast
+import hashlib
+import io
+import json
+import os
+import re
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Iterator, List, Optional, Tuple
+
+# Below this many pages a worker pool costs more than it saves
+PARALLEL_MIN_PAGES = 8
+
+# Typographic substitutions PDF text extraction commonly introduces
+_PDF_ARTIFACTS = {
+    "‘": "'", "’": "'", "“": '"', "”": '"',
+    "−": "-", "–": "-", " ": " ", "ﬁ": "fi", "ﬂ": "fl", "\t": "    ",
+}
+
+_CODE_START = re.compile(
+    r"^(def |class |import |from \S+ import |return\b|if |elif |else\s*:|for |while |try\s*:|except\b|"
+    r"finally\s*:|with |raise\b|assert |yield\b|pass$|break$|continue$|@\w|#|print\(|lambda\b)"
+)
+_ASSIGNMENT = re.compile(r"^[A-Za-z_][\w\.]*(\[[^\]]*\])?(\s*,\s*[A-Za-z_][\w\.]*)*\s*([+\-*/%]|//|\*\*)?=\s*\S")
+_CALL = re.compile(r"^[A-Za-z_][\w\.]*\(.*\)\s*$")
+_DEDENT_KEYWORDS = re.compile(r"^(elif |else\s*:|except\b|finally\s*:)")
+_BLOCK_ENDERS = re.compile(r"^(return\b|break$|continue$|pass$|raise\b)")
+
+@dataclass
+class IngestResult:
+    digest: str
+    pages: List[str]
+    code: str
+    blocks: List[str]
+    prose: str
+    cached: bool = False
+
+def clean_text(text: str) -> str:
+    for artifact, replacement in _PDF_ARTIFACTS.items():
+        text = text.replace(artifact, replacement)
+    return text
+
+def is_code_line(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped:
+        return False
+    if _CODE_START.match(stripped) or _ASSIGNMENT.match(stripped) or _CALL.match(stripped):
+        return True
+    # Continuation of brackets or a trailing colon are code, prose rarely looks like this
+    return (stripped.endswith((":", ",", "(", "[", "{")) and not stripped[0].isupper()) or stripped in (")", "]", "}")
+
+def _parses(code: str) -> bool:
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+def reindent(lines: List[str]) -> str:
+    """
+    Rebuilds indentation lost by PDF layout from Python's block structure:
+    a trailing colon opens a block, elif/else/except/finally close one and reopen it,
+    return/break/continue/pass/raise end the current block, and top-level
+    def/class/if __name__ statements reset to column zero.
+    """
+    out = []
+    level = 0
+    class_level = None
+    # True when the previous statement already closed its block (return, break, ...)
+    closed = False
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            out.append("")
+            continue
+        if line.startswith("class "):
+            level = 0
+        elif line.startswith(("def ", "@")):
+            # Methods stay inside the enclosing class
+            level = class_level + 1 if class_level is not None and level > class_level else 0
+        elif line.startswith("if __name__"):
+            level = 0
+            class_level = None
+        elif _DEDENT_KEYWORDS.match(line) and not closed:
+            level = max(level - 1, 0)
+        out.append("    " * level + line)
+        if line.startswith("class ") and line.endswith(":"):
+            class_level = level
+        closed = False
+        if line.endswith(":") and not line.startswith("#"):
+            level += 1
+        elif _BLOCK_ENDERS.match(line):
+            level = max(level - 1, 0)
+            closed = True
+    return "\n".join(out)
+
+def repair_block(block: str) -> str:
+    """Returns the block unchanged if it parses, otherwise tries to rebuild its indentation."""
+    dedented = textwrap.dedent(block).strip("\n")
+    if _parses(dedented):
+        return dedented
+    rebuilt = reindent(dedented.split("\n"))
+    return rebuilt if _parses(rebuilt) else dedented
+
+class _Splitter:
+    """
+    Incremental split_code_and_prose: feeding pages one by one gives the same blocks and prose
+    as splitting the pages joined by newlines.
+    """
+    def __init__(self):
+        self.blocks, self.prose = [], []
+        self.current = []
+
+    def _flush(self):
+        current = self.current
+        while current and not current[-1].strip():
+            current.pop()
+        # A single short code-like line inside prose is usually a false positive
+        if len(current) > 1 or (current and _CODE_START.match(current[0].strip())):
+            self.blocks.append(repair_block("\n".join(current)))
+        else:
+            self.prose.extend(current)
+        current.clear()
+
+    def feed(self, text: str):
+        for line in clean_text(text).split("\n"):
+            if is_code_line(line) or (self.current and not line.strip()):
+                self.current.append(line.rstrip())
+            else:
+                self._flush()
+                self.prose.append(line)
+
+    def finish(self) -> Tuple[List[str], str]:
+        self._flush()
+        return self.blocks, "\n".join(l for l in self.prose if l.strip())
+
+def split_code_and_prose(text: str) -> Tuple[List[str], str]:
+    """Groups consecutive code-like lines (blank lines allowed inside) into blocks; the rest is prose."""
+    splitter = _Splitter()
+    splitter.feed(text)
+    return splitter.finish()
+
+def assemble_code(blocks: List[str]) -> str:
+    """Joins blocks into one program; adjacent blocks split by a page break are merged if that parses."""
+    merged = []
+    for block in blocks:
+        if merged and not _parses(merged[-1]) and _parses(merged[-1] + "\n" + block):
+            merged[-1] = merged[-1] + "\n" + block
+        else:
+            merged.append(block)
+    return "\n\n".join(merged)
+
+def _extract_range(data: bytes, start: int, stop: int) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(data))
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+class PdfIngestor:
+    """
+    Turns an uploaded PDF into debugger input.
+    Pages are extracted lazily (in worker processes for large documents), results are cached
+    on disk by content hash, and Python code blocks are detected and re-indented.
+    """
+    def __init__(self, cache_dir: Optional[str] = ".pdf_cache", workers: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.workers = workers or min(4, os.cpu_count() or 1)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def iter_pages(self, data: bytes) -> Iterator[str]:
+        """Yields page texts in order as soon as each one is available."""
+        from pypdf import PdfReader
+        reader = PdfReader(io.BytesIO(data))
+        page_count = len(reader.pages)
+        if page_count < PARALLEL_MIN_PAGES or self.workers <= 1:
+            # One reader for the whole document; only worker processes need a reader per page range
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+        chunk = -(-page_count // (self.workers * 2))
+        ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(_extract_range, data, start, stop) for start, stop in ranges]
+            for future in futures:
+                yield from future.result()
+
+    def _cache_path(self, digest: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{digest}.json") if self.cache_dir else None
+
+    def _load_cached(self, digest: str) -> Optional[IngestResult]:
+        path = self._cache_path(digest)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    return IngestResult(**{**json.load(f), "cached": True})
+            except (OSError, ValueError, TypeError):
+                return None
+        return None
+
+    def _store(self, result: IngestResult):
+        path = self._cache_path(result.digest)
+        if not path:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({k: v for k, v in asdict(result).items() if k != "cached"}, f)
+
+    def ingest(self, data: bytes) -> IngestResult:
+        digest = self.digest(data)
+        cached = self._load_cached(digest)
+        if cached:
+            return cached
+        # Each page is split as it arrives, while workers are still extracting later ones
+        pages, splitter = [], _Splitter()
+        for page in self.iter_pages(data):
+            splitter.feed(page)
+            pages.append(page)
+        blocks, prose = splitter.finish()
+        result = IngestResult(digest, pages, assemble_code(blocks), blocks, prose)
+        self._store(result)
+        return result
@@ -0,0 +1,396 @@
+import ast
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+LOOPS = (ast.For, ast.AsyncFor, ast.While)
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+# Methods that change a list (or any container) in place
+_MUTATORS = {"append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse", "add", "discard", "update", "__setitem__", "__delitem__"}
+# Calls that only read a list passed to them
+_READERS = {"print", "len", "sorted", "list", "tuple", "set", "frozenset", "str", "repr", "sum", "min", "max", "any", "all", "enumerate", "zip", "reversed"}
+# Rewrites applied to one program at most (each one re-parses the result)
+MAX_REWRITES = 10
+
+@dataclass
+class Finding:
+    rule: str
+    line: int
+    message: str
+    # Estimated complexity before -> after the rewrite
+    complexity: str
+    fixable: bool
+
+    def describe(self) -> str:
+        return f"line {self.line}: {self.message} ({self.complexity})"
+
+def _scope_nodes(scope: ast.AST):
+    """Nodes of one scope (module or function body), not descending into nested functions or classes."""
+    stack = list(ast.iter_child_nodes(scope))
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, _SCOPES):
+            stack.extend(ast.iter_child_nodes(node))
+
+def _scopes(tree: ast.Module):
+    yield tree
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node
+
+def _loop_depths(scope: ast.AST) -> Dict[int, Tuple[int, Optional[ast.AST], Optional[ast.AST]]]:
+    """
+    id(node) -> (loop depth, innermost enclosing loop, outermost enclosing loop) for every node of the scope.
+    A for loop's iterable and any loop's `else` run once, so they sit at the depth around the loop;
+    a while test is evaluated on every iteration and counts as inside.
+    """
+    depths = {}
+
+    def visit(node, depth, inner, outer):
+        depths[id(node)] = (depth, inner, outer)
+        once = set()
+        if isinstance(node, LOOPS):
+            once = {id(n) for n in ([node.iter] if isinstance(node, (ast.For, ast.AsyncFor)) else []) + node.orelse}
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _SCOPES):
+                continue
+            if isinstance(node, LOOPS) and id(child) not in once:
+                visit(child, depth + 1, node, outer or node)
+            else:
+                visit(child, depth, inner, outer)
+
+    for child in ast.iter_child_nodes(scope):
+        if not isinstance(child, _SCOPES):
+            visit(child, 0, None, None)
+    return depths
+
+def _parents(scope: ast.AST) -> Dict[int, ast.AST]:
+    """id(node) -> parent node for every node of the scope."""
+    parents = {id(child): node for node in _scope_nodes(scope) for child in ast.iter_child_nodes(node)}
+    parents.update({id(child): scope for child in ast.iter_child_nodes(scope)})
+    return parents
+
+def _names(tree: ast.AST) -> set:
+    return {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} | {
+        n.name for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+
+def _fresh(base: str, taken: set) -> str:
+    name, suffix = base, 1
+    while name in taken:
+        suffix += 1
+        name = f"{base}{suffix}"
+    taken.add(name)
+    return name
+
+def _stored(node: ast.AST, name: str) -> bool:
+    """True if `node` (re)binds or mutates `name` in place."""
+    for n in ast.walk(node):
+        if isinstance(n, ast.Name) and n.id == name and isinstance(n.ctx, (ast.Store, ast.Del)):
+            return True
+        if isinstance(n, (ast.Subscript, ast.Attribute)) and isinstance(n.ctx, (ast.Store, ast.Del)) \
+                and isinstance(n.value, ast.Name) and n.value.id == name:
+            return True
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and n.func.attr in _MUTATORS \
+                and isinstance(n.func.value, ast.Name) and n.func.value.id == name:
+            return True
+    return False
+
+class _Source:
+    """Line/column based edits on the original source text, so comments and formatting survive."""
+    def __init__(self, code: str):
+        self.lines = code.split("\n")
+
+    def offset(self, line: int, col: int) -> int:
+        # ast columns are UTF-8 byte offsets
+        prefix = self.lines[line - 1].encode()[:col].decode(errors="ignore")
+        return sum(len(l) + 1 for l in self.lines[:line - 1]) + len(prefix)
+
+    def segment(self, code: str, node: ast.AST) -> str:
+        return ast.get_source_segment(code, node)
+
+    def indent_of(self, node: ast.AST) -> Optional[str]:
+        """Indentation of a statement that starts its own line (None if it shares the line)."""
+        line = self.lines[node.lineno - 1]
+        prefix = line.encode()[:node.col_offset].decode(errors="ignore")
+        return prefix if not prefix.strip() else None
+
+def _apply(code: str, replacements: List[Tuple[ast.AST, str]], inserts: List[Tuple[int, str]]) -> str:
+    """Replaces node segments and inserts whole lines (after 1-based line numbers, 0 = top)."""
+    source = _Source(code)
+    text = code
+    spans = sorted(((source.offset(n.lineno, n.col_offset), source.offset(n.end_lineno, n.end_col_offset), r)
+                    for n, r in replacements), reverse=True)
+    for start, end, replacement in spans:
+        text = text[:start] + replacement + text[end:]
+    # Replacements never change the number of lines, so insert positions still hold
+    lines = text.split("\n")
+    for after, line in sorted(inserts, key=lambda item: item[0], reverse=True):
+        lines.insert(after, line)
+    return "\n".join(lines)
+
+def _import_line(tree: ast.Module) -> int:
+    """Line after which a new top-level import goes (after a docstring and __future__ imports)."""
+    after = 0
+    for node in tree.body:
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str) and after == 0:
+            after = node.end_lineno
+        elif isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            after = node.end_lineno
+        else:
+            break
+    return after
+
+def _has_module_import(tree: ast.Module, module: str) -> bool:
+    return any(isinstance(n, ast.Import) and any(a.name == module and a.asname is None for a in n.names)
+               for n in tree.body)
+
+class _Rule:
+    name = ""
+
+    def findings(self, code: str, tree: ast.Module) -> List[Tuple[Finding, Optional[str]]]:
+        """(finding, rewritten code or None) pairs; a rewrite is computed only for fixable findings."""
+        raise NotImplementedError
+
+class CountInLoop(_Rule):
+    """`seq.count(x)` inside a loop scans `seq` every iteration; a Counter built once answers in O(1)."""
+    name = "count-in-loop"
+
+    def findings(self, code, tree):
+        results = []
+        taken = _names(tree)
+        collections_usable = "collections" not in taken or _has_module_import(tree, "collections")
+        for scope in _scopes(tree):
+            depths = _loop_depths(scope)
+            in_comprehension = {id(n) for c in _scope_nodes(scope) if isinstance(c, COMPREHENSIONS) for n in ast.walk(c)}
+            for node in _scope_nodes(scope):
+                if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "count"
+                        and isinstance(node.func.value, ast.Name) and len(node.args) == 1 and not node.keywords):
+                    continue
+                depth, inner, _ = depths.get(id(node), (0, None, None))
+                if not depth and id(node) not in in_comprehension:
+                    continue
+                seq = node.func.value.id
+                arg = node.args[0]
+                # Counter(seq)[x] == seq.count(x) only when x is an element of seq (not a substring)
+                fixable = (isinstance(inner, ast.For) and isinstance(inner.iter, ast.Name) and inner.iter.id == seq
+                           and isinstance(inner.target, ast.Name) and isinstance(arg, ast.Name) and arg.id == inner.target.id
+                           and not any(_stored(stmt, seq) or _stored(stmt, arg.id) for stmt in inner.body) and collections_usable
+                           and _Source(code).indent_of(inner) is not None)
+                finding = Finding(self.name, node.lineno, f"`{seq}.count(...)` inside a loop rescans `{seq}` on every iteration",
+                                  "O(n^2) -> O(n)", fixable)
+                rewritten = None
+                if fixable:
+                    counts = _fresh(f"_{seq}_counts", set(taken))
+                    indent = _Source(code).indent_of(inner)
+                    inserts = [(inner.lineno - 1, f"{indent}{counts} = collections.Counter({seq})")]
+                    if not _has_module_import(tree, "collections"):
+                        inserts.append((_import_line(tree), "import collections"))
+                    rewritten = _apply(code, [(node, f"{counts}[{arg.id}]")], inserts)
+                results.append((finding, rewritten))
+        return results
+
+class ListMembershipInLoop(_Rule):
+    """`x in some_list` inside a loop is a linear scan; a set kept in step with the list answers in O(1)."""
+    name = "list-membership-in-loop"
+
+    @staticmethod
+    def _list_binding(scope, name) -> Optional[ast.Assign]:
+        """The single assignment binding `name` to a list in this scope, if that is its only binding."""
+        bindings = [n for n in _scope_nodes(scope)
+                    if isinstance(n, ast.Name) and n.id == name and isinstance(n.ctx, ast.Store)]
+        if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            args = scope.args
+            if name in {a.arg for a in args.posonlyargs + args.args + args.kwonlyargs} | {a.arg for a in (args.vararg, args.kwarg) if a}:
+                return None
+        if len(bindings) != 1:
+            return None
+        assign = next((n for n in _scope_nodes(scope) if isinstance(n, ast.Assign) and len(n.targets) == 1
+                       and isinstance(n.targets[0], ast.Name) and n.targets[0] is bindings[0]), None)
+        if not assign:
+            return None
+        value = assign.value
+        is_list = isinstance(value, (ast.List, ast.ListComp)) or (
+            isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == "list")
+        return assign if is_list else None
+
+    @staticmethod
+    def _safe_uses(scope, name, parents) -> Optional[List[ast.Expr]]:
+        """
+        The `name.append(...)` statements if every other use of the list only reads it
+        (membership tests, iteration, return, read-only builtins); None otherwise.
+        """
+        appends = []
+        for node in _scope_nodes(scope):
+            if not (isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load)):
+                continue
+            parent = parents.get(id(node))
+            if isinstance(parent, ast.Attribute) and parent.attr == "append":
+                call = parents.get(id(parent))
+                statement = parents.get(id(call))
+                if isinstance(call, ast.Call) and isinstance(statement, ast.Expr) and len(call.args) == 1:
+                    appends.append(statement)
+                    continue
+                return None
+            if isinstance(parent, ast.Compare) and len(parent.ops) == 1 and isinstance(parent.ops[0], (ast.In, ast.NotIn)) \
+                    and parent.comparators[0] is node:
+                continue
+            if isinstance(parent, (ast.For, ast.comprehension)) and parent.iter is node:
+                continue
+            if isinstance(parent, (ast.Return, ast.FormattedValue)):
+                continue
+            if isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id in _READERS and node in parent.args:
+                continue
+            return None
+        return appends
+
+    @classmethod
+    def _changed_elsewhere(cls, tree, scope, name) -> bool:
+        """
+        True if code outside `scope` may rebind or mutate the list: a global/nonlocal declaration,
+        or a closure (or, for a module-level list, any function) that stores, appends to or passes it on.
+        The shadow set would then fall out of step with the list.
+        """
+        if any(isinstance(n, (ast.Global, ast.Nonlocal)) and name in n.names for n in _scope_nodes(scope)):
+            return True
+        others = ast.walk(tree) if isinstance(scope, ast.Module) else ast.walk(scope)
+        for other in others:
+            if not isinstance(other, _SCOPES) or other is scope:
+                continue
+            nodes = list(_scope_nodes(other))
+            if any(isinstance(n, (ast.Global, ast.Nonlocal)) and name in n.names for n in nodes):
+                return True
+            args = None if isinstance(other, ast.ClassDef) else other.args
+            params = {a.arg for a in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg] if a} if args else set()
+            if name in params or any(isinstance(n, ast.Name) and n.id == name and isinstance(n.ctx, ast.Store) for n in nodes):
+                # A local of its own that shadows the list
+                continue
+            if cls._safe_uses(other, name, _parents(other)) != []:
+                return True
+        return False
+
+    def findings(self, code, tree):
+        results = []
+        taken = _names(tree)
+        source = _Source(code)
+        for scope in _scopes(tree):
+            depths = _loop_depths(scope)
+            parents = _parents(scope)
+            for node in _scope_nodes(scope):
+                if not (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn))
+                        and isinstance(node.comparators[0], ast.Name)):
+                    continue
+                depth, _, _ = depths.get(id(node), (0, None, None))
+                if not depth:
+                    continue
+                name = node.comparators[0].id
+                binding = self._list_binding(scope, name)
+                if binding is None:
+                    # Not known to be a list (could be a set, dict or str): nothing to report
+                    continue
+                appends = self._safe_uses(scope, name, parents)
+                fixable = (appends is not None and not self._changed_elsewhere(tree, scope, name) and source.indent_of(binding) is not None
+                           and all(source.indent_of(stmt) is not None for stmt in appends))
+                before = "O(n·m)" if depth == 1 else f"O(n^{depth}·m)"
+                after = "O(n)" if depth == 1 else f"O(n^{depth})"
+                finding = Finding(self.name, node.lineno, f"membership test on list `{name}` inside a loop is a linear scan",
+                                  f"{before} -> {after}", fixable)
+                rewritten = None
+                if fixable:
+                    shadow = _fresh(f"_{name}_set", set(taken))
+                    inserts = [(binding.end_lineno, f"{source.indent_of(binding)}{shadow} = set({name})")]
+                    # Re-reading the appended element avoids evaluating the argument twice
+                    inserts += [(stmt.end_lineno, f"{source.indent_of(stmt)}{shadow}.add({name}[-1])") for stmt in appends]
+                    tests = [n.comparators[0] for n in _scope_nodes(scope) if isinstance(n, ast.Compare) and len(n.ops) == 1
+                             and isinstance(n.ops[0], (ast.In, ast.NotIn)) and isinstance(n.comparators[0], ast.Name)
+                             and n.comparators[0].id == name]
+                    rewritten = _apply(code, [(t, shadow) for t in tests], inserts)
+                results.append((finding, rewritten))
+        return results
+
+class StringConcatInLoop(_Rule):
+    """`s += piece` in a loop may copy the whole string each time; collecting pieces and joining once is linear."""
+    name = "str-concat-in-loop"
+
+    @staticmethod
+    def _statement_lists(scope):
+        for node in [scope] + list(_scope_nodes(scope)):
+            if node is not scope and isinstance(node, _SCOPES):
+                continue
+            for field in ("body", "orelse", "finalbody"):
+                stmts = getattr(node, field, None)
+                if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                    yield stmts
+
+    def findings(self, code, tree):
+        results = []
+        taken = _names(tree)
+        source = _Source(code)
+        for scope in _scopes(tree):
+            for stmts in self._statement_lists(scope):
+                for index, loop in enumerate(stmts):
+                    if not isinstance(loop, LOOPS):
+                        continue
+                    concats = [n for n in ast.walk(loop) if isinstance(n, ast.AugAssign) and isinstance(n.op, ast.Add)
+                               and isinstance(n.target, ast.Name)]
+                    for name in sorted({n.target.id for n in concats}):
+                        init = next((s for s in reversed(stmts[:index]) if isinstance(s, ast.Assign) and len(s.targets) == 1
+                                     and isinstance(s.targets[0], ast.Name) and s.targets[0].id == name), None)
+                        if not (init and isinstance(init.value, ast.Constant) and isinstance(init.value.value, str)):
+                            continue
+                        own = [n for n in concats if n.target.id == name]
+                        between = stmts[stmts.index(init) + 1:index]
+                        # The loop may only extend the string; any other read or write of it keeps the rewrite off
+                        uses_in_loop = [n for n in ast.walk(loop) if isinstance(n, ast.Name) and n.id == name]
+                        fixable = (len(uses_in_loop) == len(own)
+                                   and not any(isinstance(n, ast.Name) and n.id == name for s in between for n in ast.walk(s))
+                                   and source.indent_of(loop) is not None and source.indent_of(init) is not None
+                                   and all(source.indent_of(n) is not None for n in own))
+                        finding = Finding(self.name, own[0].lineno, f"string `{name}` is built with += inside a loop",
+                                          "O(n^2) -> O(n)", fixable)
+                        rewritten = None
+                        if fixable:
+                            parts = _fresh(f"_{name}_parts", set(taken))
+                            initial = f"[{source.segment(code, init.value)}]" if init.value.value else "[]"
+                            replacements = [(init, f"{parts} = {initial}")]
+                            replacements += [(n, f"{parts}.append({source.segment(code, n.value)})") for n in own]
+                            inserts = [(loop.end_lineno, f"{source.indent_of(loop)}{name} = ''.join({parts})")]
+                            rewritten = _apply(code, replacements, inserts)
+                        results.append((finding, rewritten))
+        return results
+
+RULES = [CountInLoop(), ListMembershipInLoop(), StringConcatInLoop()]
+
+def find_antipatterns(code: str) -> List[Finding]:
+    """All findings of every rule, in source order (empty if the code does not parse)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    findings = [finding for rule in RULES for finding, _ in rule.findings(code, tree)]
+    return sorted(findings, key=lambda f: (f.line, f.rule))
+
+def apply_rewrites(code: str) -> Tuple[str, List[Finding]]:
+    """
+    Applies fixable rewrites one at a time, re-parsing after each, until none is left.
+    Returns the rewritten code and the findings that were fixed. The result still has to be
+    verified by running it: the rules assume hashable elements and str operands.
+    """
+    applied = []
+    for _ in range(MAX_REWRITES):
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            break
+        rewrite = next(((finding, rewritten) for rule in RULES for finding, rewritten in rule.findings(code, tree)
+                        if rewritten is not None), None)
+        if rewrite is None:
+            break
+        finding, rewritten = rewrite
+        try:
+            ast.parse(rewritten)
+        except SyntaxError:
+            break
+        applied.append(finding)
+        code = rewritten
+    return code, applied
@@ -0,0 +1,304 @@
+import ast
+from typing import List, Optional, Tuple
+from .perf_analyzer import Finding, LOOPS, _Source, _apply, _fresh, _has_module_import, _import_line, _names
+
+# Builtins without side effects that a memoized function may call
+_PURE_BUILTINS = {"abs", "min", "max", "len", "int", "float", "str", "bool", "tuple", "frozenset", "sum", "divmod",
+                  "pow", "round", "sorted", "ord", "chr", "range", "all", "any", "hash", "isinstance", "reversed", "zip", "enumerate"}
+_PURE_MODULES = {"math", "operator"}
+_NESTED = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda, ast.Global, ast.Nonlocal,
+           ast.Yield, ast.YieldFrom, ast.Await, ast.Delete, ast.With, ast.AsyncWith)
+
+def _self_calls(func: ast.FunctionDef) -> List[ast.Call]:
+    return [n for n in ast.walk(func) if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == func.name]
+
+def _params(func: ast.FunctionDef) -> Optional[List[str]]:
+    """Positional parameter names, or None if the signature has *args, **kwargs or keyword-only arguments."""
+    args = func.args
+    if args.vararg or args.kwarg or args.kwonlyargs:
+        return None
+    return [a.arg for a in args.posonlyargs + args.args]
+
+def _module_constants(tree: ast.Module) -> set:
+    """Module-level names bound exactly once, to a literal."""
+    counts = {}
+    for node in tree.body:
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target] if isinstance(node, (ast.AugAssign, ast.AnnAssign)) else []
+        for target in targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name):
+                    counts[name.id] = counts.get(name.id, 0) + (1 if isinstance(node, ast.Assign) and _literal(node.value) else 2)
+    return {name for name, count in counts.items() if count == 1}
+
+def _literal(node: ast.AST) -> bool:
+    try:
+        ast.literal_eval(node)
+        return True
+    except (ValueError, SyntaxError, TypeError):
+        return False
+
+def is_pure(func: ast.FunctionDef, tree: ast.Module) -> bool:
+    """
+    True if the function's result depends only on its arguments: no I/O, no mutation, no
+    reads of changing global state, and calls only to itself and side-effect free builtins.
+    """
+    params = _params(func)
+    if params is None:
+        return False
+    local = set(params) | {n.id for n in ast.walk(func) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+    readable = local | {func.name} | _module_constants(tree) | _PURE_MODULES | (_PURE_BUILTINS - local)
+    for node in ast.walk(func):
+        if node is func:
+            continue
+        if isinstance(node, _NESTED):
+            return False
+        if isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            return False
+        if isinstance(node, ast.Call):
+            target = node.func
+            if isinstance(target, ast.Name) and target.id != func.name and (target.id not in _PURE_BUILTINS or target.id in local):
+                return False
+            if isinstance(target, ast.Attribute) and not (isinstance(target.value, ast.Name) and target.value.id in _PURE_MODULES):
+                return False
+            if not isinstance(target, (ast.Name, ast.Attribute)):
+                return False
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in readable:
+            return False
+    return True
+
+def _body_start(func: ast.FunctionDef) -> int:
+    """Index of the first statement after the docstring."""
+    first = func.body[0]
+    return 1 if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str) else 0
+
+def _rebind(code: str, params: List[str], values: List[ast.expr]) -> str:
+    """`a, b = x, y` from the argument source (tuple assignment, so every value is computed from the old parameters)."""
+    parts = [ast.get_source_segment(code, v) for v in values]
+    parts = [f"({p})" if "\n" in p else p for p in parts]
+    return f"{', '.join(params)} = {', '.join(parts)}"
+
+def _has_base_case(func: ast.FunctionDef) -> bool:
+    """
+    Whether the function can stop recursing: a return that is not a self call, a raise, or a body
+    that can fall off its end. Without one a loop rewrite would spin forever instead of failing fast.
+    """
+    for node in ast.walk(func):
+        if isinstance(node, ast.Raise):
+            return True
+        if isinstance(node, ast.Return) and not _self_calls_in(node, func.name):
+            return True
+    return not isinstance(func.body[-1], (ast.Return, ast.Raise))
+
+def _edit_region(code: str, func: ast.FunctionDef, first: int, last: int, replacements: List[Tuple[ast.AST, str]],
+                 indent: str) -> str:
+    """
+    Source lines first..last (1-based, inclusive) with statement replacements applied and every line
+    shifted right by `indent`, except continuation lines of multi-line strings and of replaced statements.
+    """
+    source = _Source(code)
+    frozen = set()
+    spans = [n for n in ast.walk(func) if isinstance(n, (ast.Constant, ast.JoinedStr)) and n.end_lineno > n.lineno]
+    for node in spans + [n for n, _ in replacements]:
+        frozen.update(range(node.lineno + 1, node.end_lineno + 1))
+    start = source.offset(first, 0)
+    edits = [(source.offset(n.lineno, n.col_offset) - start, source.offset(n.end_lineno, n.end_col_offset) - start, text)
+             for n, text in replacements]
+    edits += [(source.offset(line, 0) - start,) * 2 + (indent,)
+              for line in range(first, last + 1) if line not in frozen and source.lines[line - 1].strip()]
+    text = "\n".join(source.lines[first - 1:last])
+    for begin, end, replacement in sorted(edits, key=lambda e: (e[0], e[1]), reverse=True):
+        text = text[:begin] + replacement + text[end:]
+    return text
+
+def _splice(code: str, func: ast.FunctionDef, first: int, new_lines: List[str]) -> str:
+    """Replaces lines first..end of the function with `new_lines`, keeping everything else as written."""
+    lines = code.split("\n")
+    return "\n".join(lines[:first - 1] + new_lines + lines[func.end_lineno:])
+
+def _body_layout(code: str, func: ast.FunctionDef) -> Optional[Tuple[int, str, str]]:
+    """(first line after the docstring, body indentation, one indentation unit), or None for one-line bodies."""
+    start = _body_start(func)
+    if start == len(func.body):
+        return None
+    source = _Source(code)
+    body_indent = source.indent_of(func.body[start])
+    def_indent = source.indent_of(func)
+    if body_indent is None or def_indent is None or func.body[start].lineno == func.lineno:
+        return None
+    first = func.body[start - 1].end_lineno + 1 if start else func.body[start].lineno
+    return first, body_indent, body_indent[len(def_indent):]
+
+def _tail_recursive(func: ast.FunctionDef) -> bool:
+    """Every self call is `return f(...)` with all positional arguments, outside any loop."""
+    params = _params(func)
+    calls = _self_calls(func)
+    if params is None or not calls or any(isinstance(n, _NESTED[:4]) for n in ast.walk(func) if n is not func):
+        return False
+    in_loops = {id(n) for loop in ast.walk(func) if isinstance(loop, LOOPS) for n in ast.walk(loop)}
+    tail_calls = [n.value for n in ast.walk(func) if isinstance(n, ast.Return) and n.value in calls and id(n) not in in_loops]
+    return len(tail_calls) == len(calls) and all(
+        len(c.args) == len(params) and not c.keywords and not any(isinstance(a, ast.Starred) for a in c.args) for c in calls)
+
+def tail_to_loop(code: str, func: ast.FunctionDef) -> Optional[str]:
+    """`return f(x)` becomes `n = x` + `continue` inside `while True`; comments and formatting are kept."""
+    layout = _body_layout(code, func)
+    if not layout:
+        return None
+    first, body_indent, unit = layout
+    params = _params(func)
+    source = _Source(code)
+    last_stmt = func.body[-1]
+    replacements = []
+    for node in ast.walk(func):
+        if not (isinstance(node, ast.Return) and isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name)
+                and node.value.func.id == func.name):
+            continue
+        rebind = _rebind(code, params, node.value.args)
+        indent = source.indent_of(node)
+        if node is last_stmt:
+            # The loop starts its next round anyway
+            replacements.append((node, rebind))
+        elif indent is None:
+            replacements.append((node, f"{rebind}; continue"))
+        else:
+            replacements.append((node, f"{rebind}\n{indent}{unit}continue"))
+    body = _edit_region(code, func, first, func.end_lineno, replacements, unit)
+    new_lines = [f"{body_indent}while True:"] + body.split("\n")
+    if not isinstance(last_stmt, ast.Return):
+        # Falling off the end returned None; in a loop it would start another round
+        new_lines.append(f"{body_indent}{unit}return None")
+    return _splice(code, func, first, new_lines)
+
+def _linear_recursive(func: ast.FunctionDef) -> bool:
+    """
+    Guards (`if cond: return value`) and plain assignments followed by `return expr(f(...))`,
+    with exactly one self call, in the final return.
+    """
+    params = _params(func)
+    calls = _self_calls(func)
+    if params is None or len(calls) != 1:
+        return False
+    call = calls[0]
+    body = func.body[_body_start(func):]
+    if not body:
+        return False
+    *prefix, last = body
+    for stmt in prefix:
+        if _self_calls_in(stmt, func.name):
+            return False
+        guard = isinstance(stmt, ast.If) and not stmt.orelse and len(stmt.body) == 1 and isinstance(stmt.body[0], ast.Return)
+        assign = isinstance(stmt, ast.Assign) and all(isinstance(t, ast.Name) for t in stmt.targets)
+        if not (guard or assign):
+            return False
+    return (isinstance(last, ast.Return) and last.value is not call and call in list(ast.walk(last))
+            and len(call.args) == len(params) and not call.keywords and not any(isinstance(a, ast.Starred) for a in call.args))
+
+def _self_calls_in(node: ast.AST, name: str) -> bool:
+    return any(isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == name for n in ast.walk(node))
+
+def linear_to_loop(code: str, func: ast.FunctionDef, taken: set) -> Optional[str]:
+    """
+    Descends with a loop that saves each frame's variables on an explicit stack, then unwinds
+    the stack applying the pending expression of the final return to the running result.
+    Only valid for pure functions: the pending expression is evaluated after the descent.
+    Guards and assignments keep their original text (and comments).
+    """
+    layout = _body_layout(code, func)
+    if not layout:
+        return None
+    first, b, u = layout
+    params = _params(func)
+    source = _Source(code)
+    *prefix, last = func.body[_body_start(func):]
+    call = next(n for n in ast.walk(last) if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == func.name)
+    frame_vars = list(dict.fromkeys(params + [t.id for s in prefix if isinstance(s, ast.Assign) for t in s.targets]))
+    frames, result = _fresh("_frames", taken), _fresh("_result", taken)
+    saved = ", ".join(frame_vars) + ("," if len(frame_vars) == 1 else "")
+
+    replacements = []
+    for stmt in prefix:
+        if isinstance(stmt, ast.If):
+            ret = stmt.body[0]
+            value = ast.get_source_segment(code, ret.value) if ret.value else "None"
+            indent = source.indent_of(ret)
+            exit_ = f"{result} = {value}; break" if indent is None else f"{result} = {value}\n{indent}{u}break"
+            replacements.append((ret, exit_))
+    descent = _edit_region(code, func, first, last.lineno - 1, replacements, u).split("\n") if first < last.lineno else []
+
+    # The final return's expression with the recursive call replaced by the running result
+    expr = ast.get_source_segment(code, last.value)
+    begin = source.offset(call.lineno, call.col_offset) - source.offset(last.value.lineno, last.value.col_offset)
+    end = source.offset(call.end_lineno, call.end_col_offset) - source.offset(last.value.lineno, last.value.col_offset)
+    pending = expr[:begin] + result + expr[end:]
+    if "\n" in pending:
+        pending = f"({pending})"
+
+    new_lines = [f"{b}{frames} = []", f"{b}while True:"] + descent + [
+        f"{b}{u}{frames}.append(({saved}))",
+        f"{b}{u}{_rebind(code, params, call.args)}",
+        f"{b}while {frames}:",
+        f"{b}{u}{saved} = {frames}.pop()",
+        f"{b}{u}{result} = {pending}",
+        f"{b}return {result}",
+    ]
+    return _splice(code, func, first, new_lines)
+
+def _module_functions(tree: ast.Module) -> List[ast.FunctionDef]:
+    return [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.col_offset == 0 and _self_calls(n)]
+
+def iterative_rewrite(code: str, line_number: Optional[int] = None) -> Optional[Tuple[Finding, str]]:
+    """
+    Rewrites a recursive function into a loop (tail recursion always, linear recursion when pure),
+    preferring the function containing `line_number`. Returns (finding, rewritten code) or None.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    functions = _module_functions(tree)
+    functions.sort(key=lambda f: not (line_number and f.lineno <= line_number <= f.end_lineno))
+    for func in functions:
+        if not _has_base_case(func):
+            # Unbounded recursion: a loop would hang where the recursion fails fast
+            continue
+        if _tail_recursive(func):
+            rewritten = tail_to_loop(code, func)
+            if rewritten:
+                finding = Finding("tail-recursion", func.lineno, f"`{func.name}` is tail recursive; rewritten as a loop",
+                                  "O(n) stack -> O(1) stack", True)
+                return finding, rewritten
+        elif _linear_recursive(func) and is_pure(func, tree):
+            rewritten = linear_to_loop(code, func, _names(tree))
+            if rewritten:
+                finding = Finding("linear-recursion", func.lineno, f"`{func.name}` is linearly recursive; rewritten with an explicit stack",
+                                  "O(n) call stack -> O(n) heap", True)
+                return finding, rewritten
+    return None
+
+def memoize(code: str) -> Optional[Tuple[Finding, str]]:
+    """
+    Adds functools.lru_cache to the first pure, undecorated function that calls itself more than
+    once (overlapping subproblems, e.g. naive fibonacci). Returns (finding, rewritten code) or None.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    taken = _names(tree)
+    if "functools" in taken and not _has_module_import(tree, "functools"):
+        return None
+    source = _Source(code)
+    for func in _module_functions(tree):
+        if len(_self_calls(func)) < 2 or func.decorator_list or not is_pure(func, tree):
+            continue
+        indent = source.indent_of(func)
+        inserts = [(func.lineno - 1, f"{indent}@functools.lru_cache(maxsize=None)")]
+        if not _has_module_import(tree, "functools"):
+            inserts.append((_import_line(tree), "import functools"))
+        finding = Finding("memoize", func.lineno, f"`{func.name}` is pure and recomputes overlapping calls; memoized",
+                          "O(k^n) -> O(n)", True)
+        return finding, _apply(code, [], inserts)
+    return None
+
+# Tried in this order by the optimization phase, each on the result of the previous accepted one
+RECURSION_TRANSFORMS = (memoize, iterative_rewrite)
@@ -0,0 +1,152 @@
+import base64
+import copy
+import difflib
+import json
+import zlib
+from typing import Dict, List, Optional
+
+COMPACT_FORMAT = "delta-v1"
+
+def make_delta(parent: str, child: str) -> list:
+    """
+    Line-based delta turning `parent` into `child`:
+    ["=", n] copies n parent lines, ["-", n] skips n parent lines, ["+", lines] inserts lines.
+    """
+    a = parent.split("\n")
+    b = child.split("\n")
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if tag in ("replace", "delete"):
+            ops.append(["-", i2 - i1])
+        if tag in ("replace", "insert"):
+            ops.append(["+", b[j1:j2]])
+    return ops
+
+def apply_delta(parent: str, delta: list) -> str:
+    lines = parent.split("\n")
+    out = []
+    pos = 0
+    for op, arg in delta:
+        if op == "=":
+            out.extend(lines[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        else:
+            out.extend(arg)
+    return "\n".join(out)
+
+def _pack(value, compress: bool):
+    if not compress:
+        return value
+    raw = zlib.compress(json.dumps(value).encode(), 9)
+    return {"z": base64.b64encode(raw).decode("ascii")}
+
+def _unpack(value):
+    if isinstance(value, dict) and "z" in value:
+        return json.loads(zlib.decompress(base64.b64decode(value["z"])))
+    return value
+
+class _VersionStore:
+    """Deduplicated program versions, each stored as a delta against the previously added one."""
+    def __init__(self, compress: bool):
+        self.compress = compress
+        self.versions: List[dict] = []
+        self._ids: Dict[str, int] = {}
+        self._last: Optional[str] = None
+
+    def ref(self, code: str) -> dict:
+        if code in self._ids:
+            return {"ref": self._ids[code]}
+        version_id = len(self.versions)
+        if self._last is None:
+            entry = {"parent": None, "full": _pack(code, self.compress)}
+        else:
+            entry = {"parent": self._ids[self._last], "delta": _pack(make_delta(self._last, code), self.compress)}
+        self.versions.append(entry)
+        self._ids[code] = version_id
+        self._last = code
+        return {"ref": version_id}
+
+def encode_report(report: dict, compress: bool = False) -> dict:
+    """Converts a full report into the compact delta format (the input is not modified)."""
+    store = _VersionStore(compress)
+    compact = copy.deepcopy(report)
+
+    def ref(value):
+        # Non-code placeholders such as "None" or "" stay inline
+        return store.ref(value) if isinstance(value, str) and value and value != "None" else value
+
+    compact["original_code"] = ref(report.get("original_code"))
+    for trace in compact.get("traces", []):
+        trace["patch"] = ref(trace.get("patch"))
+    compact["best_attempt"] = ref(report.get("best_attempt"))
+    compact["repaired_code"] = ref(report.get("repaired_code"))
+    if compact.get("optimization_report"):
+        compact["optimization_report"]["optimized_code"] = ref(report["optimization_report"].get("optimized_code"))
+    compact["format"] = COMPACT_FORMAT
+    compact["compression"] = "zlib" if compress else None
+    compact["versions"] = store.versions
+    return compact
+
+class ReportReader:
+    """
+    Read access to full and compact reports with the same interface.
+    Code fields stored as {"ref": n} are reconstructed on first access and memoized.
+    """
+    def __init__(self, report: dict):
+        self.report = report
+        self.versions = report.get("versions", [])
+        self._cache: Dict[int, str] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "ReportReader":
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    @property
+    def compact(self) -> bool:
+        return self.report.get("format") == COMPACT_FORMAT
+
+    def version(self, version_id: int) -> str:
+        if version_id in self._cache:
+            return self._cache[version_id]
+        # Walk up to the nearest cached or full ancestor, then replay deltas downwards
+        chain = []
+        current = version_id
+        while current not in self._cache and "full" not in self.versions[current]:
+            chain.append(current)
+            current = self.versions[current]["parent"]
+        if current not in self._cache:
+            self._cache[current] = _unpack(self.versions[current]["full"])
+        code = self._cache[current]
+        for vid in reversed(chain):
+            code = apply_delta(code, _unpack(self.versions[vid]["delta"]))
+            self._cache[vid] = code
+        return code
+
+    def code(self, value):
+        """Resolves a code field (a {"ref": n} or an inline value)."""
+        if isinstance(value, dict) and "ref" in value:
+            return self.version(value["ref"])
+        return value
+
+    def get(self, key: str, default=None):
+        value = self.report.get(key, default)
+        if key == "optimization_report" and isinstance(value, dict):
+            return {**value, "optimized_code": self.code(value.get("optimized_code"))}
+        return self.code(value)
+
+    def expand(self) -> dict:
+        """Full (legacy format) report with every version reconstructed."""
+        if not self.compact:
+            return self.report
+        full = {k: v for k, v in self.report.items() if k not in ("format", "compression", "versions")}
+        for key in ("original_code", "repaired_code", "best_attempt", "optimization_report"):
+            if key in full:
+                full[key] = self.get(key)
+        full["traces"] = [{**t, "patch": self.code(t.get("patch"))} for t in self.report.get("traces", [])]
+        return full
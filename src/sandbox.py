@@ -1,9 +1,39 @@
+import ast
+import atexit
+import json
+import re
+import selectors
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
 import os
+import time
+from collections import Counter
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional, Tuple
+from .budget import Budget
+from .telemetry import Telemetry
+from .workspace import Workspace, _ENTRY_PREFIX
+
+@dataclass
+class HangSite:
+    """Where a timed out program was spending its time, from periodic stack samples of the child."""
+    # "<script>" for a single script, the path relative to the project for workspace files
+    file: str
+    line: int
+    function: str
+    # Program frames of a sample taken at the hot line, innermost first: [{"file", "line", "function"}]
+    stack: List[dict]
+    # Samples whose innermost program frame was this line, out of all samples taken
+    hits: int
+    samples: int
+
+    def describe(self) -> str:
+        calls = " <- ".join(f"{frame['function']} (line {frame['line']})" for frame in self.stack)
+        return (f"line {self.line} in {self.function} ({self.file}), {self.hits} of {self.samples} stack samples; "
+                f"call stack, innermost first: {calls}")
 
 @dataclass
 class ExecutionResult:
@@ -11,36 +41,382 @@ class ExecutionResult:
     stderr: str
     return_code: int
     timed_out: bool = False
+    duration: float = 0.0
+    # Hot spot of a timed out run (None if no sample reached the program's own code)
+    hang: Optional[HangSite] = None
+
+@dataclass
+class PairedResult:
+    """
+    Outcome of running two programs side by side and comparing their stdout as it streams.
+    The compared output is not retained, so `first.stdout` and `second.stdout` are empty.
+    """
+    first: ExecutionResult
+    second: ExecutionResult
+    match: bool
+    # Byte offset and 1-based line of the first difference (None when the outputs match)
+    offset: Optional[int] = None
+    line: Optional[int] = None
+    expected: str = ""
+    actual: str = ""
+    # True if the runs were stopped early because the outputs diverged
+    stopped_early: bool = False
+
+    def describe(self) -> str:
+        return (f"first difference at byte {self.offset} (line {self.line}): "
+                f"expected {self.expected!r}, got {self.actual!r}")
+
+@dataclass
+class MemoryProfile:
+    """tracemalloc measurement of one run: exact peak traced memory, or the top allocation sites near the peak."""
+    result: ExecutionResult
+    # None for site profiles (top > 0) and failed runs
+    peak_bytes: Optional[int]
+    # [{"file", "line", "size_bytes", "count"}] largest first
+    sites: List[dict]
+
+# Read size for streamed output and how far one program may run ahead of the other
+STREAM_CHUNK = 64 * 1024
+MAX_LAG = 1024 * 1024
+# Longest part of a line reported on each side of a divergence
+_SNIPPET = 60
+
+# Runs in every sandboxed interpreter before the program: seeds the random module and arms
+# faulthandler to dump the stack periodically and on SIGUSR1 (sent just before a timeout kill).
+# It reads os.environ itself, so it also works under -E/-I, which only stop the interpreter reading PYTHON* variables.
+_SANDBOX_SETUP = """import os
+if "DEBUG_SANDBOX_SEED" in os.environ:
+    import random
+    random.seed(int(os.environ["DEBUG_SANDBOX_SEED"]))
+if "DEBUG_SANDBOX_STACKS" in os.environ:
+    import faulthandler, signal
+    _stacks = open(os.environ["DEBUG_SANDBOX_STACKS"], "w")
+    faulthandler.register(signal.SIGUSR1, file=_stacks, all_threads=True)
+    faulthandler.dump_traceback_later(float(os.environ["DEBUG_SANDBOX_STACK_INTERVAL"]), repeat=True, file=_stacks)
+"""
+# File delivery imports the setup as sitecustomize (via PYTHONPATH). Being first on the path hides
+# any system or virtualenv sitecustomize, so that one is found further down sys.path and run first.
+_SITECUSTOMIZE = r"""import os, sys
+def _chain_sitecustomize():
+    import importlib.machinery, importlib.util
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = [entry for entry in sys.path if os.path.abspath(entry or os.curdir) != here]
+    spec = importlib.machinery.PathFinder.find_spec("sitecustomize", path)
+    if spec is None or spec.loader is None:
+        return
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["sitecustomize"] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception as e:
+        # What site.py reports for a failing sitecustomize
+        print(f"Error in sitecustomize; set PYTHONVERBOSE for traceback:\n{type(e).__name__}: {e}", file=sys.stderr)
+_chain_sitecustomize()
+del _chain_sitecustomize
+""" + _SANDBOX_SETUP
+# Stdin delivery (`python -c`): runs the setup, reads the program from stdin and executes it as
+# __main__ under the name "<script>", with its source registered so tracebacks still show lines
+_STDIN_RUNNER = _SANDBOX_SETUP + r"""
+import linecache, sys, types
+_source = sys.stdin.read()
+# The program sees the same empty stdin as with file delivery
+sys.stdin = open(os.devnull)
+linecache.cache["<script>"] = (len(_source), None, _source.splitlines(True), "<script>")
+sys.argv = ["<script>"]
+if sys.path and sys.path[0] == "":
+    del sys.path[0]
+_main = types.ModuleType("__main__")
+_main.__builtins__ = __builtins__
+sys.modules["__main__"] = _main
+try:
+    exec(compile(_source, "<script>", "exec"), _main.__dict__)
+except Exception as _error:
+    # Printed by the traceback module, which reads "<script>" lines from linecache; the runner's frame is left out
+    import traceback
+    traceback.print_exception(type(_error), _error, _error.__traceback__.tb_next)
+    sys.exit(1)
+"""
+_bootstrap_dir = None
+
+@dataclass(frozen=True)
+class LaunchProfile:
+    """How the sandboxed interpreter is started: code on stdin instead of a temp file, and interpreter flags."""
+    name: str
+    stdin: bool = False
+    flags: Tuple[str, ...] = ()
+
+LAUNCH_PROFILES = {profile.name: profile for profile in (
+    LaunchProfile("file"),
+    LaunchProfile("stdin", stdin=True),
+    LaunchProfile("noenv", stdin=True, flags=("-E",)),
+    LaunchProfile("isolated", stdin=True, flags=("-I",)),
+    LaunchProfile("nosite", stdin=True, flags=("-S",)),
+    LaunchProfile("minimal", stdin=True, flags=("-I", "-S")),
+)}
+# RAM-backed directory for per-run working directories (tmpfs=True)
+TMPFS_ROOT = "/dev/shm"
+# Builtins added by the site module: code using them cannot run under -S
+_SITE_BUILTINS = {"exit", "quit", "help", "copyright", "credits", "license"}
+
+def stdlib_only(code: str) -> bool:
+    """True if every import in `code` is a standard library module (so no site-packages, PYTHONPATH or script dir is needed)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import) and any(a.name.split(".")[0] not in sys.stdlib_module_names for a in node.names):
+            return False
+        if isinstance(node, ast.ImportFrom) and (node.level or (node.module or "").split(".")[0] not in sys.stdlib_module_names):
+            return False
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "__import__":
+            return False
+    return True
+
+def _uses_site_builtins(code: str) -> bool:
+    try:
+        return any(isinstance(n, ast.Name) and n.id in _SITE_BUILTINS for n in ast.walk(ast.parse(code)))
+    except SyntaxError:
+        return True
+
+@dataclass
+class _Launch:
+    command: list
+    cwd: Optional[str]
+    env: Optional[dict]
+    # Program source sent on stdin (None: stdin is /dev/null, which the stdin runner also gives the program)
+    stdin: Optional[str]
+    # File name the program's frames carry in tracebacks and stack dumps
+    script: str
+    # Files and directories removed after the run
+    cleanup: List[str]
+
+# Stack samples spread over the timeout of a run, and how long the final SIGUSR1 dump gets before the kill
+STACK_SAMPLES = 10
+_FINAL_DUMP_WAIT = 0.05
+_FAULT_FRAME = re.compile(r'^\s+File "(.+)", line (\d+) in (.+)$')
+
+# Shortest run a nearly spent session budget still gets
+MIN_RUN_SECONDS = 0.1
+# tracemalloc slows programs down; profiled runs get this many times the normal timeout
+MEMORY_PROFILE_SLOWDOWN = 4
+# Runs the script under tracemalloc. With top == 0 only the peak is read at exit, which is exact.
+# With top > 0 a sampler thread snapshots the allocation sites whenever traced memory doubles (above 1 MiB)
+# and keeps the largest; the snapshots themselves allocate traced memory, so no peak is reported then.
+_MEMORY_PROFILER = r"""
+import json, os, runpy, sys, threading, time, tracemalloc
+path, out_path, top = sys.argv[1], sys.argv[2], int(sys.argv[3])
+sys.argv = [path]
+sys.path[0] = os.path.dirname(path)
+state = {"sampled": 1 << 20, "sites": []}
+lock = threading.Lock()
+def sample(final=False):
+    with lock:
+        current, _ = tracemalloc.get_traced_memory()
+        if current > state["sampled"] * 2 or (final and not state["sites"]):
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, os.path.join(os.path.dirname(path), "*"))])
+            state["sampled"] = max(current, state["sampled"])
+            state["sites"] = [{"file": s.traceback[0].filename, "line": s.traceback[0].lineno, "size_bytes": s.size, "count": s.count}
+                              for s in snapshot.statistics("lineno")[:top]]
+def sampler():
+    try:
+        while True:
+            time.sleep(0.01)
+            sample()
+    except Exception:
+        pass
+tracemalloc.start()
+if top:
+    threading.Thread(target=sampler, daemon=True).start()
+try:
+    runpy.run_path(path, run_name="__main__")
+finally:
+    peak = tracemalloc.get_traced_memory()[1]
+    if top:
+        sample(final=True)
+    with open(out_path, "w") as f:
+        json.dump({"peak_bytes": None if top else peak, "sites": state["sites"]}, f)
+"""
+
+def _read_stack_samples(path: str) -> List[List[Tuple[str, int, str]]]:
+    """
+    Parses faulthandler dumps into one (file, line, function) list per thread per dump, innermost first.
+    Every header line ("Thread 0x...", "Timeout (...)!", "Stack ...") starts a new list.
+    """
+    samples, current = [], None
+    try:
+        with open(path, "r", errors="replace") as f:
+            for line in f:
+                match = _FAULT_FRAME.match(line.rstrip("\n"))
+                if not match:
+                    current = None
+                    continue
+                if current is None:
+                    current = []
+                    samples.append(current)
+                current.append((match.group(1), int(match.group(2)), match.group(3).strip()))
+    except OSError:
+        return []
+    return samples
+
+def _seed_bootstrap() -> str:
+    """Directory holding the sandbox sitecustomize module, created once per process."""
+    global _bootstrap_dir
+    if _bootstrap_dir is None:
+        directory = tempfile.mkdtemp(prefix="debug_sandbox_boot_")
+        with open(os.path.join(directory, "sitecustomize.py"), "w") as f:
+            f.write(_SITECUSTOMIZE)
+        atexit.register(shutil.rmtree, directory, True)
+        _bootstrap_dir = directory
+    return _bootstrap_dir
 
 class Sandbox:
-    def __init__(self, timeout: int = 2):
+    def __init__(self, timeout: int = 2, telemetry: Optional[Telemetry] = None, workspace: Optional[Workspace] = None,
+                 seed: Optional[int] = 0, stack_samples: int = STACK_SAMPLES, launch: str = "file", tmpfs: bool = False,
+                 budget: Optional[Budget] = None):
         self.timeout = timeout
+        # Session budget: no run outlasts its deadline (None: runs get the full timeout)
+        self.budget = budget
+        self.telemetry = telemetry or Telemetry()
+        # With a workspace, `code` is the entry point and runs inside the staged project
+        self.workspace = workspace
+        # Pins PYTHONHASHSEED and seeds `random` so repeated runs print the same output (None disables)
+        self.seed = seed
+        # Stack dumps taken over the timeout of run() to locate hangs (0 disables)
+        self.stack_samples = stack_samples
+        if launch not in LAUNCH_PROFILES:
+            raise ValueError(f"Unknown launch profile {launch} (choose from {', '.join(LAUNCH_PROFILES)})")
+        self.launch = LAUNCH_PROFILES[launch]
+        # Each run gets a fresh working directory on tmpfs (and its script file, with file delivery)
+        self.tmpfs = tmpfs
+        self._env = self._child_env(sitecustomize=True)
+        self._stdin_env = self._child_env(sitecustomize=False)
+
+    def _child_env(self, sitecustomize: bool) -> Optional[dict]:
+        if self.seed is None and not self.stack_samples:
+            return None
+        env = dict(os.environ)
+        if self.seed is not None:
+            env["PYTHONHASHSEED"] = str(self.seed)
+            env["DEBUG_SANDBOX_SEED"] = str(self.seed)
+        if sitecustomize:
+            env["PYTHONPATH"] = os.pathsep.join(p for p in (_seed_bootstrap(), env.get("PYTHONPATH")) if p)
+        return env
+
+    def _time_limit(self, scale: float = 1) -> float:
+        """`scale` times the timeout, cut to what the session budget has left (never below MIN_RUN_SECONDS)."""
+        limit = self.timeout * scale
+        remaining = self.budget.session_remaining() if self.budget else None
+        return limit if remaining is None else max(MIN_RUN_SECONDS, min(limit, remaining))
+
+    def launch_options(self, code: str) -> Tuple[bool, Tuple[str, ...]]:
+        """
+        The (stdin delivery, interpreter flags) this sandbox's profile resolves to for `code`.
+        Flags are dropped unless the code only imports the standard library (-S also needs no site
+        builtins such as exit()); with a seed, -I becomes -s and -E is dropped because both make the
+        interpreter ignore PYTHONHASHSEED. Code reading __file__ and workspace runs need a real file.
+        """
+        profile = self.launch
+        if self.workspace or not profile.stdin or "__file__" in code:
+            return False, ()
+        flags = profile.flags if stdlib_only(code) else ()
+        if "-S" in flags and _uses_site_builtins(code):
+            flags = tuple(f for f in flags if f != "-S")
+        if self.seed is not None:
+            flags = tuple("-s" if f == "-I" else f for f in flags if f != "-E")
+        return True, flags
 
     def run(self, code: str) -> ExecutionResult:
+        start = time.perf_counter()
+        result = self._run(code)
+        result.duration = time.perf_counter() - start
+        self.telemetry.record_sandbox(result.duration)
+        return result
+
+    def _prepare(self, code: str, file_only: bool = False) -> _Launch:
+        """Sets up one run: writes the script (unless it goes over stdin) and builds the command line."""
+        if self.workspace:
+            tmp_path = self.workspace.entry_script(code)
+            # Imports through linked directories must not write __pycache__ into the original project
+            return _Launch([sys.executable, "-B", tmp_path], self.workspace.staged_dir, self._env, None, tmp_path, [tmp_path])
+        cleanup = []
+        cwd = None
+        if self.tmpfs:
+            cwd = tempfile.mkdtemp(prefix="debug_run_", dir=TMPFS_ROOT if os.path.isdir(TMPFS_ROOT) else None)
+            cleanup.append(cwd)
+        use_stdin, flags = (False, ()) if file_only else self.launch_options(code)
+        if use_stdin:
+            return _Launch([sys.executable, *flags, "-c", _STDIN_RUNNER], cwd, self._stdin_env, code, "<script>", cleanup)
         # Create a temporary file to run the code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp_file:
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, dir=cwd) as tmp_file:
             tmp_file.write(code)
             tmp_path = tmp_file.name
+        cleanup.append(tmp_path)
+        return _Launch([sys.executable, tmp_path], cwd, self._env, None, tmp_path, cleanup)
+
+    @staticmethod
+    def _cleanup(paths):
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif path and os.path.exists(path):
+                os.remove(path)
+
+    def measure_startup(self, repeats: int = 10) -> List[dict]:
+        """
+        Times an empty program under every launch profile, on disk and on tmpfs, with this
+        sandbox's seed and stack sampling settings. Returns one row per configuration, fastest first.
+        """
+        rows = []
+        for name in LAUNCH_PROFILES:
+            for tmpfs in ((False, True) if os.path.isdir(TMPFS_ROOT) else (False,)):
+                sandbox = Sandbox(self.timeout, seed=self.seed, stack_samples=self.stack_samples, launch=name, tmpfs=tmpfs)
+                stdin, flags = sandbox.launch_options("pass")
+                durations = sorted(sandbox.run("pass").duration for _ in range(repeats))
+                rows.append({
+                    "profile": name,
+                    "tmpfs": tmpfs,
+                    "delivery": "stdin" if stdin else "file",
+                    "flags": " ".join(flags),
+                    "median_ms": round(durations[len(durations) // 2] * 1000, 2),
+                    "best_ms": round(durations[0] * 1000, 2),
+                })
+        return sorted(rows, key=lambda row: row["median_ms"])
+
+    def _run(self, code: str) -> ExecutionResult:
+        launch = self._prepare(code)
+        env = launch.env
+        limit = self._time_limit()
 
         try:
+            if self.stack_samples:
+                fd, stacks_path = tempfile.mkstemp(prefix="debug_stacks_", suffix=".txt")
+                os.close(fd)
+                launch.cleanup.append(stacks_path)
+                env = dict(env, DEBUG_SANDBOX_STACKS=stacks_path, DEBUG_SANDBOX_STACK_INTERVAL=str(limit / self.stack_samples))
             # Run the code in a subprocess
-            result = subprocess.run(
-                [sys.executable, tmp_path],
-                capture_output=True,
-                text=True,
-                timeout=self.timeout
-            )
+            proc = subprocess.Popen(launch.command, stdin=subprocess.PIPE if launch.stdin is not None else subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=launch.cwd, env=env)
+            try:
+                stdout, stderr = proc.communicate(launch.stdin, timeout=limit)
+            except subprocess.TimeoutExpired:
+                if self.stack_samples:
+                    # One last dump of where the program is right now, then kill it
+                    proc.send_signal(signal.SIGUSR1)
+                    time.sleep(_FINAL_DUMP_WAIT)
+                proc.kill()
+                stdout, stderr = proc.communicate()
+                return ExecutionResult(
+                    stdout=stdout or "",
+                    stderr=stderr or "Execution timed out.",
+                    return_code=-1,
+                    timed_out=True,
+                    hang=self._hang_site(stacks_path, launch.script) if self.stack_samples else None
+                )
             return ExecutionResult(
-                stdout=result.stdout,
-                stderr=result.stderr,
-                return_code=result.returncode
-            )
-        except subprocess.TimeoutExpired as e:
-            return ExecutionResult(
-                stdout=e.stdout if e.stdout else "",
-                stderr=e.stderr if e.stderr else "Execution timed out.",
-                return_code=-1,
-                timed_out=True
+                stdout=stdout,
+                stderr=stderr,
+                return_code=proc.returncode
             )
         except Exception as e:
             return ExecutionResult(
@@ -49,6 +425,246 @@ class Sandbox:
                 return_code=-1
             )
         finally:
-            # Clean up the temporary file
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+            # Clean up the temporary files
+            self._cleanup(launch.cleanup)
+
+    def _program_file(self, path: str, script_path: str) -> Optional[str]:
+        """Display name of a sampled frame's file if it belongs to the program under test, else None."""
+        if path == script_path:
+            return self.workspace.entry if self.workspace else "<script>"
+        if self.workspace and self.workspace.staged_dir and path.startswith(self.workspace.staged_dir + os.sep):
+            rel = os.path.relpath(path, self.workspace.staged_dir)
+            return self.workspace.entry if os.path.basename(rel).startswith(_ENTRY_PREFIX) else rel
+        return None
+
+    def _hang_site(self, stacks_path: str, script_path: str) -> Optional[HangSite]:
+        """The program line most often innermost in the stack samples (latest sample wins ties)."""
+        stacks = []
+        for sample in _read_stack_samples(stacks_path):
+            frames = [{"file": name, "line": line, "function": function}
+                      for path, line, function in sample for name in [self._program_file(path, script_path)] if name]
+            if frames:
+                stacks.append(frames)
+        if not stacks:
+            return None
+        hits = Counter((frames[0]["file"], frames[0]["line"]) for frames in stacks)
+        latest = {(frames[0]["file"], frames[0]["line"]): index for index, frames in enumerate(stacks)}
+        hot = max(hits, key=lambda site: (hits[site], latest[site]))
+        stack = stacks[latest[hot]]
+        return HangSite(file=hot[0], line=hot[1], function=stack[0]["function"], stack=stack,
+                        hits=hits[hot], samples=len(stacks))
+
+    def run_paired(self, first_code: str, second_code: str, normalizer=None) -> PairedResult:
+        """
+        Runs both programs concurrently and compares their stdout chunk by chunk
+        (line by line through `normalizer`, an OutputNormalizer, when one is given).
+        Both are killed as soon as the outputs differ, so a mismatch costs only the time to reach it.
+        Memory stays bounded: matched output is discarded and a program more than MAX_LAG bytes
+        ahead of the other is paused by no longer draining its pipe.
+        """
+        start = time.perf_counter()
+        prepared = [self._prepare(first_code), self._prepare(second_code)]
+        stderr_files = [tempfile.TemporaryFile() for _ in prepared]
+        procs = []
+        try:
+            for launch, stderr_file in zip(prepared, stderr_files):
+                proc = subprocess.Popen(launch.command, stdin=subprocess.PIPE if launch.stdin is not None else subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=stderr_file, cwd=launch.cwd, env=launch.env)
+                procs.append(proc)
+                if launch.stdin is not None:
+                    # The runner reads the whole program before producing any output, so this cannot block on stdout
+                    try:
+                        proc.stdin.write(launch.stdin.encode())
+                        proc.stdin.close()
+                    except BrokenPipeError:
+                        pass
+            outcome = self._compare_streams(procs, start + self._time_limit(), normalizer)
+            results = []
+            for proc, stderr_file in zip(procs, stderr_files):
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode(errors="replace")
+                timed_out = outcome["timed_out"] and proc in outcome["killed"]
+                results.append(ExecutionResult(
+                    stdout="",
+                    stderr=stderr or ("Execution timed out." if timed_out else ""),
+                    return_code=-1 if proc in outcome["killed"] else proc.returncode,
+                    timed_out=timed_out,
+                    duration=time.perf_counter() - start,
+                ))
+        except Exception as e:
+            failed = ExecutionResult(stdout="", stderr=str(e), return_code=-1)
+            return PairedResult(failed, failed, False)
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                proc.stdout.close()
+            for stderr_file in stderr_files:
+                stderr_file.close()
+            for launch in prepared:
+                self._cleanup(launch.cleanup)
+        for result in results:
+            self.telemetry.record_sandbox(result.duration)
+        return PairedResult(results[0], results[1], outcome["offset"] is None, outcome["offset"], outcome["line"],
+                            outcome["expected"], outcome["actual"], bool(outcome["killed"]) and not outcome["timed_out"])
+
+    def _compare_streams(self, procs, deadline: float, normalizer=None) -> dict:
+        outcome = {"offset": None, "line": None, "expected": "", "actual": "", "killed": [], "timed_out": False}
+        # Time spent normalizing is the comparator's, not the programs': it extends their deadline
+        normalizing = 0.0
+        pending = [b"", b""]
+        eof = [False, False]
+        # Bytes (of the first output) and newlines already matched, plus the start of the current line for context
+        matched = 0
+        lines = 0
+        line_start = b""
+        selector = selectors.DefaultSelector()
+        for index, proc in enumerate(procs):
+            selector.register(proc.stdout, selectors.EVENT_READ, index)
+        registered = {0, 1}
+
+        def common_prefix(a: bytes, b: bytes) -> int:
+            size = min(len(a), len(b))
+            if a[:size] == b[:size]:
+                return size
+            return next(i for i in range(size) if a[i] != b[i])
+
+        def diverge(position: int, killed):
+            outcome["offset"] = matched + position
+            outcome["line"] = lines + pending[0][:position].count(b"\n") + 1
+            # The differing line of each output (as far as it has been read)
+            context = (line_start + pending[0][:position]).rsplit(b"\n", 1)[-1][-_SNIPPET:]
+            outcome["expected"] = (context + pending[0][position:position + _SNIPPET].split(b"\n", 1)[0]).decode(errors="replace")
+            outcome["actual"] = (context + pending[1][position:position + _SNIPPET].split(b"\n", 1)[0]).decode(errors="replace")
+            outcome["killed"] = killed
+
+        def consume(size_first: int, size_second: int):
+            nonlocal matched, lines, line_start
+            matched += size_first
+            lines += pending[0][:size_first].count(b"\n")
+            line_start = (line_start + pending[0][:size_first]).rsplit(b"\n", 1)[-1][-_SNIPPET:]
+            pending[0], pending[1] = pending[0][size_first:], pending[1][size_second:]
+
+        def advance_exact() -> bool:
+            """Consumes the identical prefix; returns False once the outputs have diverged."""
+            position = common_prefix(pending[0], pending[1])
+            if position < min(len(pending[0]), len(pending[1])):
+                diverge(position, list(procs))
+                return False
+            # One stream ended while the other still has unmatched output
+            ended = [i for i in (0, 1) if eof[i] and len(pending[i]) < len(pending[1 - i])]
+            if ended:
+                diverge(len(pending[ended[0]]), [procs[1 - ended[0]]])
+                return False
+            consume(position, position)
+            return True
+
+        def advance_normalized() -> bool:
+            """Consumes whole equivalent lines; identical prefixes are skipped without normalizing."""
+            position = common_prefix(pending[0], pending[1])
+            cut = pending[0].rfind(b"\n", 0, position) + 1
+            consume(cut, cut)
+            while True:
+                ends = [pending[i].find(b"\n") for i in (0, 1)]
+                if any(end < 0 and not eof[i] for i, end in enumerate(ends)):
+                    return True
+                if not pending[0] and not pending[1]:
+                    return True
+                if not pending[0] or not pending[1]:
+                    ended = 0 if not pending[0] else 1
+                    diverge(0, [procs[1 - ended]])
+                    return False
+                sizes = [end + 1 if end >= 0 else len(pending[i]) for i, end in enumerate(ends)]
+                first, second = (pending[i][:sizes[i]].rstrip(b"\n").decode(errors="replace") for i in (0, 1))
+                started = time.perf_counter()
+                equal = normalizer.lines_equal(first, second)
+                nonlocal normalizing
+                normalizing += time.perf_counter() - started
+                if not equal:
+                    diverge(common_prefix(pending[0], pending[1]), list(procs))
+                    return False
+                consume(sizes[0], sizes[1])
+
+        advance = advance_normalized if normalizer else advance_exact
+        try:
+            while not all(eof):
+                # Pause a program that is too far ahead; the other one is always readable or at EOF
+                for index in (0, 1):
+                    other = 1 - index
+                    ahead = len(pending[index]) - len(pending[other]) > MAX_LAG and not eof[other]
+                    if ahead and index in registered:
+                        selector.unregister(procs[index].stdout)
+                        registered.discard(index)
+                    elif not ahead and index not in registered and not eof[index]:
+                        selector.register(procs[index].stdout, selectors.EVENT_READ, index)
+                        registered.add(index)
+                remaining = deadline + normalizing - time.perf_counter()
+                if remaining <= 0:
+                    outcome["timed_out"] = True
+                    outcome["killed"] = [p for p, done in zip(procs, eof) if not done]
+                    break
+                for key, _ in selector.select(timeout=remaining):
+                    index = key.data
+                    chunk = os.read(key.fd, STREAM_CHUNK)
+                    if chunk:
+                        pending[index] += chunk
+                    else:
+                        eof[index] = True
+                        selector.unregister(key.fileobj)
+                        registered.discard(index)
+                if not advance():
+                    break
+        finally:
+            selector.close()
+        for proc in outcome["killed"]:
+            proc.kill()
+        for proc in procs:
+            try:
+                proc.wait(timeout=max(deadline + normalizing - time.perf_counter(), 0.1))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                outcome["killed"].append(proc)
+                outcome["timed_out"] = True
+        return outcome
+
+    def profile_memory(self, code: str, top: int = 0) -> MemoryProfile:
+        """
+        Runs `code` under tracemalloc. With top == 0 the result holds the exact peak traced memory;
+        otherwise it holds the `top` largest allocation sites sampled near the peak.
+        """
+        launch = self._prepare(code, file_only=True)
+        tmp_path = launch.script
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out_file:
+            out_path = out_file.name
+        start = time.perf_counter()
+        try:
+            completed = subprocess.run(
+                launch.command[:-1] + ["-c", _MEMORY_PROFILER, tmp_path, out_path, str(top)],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=self._time_limit(MEMORY_PROFILE_SLOWDOWN),
+                cwd=launch.cwd,
+                env=launch.env
+            )
+            result = ExecutionResult(completed.stdout, completed.stderr, completed.returncode)
+            with open(out_path, "r") as f:
+                data = json.load(f) if os.path.getsize(out_path) else {}
+            if not isinstance(data, dict):
+                raise json.JSONDecodeError("expected a JSON object", "", 0)
+        except subprocess.TimeoutExpired:
+            result, data = ExecutionResult("", "Execution timed out.", -1, timed_out=True), {}
+        except json.JSONDecodeError as e:
+            # A profiler killed mid-write (or a program that overwrote the output file) leaves no usable profile
+            stderr = f"{result.stderr}\nUnreadable memory profile: {e}".lstrip("\n")
+            result, data = ExecutionResult(result.stdout, stderr, result.return_code or -1), {}
+        finally:
+            self._cleanup(launch.cleanup + [out_path])
+        result.duration = time.perf_counter() - start
+        self.telemetry.record_sandbox(result.duration)
+        # Report sites against the file the caller knows, not the temporary script
+        sites = [{**site, "file": "<script>" if site["file"] == tmp_path else os.path.basename(site["file"])}
+                 for site in data.get("sites", [])]
+        return MemoryProfile(result, data.get("peak_bytes"), sites)
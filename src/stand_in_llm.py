@@ -0,0 +1,148 @@
+import difflib
+import json
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict
+
+from .structured_output import CODE_FIELDS, OPTIMIZATION_SCHEMA, REPAIR_SCHEMA
+
+class StandInLLM:
+    """
+    Deterministic local stand-in for the Ollama HTTP API.
+    Every prompt is answered with the known fix of the closest corpus script,
+    so benchmark runs are reproducible and need no model.
+    """
+    def __init__(self, solutions: Dict[str, str], host: str = "127.0.0.1", port: int = 0):
+        # original code -> fixed code
+        self.solutions = solutions
+        self.host = host
+        self.port = port
+        self.calls = 0
+        # Returned contexts (as tuples) -> the program last answered in that conversation
+        self.contexts: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @classmethod
+    def from_corpus(cls, tests_dir: str = "tests", fixed_dir: str = "fixed_tests", **kwargs) -> "StandInLLM":
+        solutions = {}
+        for filename in sorted(os.listdir(tests_dir)):
+            name, ext = os.path.splitext(filename)
+            fixed_path = os.path.join(fixed_dir, f"{name}_fixed{ext}")
+            if ext == ".py" and os.path.exists(fixed_path):
+                with open(os.path.join(tests_dir, filename), "r") as f:
+                    original = f.read()
+                with open(fixed_path, "r") as f:
+                    solutions[original] = f.read()
+        return cls(solutions, **kwargs)
+
+    def solve(self, code: str) -> str:
+        """Fixed version of the corpus script closest to `code` (the code itself if nothing is close)."""
+        best, best_ratio = None, 0.0
+        for original, fixed in self.solutions.items():
+            for candidate in (original, fixed):
+                ratio = difflib.SequenceMatcher(None, code, candidate).ratio()
+                if ratio > best_ratio:
+                    best, best_ratio = fixed, ratio
+        return best if best is not None and best_ratio >= 0.5 else code
+
+    @staticmethod
+    def field(name: str, spec: dict, fixed: str):
+        if name in CODE_FIELDS:
+            return fixed
+        if spec.get("type") == "array":
+            return []
+        return "O(n)" if name.endswith("complexity") else "Applied the known fix."
+
+    def respond(self, payload: dict) -> dict:
+        prompt = payload.get("prompt", "")
+        match = re.search(r"```python\n(.*?)```", prompt, re.DOTALL)
+        context = payload.get("context") or []
+        with self._lock:
+            # A follow-up in a conversation carries no program: continue from the one answered last
+            code = match.group(1).strip() if match else self.contexts.get(tuple(context), "")
+        fixed = self.solve(code)
+        schema = payload.get("format")
+        if schema == "json":
+            # Plain JSON mode: answer with the fields the prompt asks for
+            schema = REPAIR_SCHEMA if '"fixed_code"' in prompt else OPTIMIZATION_SCHEMA
+        if isinstance(schema, dict):
+            response = json.dumps({name: self.field(name, spec, fixed) for name, spec in schema.get("properties", {}).items()})
+        else:
+            response = f"```python\n{fixed}\n```"
+        with self._lock:
+            # One token per four characters of prompt and response, tagged so conversations stay distinct
+            new_context = list(context) + [len(self.contexts)] * ((len(prompt) + len(response)) // 4)
+            self.contexts[tuple(new_context)] = fixed
+        return {
+            "model": payload.get("model"),
+            "response": response,
+            "done": True,
+            "load_duration": 0,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": 0,
+            "eval_count": len(response) // 4,
+            "eval_duration": 0,
+            "context": new_context,
+        }
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body: dict, status: int = 200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send({"models": []})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/generate":
+                    self._send({"error": "not found"}, 404)
+                    return
+                with stand_in._lock:
+                    stand_in.calls += 1
+                self._send(stand_in.respond(payload))
+
+        return Handler
+
+    def start(self) -> str:
+        """Starts serving in a background thread and returns the base URL."""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
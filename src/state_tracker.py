@@ -0,0 +1,94 @@
+import ast
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+def _strip_docstrings(tree: ast.AST):
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                node.body = body[1:] or [ast.Pass()]
+
+def state_hash(code: Union[str, Mapping[str, str]]) -> str:
+    """
+    Hash of a program state that ignores comments, formatting and docstrings.
+    Code that does not parse falls back to a whitespace-normalized text hash.
+    Multi-file (workspace) states are {relative path: source} mappings.
+    """
+    if isinstance(code, Mapping):
+        combined = "\n".join(f"{path}:{state_hash(source)}" for path, source in sorted(code.items()))
+        return hashlib.sha256(combined.encode()).hexdigest()
+    try:
+        tree = ast.parse(code)
+        _strip_docstrings(tree)
+        canonical = ast.dump(tree, annotate_fields=False)
+    except SyntaxError:
+        canonical = "\n".join(line.rstrip() for line in code.strip().splitlines())
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+@dataclass
+class StateRecord:
+    # Source, or {relative path: source} for workspace sessions
+    code: Union[str, Dict[str, str]]
+    result: object
+    # (error_type, line_number, message) for failing states
+    analysis: Tuple[Optional[str], Optional[int], Optional[str]]
+    iteration: int
+    visits: int = 1
+
+    @property
+    def failed(self) -> bool:
+        return self.result.return_code != 0
+
+    @property
+    def progress(self) -> tuple:
+        """How far the program got before failing; larger is better."""
+        error_type, line_number, _ = self.analysis
+        return (
+            not self.result.timed_out,
+            len(self.result.stdout.splitlines()),
+            line_number or 0,
+            -self.iteration,
+        )
+
+    def summary(self) -> str:
+        error_type, line_number, message = self.analysis
+        location = f" at line {line_number}" if line_number else ""
+        return f"{error_type or 'Failure'}{location}: {message or 'no message'}"
+
+class StateTracker:
+    """
+    Remembers every program state explored in a session (by normalized AST hash) with its result.
+    Lets the repair loop skip sandbox runs for known states and backtrack out of cycles.
+    """
+    def __init__(self):
+        self.states: Dict[str, StateRecord] = {}
+
+    def get(self, code: str) -> Optional[StateRecord]:
+        return self.states.get(state_hash(code))
+
+    def record(self, code: str, result, analysis, iteration: int) -> StateRecord:
+        key = state_hash(code)
+        if key in self.states:
+            self.states[key].visits += 1
+        else:
+            self.states[key] = StateRecord(code, result, analysis, iteration)
+        return self.states[key]
+
+    def is_known_failure(self, code: str) -> bool:
+        record = self.get(code)
+        return bool(record and record.failed)
+
+    def best_failure(self) -> Optional[StateRecord]:
+        """The failing state that got furthest, preferring the least revisited."""
+        failures = [r for r in self.states.values() if r.failed]
+        if not failures:
+            return None
+        return max(failures, key=lambda r: (-r.visits,) + r.progress)
+
+    def hints(self) -> List[str]:
+        """"Tried already" notes for the LLM prompt, oldest first."""
+        failures = sorted((r for r in self.states.values() if r.failed), key=lambda r: r.iteration)
+        return [f"Iteration {r.iteration} version failed with {r.summary()}" for r in failures]
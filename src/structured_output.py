@@ -0,0 +1,134 @@
+import ast
+import json
+import re
+from typing import List, Optional, Tuple
+
+# Ollama structured output: passed as "format", the response is constrained to the schema
+REPAIR_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "explanation": {"type": "string"},
+        "fixed_code": {"type": "string"},
+    },
+    "required": ["fixed_code"],
+}
+
+OPTIMIZATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "original_complexity": {"type": "string"},
+        "optimized_complexity": {"type": "string"},
+        "changes_summary": {"type": "array", "items": {"type": "string"}},
+        "optimized_code": {"type": "string"},
+    },
+    "required": ["original_complexity", "optimized_complexity", "changes_summary", "optimized_code"],
+}
+
+# Fields holding a whole program; they may also be recovered from a code fence outside the JSON
+CODE_FIELDS = ("fixed_code", "optimized_code")
+
+_FENCE = re.compile(r"```[ \t]*([A-Za-z0-9_+-]*)[ \t]*\r?\n(.*?)```", re.DOTALL)
+_TYPES = {"string": str, "array": list, "object": dict, "number": (int, float), "integer": int, "boolean": bool}
+
+def subschema(schema: dict, fields: List[str]) -> dict:
+    """The schema restricted to `fields` (used to re-ask for missing fields only)."""
+    return {
+        "type": "object",
+        "properties": {name: schema["properties"][name] for name in fields},
+        "required": list(fields),
+    }
+
+def _json_objects(text: str):
+    """Every JSON object embedded in `text`, found by decoding from each '{' (braces inside strings are fine)."""
+    decoder = json.JSONDecoder()
+    index = text.find("{")
+    while index != -1:
+        try:
+            value, end = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            index = text.find("{", index + 1)
+            continue
+        if isinstance(value, dict):
+            yield value
+        index = text.find("{", end)
+
+def extract_json(text: str, schema: Optional[dict] = None) -> Optional[dict]:
+    """
+    The JSON object in a model response, tried in order: the whole text, fenced ```json blocks,
+    then objects embedded in prose. With a schema, the object with the most schema fields wins.
+    """
+    text = (text or "").strip()
+    candidates = []
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            candidates.append(value)
+    except json.JSONDecodeError:
+        pass
+    if not candidates:
+        for _, body in _FENCE.findall(text):
+            candidates.extend(_json_objects(body))
+    if not candidates:
+        candidates.extend(_json_objects(text))
+    if not candidates:
+        return None
+    if not schema:
+        return candidates[0]
+    fields = set(schema.get("properties", {}))
+    return max(candidates, key=lambda c: len(fields & set(c)))
+
+def extract_code(text: str, allow_bare: bool = True) -> Optional[str]:
+    """
+    A Python program in a model response: the longest fenced block tagged python/py or untagged
+    (any tag but json as a last resort), else (with allow_bare) the whole response if it parses as Python.
+    """
+    blocks = _FENCE.findall(text or "")
+    for accept in (lambda tag: tag.lower() in ("python", "py", "python3", ""), lambda tag: tag.lower() != "json"):
+        bodies = [body.strip() for tag, body in blocks if accept(tag) and body.strip()]
+        if bodies:
+            return max(bodies, key=len)
+    stripped = (text or "").strip()
+    if allow_bare and "\n" in stripped:
+        try:
+            ast.parse(stripped)
+            return stripped
+        except SyntaxError:
+            pass
+    return None
+
+def is_exact(text: str, schema: dict) -> bool:
+    """True if the whole response is a JSON object with every required field (no recovery was needed)."""
+    try:
+        value = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return isinstance(value, dict) and all(value.get(name) not in (None, "") for name in schema.get("required", []))
+
+def placeholder(spec: dict):
+    """Stand-in value for a descriptive field the model never supplied."""
+    return [] if spec.get("type") == "array" else "unknown"
+
+def extract_fields(text: str, schema: dict) -> Tuple[dict, List[str]]:
+    """
+    Schema fields found in a response, checked against their declared types, and the required
+    fields still missing. A code field missing from the JSON is taken from a code fence.
+    """
+    data = extract_json(text, schema) or {}
+    found = {}
+    for name, spec in schema.get("properties", {}).items():
+        value = data.get(name)
+        expected = _TYPES.get(spec.get("type"))
+        if value is None or (expected and not isinstance(value, expected)):
+            continue
+        if isinstance(value, str) and not value.strip():
+            continue
+        found[name] = value
+    for name in CODE_FIELDS:
+        if name in schema.get("properties", {}) and name not in found:
+            # Newlines inside JSON strings are escaped, so fences found here are outside the object;
+            # a response that held JSON is never taken as bare code
+            code = extract_code(text, allow_bare=not data)
+            if code:
+                found[name] = code
+    missing = [name for name in schema.get("required", []) if name not in found]
+    return found, missing
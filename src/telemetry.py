@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import Optional
+
+# A call whose load_duration exceeds this paid for loading the model (cold start)
+COLD_LOAD_SECONDS = 0.5
+
+class Telemetry:
+    """
+    Per-session counters for LLM and sandbox usage.
+    Shared by the controller, PatchEngine and Sandbox; the snapshot is written to the report.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.llm_calls = 0
+        self.llm_failures = 0
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.prompt_eval_seconds = 0.0
+        self.sandbox_runs = 0
+        self.sandbox_seconds = 0.0
+        self.per_model = {}
+        self.warmups = []
+        self.cold_starts = 0
+        self.parse_failures = 0
+        # One entry per repair request, in order: how much prompt the model had to evaluate
+        self.repair_prompts = []
+
+    def _model(self, model: str) -> dict:
+        return self.per_model.setdefault(model, {"calls": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                 "cold_starts": 0, "parse_outcomes": {}})
+
+    def record_llm(self, model: str, elapsed: float, response_json: Optional[dict] = None):
+        """Records one LLM call. `response_json` is None when the call failed."""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += elapsed
+            stats = self._model(model)
+            stats["calls"] += 1
+            if response_json is None:
+                self.llm_failures += 1
+                stats["failures"] += 1
+                return
+            prompt_tokens = response_json.get("prompt_eval_count", 0) or 0
+            completion_tokens = response_json.get("eval_count", 0) or 0
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.prompt_eval_seconds += (response_json.get("prompt_eval_duration", 0) or 0) / 1e9
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            if (response_json.get("load_duration", 0) or 0) / 1e9 > COLD_LOAD_SECONDS:
+                self.cold_starts += 1
+                stats["cold_starts"] += 1
+
+    def record_warmup(self, model: str, elapsed: float, response_json: Optional[dict] = None):
+        """
+        Records a model prewarm. "hit" means the model was already resident,
+        "miss" means the warm-up loaded it, "failed" means the request failed.
+        """
+        if response_json is None:
+            result, load_seconds = "failed", None
+        else:
+            load_seconds = (response_json.get("load_duration", 0) or 0) / 1e9
+            result = "miss" if load_seconds > COLD_LOAD_SECONDS else "hit"
+        with self._lock:
+            self.warmups.append({
+                "model": model,
+                "result": result,
+                "load_seconds": round(load_seconds, 4) if load_seconds is not None else None,
+                "elapsed": round(elapsed, 4),
+            })
+
+    def record_parse(self, model: str, outcome: str):
+        """
+        Records how a structured response was parsed: "parsed" (exact JSON), "recovered" (extracted
+        from prose or fences), "reasked" (missing fields asked for again), "partial" (code kept,
+        descriptive fields defaulted) or "failed" (no code).
+        """
+        with self._lock:
+            outcomes = self._model(model)["parse_outcomes"]
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if outcome == "failed":
+                self.parse_failures += 1
+
+    def record_prompt_eval(self, model: str, response_json: dict, context_reused: bool):
+        """Records the prompt evaluation cost of one repair request (a reused context only evaluates the delta)."""
+        with self._lock:
+            self.repair_prompts.append({
+                "model": model,
+                "context_reused": context_reused,
+                "prompt_tokens": response_json.get("prompt_eval_count", 0) or 0,
+                "prompt_eval_seconds": round((response_json.get("prompt_eval_duration", 0) or 0) / 1e9, 4),
+            })
+
+    def record_sandbox(self, elapsed: float):
+        with self._lock:
+            self.sandbox_runs += 1
+            self.sandbox_seconds += elapsed
+
+    def restore(self, snapshot: dict):
+        """Continues from a snapshot (of a checkpointed session): counters and wall time carry on from it."""
+        with self._lock:
+            self.started = time.perf_counter() - snapshot.get("wall_seconds", 0.0)
+            for name in ("llm_calls", "llm_failures", "llm_seconds", "prompt_tokens", "completion_tokens", "prompt_eval_seconds",
+                         "sandbox_runs", "sandbox_seconds", "cold_starts", "parse_failures"):
+                setattr(self, name, snapshot.get(name, getattr(self, name)))
+            self.repair_prompts = [dict(p) for p in snapshot.get("repair_prompts", [])]
+            self.warmups = [dict(w) for w in snapshot.get("warmups", [])]
+            self.per_model = {model: {**stats, "parse_outcomes": dict(stats.get("parse_outcomes", {}))}
+                              for model, stats in snapshot.get("per_model", {}).items()}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "wall_seconds": round(time.perf_counter() - self.started, 4),
+                "llm_calls": self.llm_calls,
+                "llm_failures": self.llm_failures,
+                "llm_seconds": round(self.llm_seconds, 4),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "prompt_eval_seconds": round(self.prompt_eval_seconds, 4),
+                "repair_prompts": [dict(p) for p in self.repair_prompts],
+                "sandbox_runs": self.sandbox_runs,
+                "sandbox_seconds": round(self.sandbox_seconds, 4),
+                "cold_starts": self.cold_starts,
+                "warmups": [dict(w) for w in self.warmups],
+                "parse_failures": self.parse_failures,
+                "per_model": {model: {**stats, "parse_outcomes": dict(stats["parse_outcomes"])}
+                              for model, stats in self.per_model.items()},
+            }
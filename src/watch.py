@@ -0,0 +1,140 @@
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .state_tracker import state_hash
+from .workspace import IGNORED_NAMES
+
+# How often watched files are checked for changes
+POLL_SECONDS = 0.25
+# A burst of saves is debugged once, after the files have been quiet for this long
+DEBOUNCE_SECONDS = 0.5
+
+def python_files(path: str, exclude: Iterable[str] = ()) -> List[str]:
+    """The watched file itself, or every .py file under a directory (skipping VCS, caches and `exclude`)."""
+    if os.path.isfile(path):
+        return [path]
+    excluded = {os.path.realpath(p) for p in exclude}
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES and os.path.realpath(os.path.join(root, d)) not in excluded)
+        found.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".py"))
+    return found
+
+def _stamps(paths: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """(mtime, size) of every path that still exists."""
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stamps[path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+class Watcher:
+    """
+    Long-lived watch mode: re-debugs on save instead of paying a cold start per invocation.
+    With a script, every change under `path` (the script or its project) re-debugs that script;
+    without one, each saved file under the directory is debugged on its own.
+    Controllers come from `make_controller` once per script and are reset between runs, so the
+    sandbox, patch engine, backend connections, knowledge base and loaded models stay warm.
+    Saves that leave the program's AST unchanged (comments, formatting, docstrings) are skipped.
+    """
+    def __init__(self, path: str, make_controller: Callable[[str], object], run: Callable[[object], None], console,
+                 script: Optional[str] = None, exclude: Iterable[str] = (), poll: float = POLL_SECONDS,
+                 debounce: float = DEBOUNCE_SECONDS):
+        self.path = path
+        self.make_controller = make_controller
+        self.run_controller = run
+        self.console = console
+        self.script = script
+        self.exclude = tuple(exclude)
+        self.poll = poll
+        self.debounce = debounce
+        # script -> controller, reused across runs
+        self.controllers: Dict[str, object] = {}
+        # script -> state hash of the program last debugged
+        self.debugged: Dict[str, str] = {}
+        self.runs = 0
+        self.skipped = 0
+
+    def _files(self) -> List[str]:
+        return python_files(self.path, self.exclude)
+
+    def _state(self, script: str) -> Optional[str]:
+        """AST hash of what a run of `script` would see: the script, or every watched file with a script set."""
+        paths = set(self._files()) | {script} if self.script else {script}
+        sources = {path: _read(path) for path in paths}
+        if sources[script] is None:
+            return None
+        if len(sources) == 1:
+            return state_hash(sources[script])
+        return state_hash({path: code for path, code in sources.items() if code is not None})
+
+    def debug(self, script: str):
+        """Debugs `script` unless its program state is the one debugged last time."""
+        state = self._state(script)
+        if state is None:
+            self.console.print(f"[yellow]{script} is missing or unreadable; waiting for the next save.[/yellow]")
+            return
+        if self.debugged.get(script) == state:
+            self.skipped += 1
+            self.console.print(f"[dim]{script}: only comments or formatting changed; skipping.[/dim]")
+            return
+        controller = self.controllers.get(script)
+        if controller is None:
+            controller = self.controllers[script] = self.make_controller(script)
+        else:
+            controller.reset()
+        self.debugged[script] = state
+        self.runs += 1
+        start = time.perf_counter()
+        try:
+            self.run_controller(controller)
+        except Exception as e:
+            self.console.print(f"[bold red]Debugging {script} failed: {e}[/bold red]")
+        self.console.print(f"[bold blue]Finished {script} in {time.perf_counter() - start:.2f}s; watching {self.path} for changes...[/bold blue]")
+
+    def _wait_for_changes(self, stamps: Dict[str, Tuple[int, int]]) -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+        """Blocks until the watched files change and then stay quiet for `debounce`; returns the new stamps and changed files."""
+        current = stamps
+        while current == stamps:
+            time.sleep(self.poll)
+            current = _stamps(self._files())
+        # Debounce: editors write in several steps and users save repeatedly
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < self.debounce:
+            time.sleep(self.poll)
+            latest = _stamps(self._files())
+            if latest != current:
+                current, quiet_since = latest, time.monotonic()
+        changed = [path for path in current if current[path] != stamps.get(path)]
+        return current, changed
+
+    def watch(self):
+        """Runs until interrupted (Ctrl+C)."""
+        stamps = _stamps(self._files())
+        if self.script:
+            self.debug(self.script)
+        else:
+            # Directory mode starts from what is on disk; only later saves are debugged
+            for path in stamps:
+                state = self._state(path)
+                if state:
+                    self.debugged[path] = state
+            self.console.print(f"[bold blue]Watching {self.path} ({len(stamps)} files) for changes...[/bold blue]")
+        try:
+            while True:
+                stamps, changed = self._wait_for_changes(stamps)
+                for script in [self.script] if self.script else changed:
+                    self.debug(script)
+        except KeyboardInterrupt:
+            self.console.print(f"\nStopped watching after {self.runs} runs ({self.skipped} saves skipped).")
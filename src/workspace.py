@@ -0,0 +1,172 @@
+import fcntl
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+# Never staged: version control, caches and virtual environments
+IGNORED_NAMES = {".git", ".hg", ".svn", "__pycache__", ".venv", "venv", ".mypy_cache", ".pytest_cache", "node_modules"}
+
+# Linux ioctl cloning a file's extents (reflink) on btrfs/xfs
+_FICLONE = 0x40049409
+_FRAME = re.compile(r'File "(.+?)", line (\d+)')
+_ENTRY_PREFIX = ".entry_"
+
+def clone_file(src: str, dst: str):
+    """Copies a file as a reflink when the filesystem supports it, otherwise as a regular copy."""
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+class Workspace:
+    """
+    A multi-file project staged into an isolated temp directory.
+
+    Directories are recreated as real directories and every file is cloned into them (a reflink on
+    btrfs/xfs, so staging costs no data copies there; a regular copy elsewhere). Nothing in the
+    staged tree links back to the project, so whatever the program under test writes stays in the
+    staged copy. Patched files replace their clone; the originals are never touched.
+
+    >>> import os, subprocess, sys, tempfile
+    >>> project = tempfile.mkdtemp()
+    >>> os.mkdir(os.path.join(project, "data"))
+    >>> for rel, text in [("top.txt", "original"), ("data/input.txt", "original"), ("main.py", "")]:
+    ...     with open(os.path.join(project, rel), "w") as f:
+    ...         _ = f.write(text)
+    >>> ws = Workspace(project, "main.py")
+    >>> program = ws.entry_script(
+    ...     "open('top.txt', 'w').write('CLOBBERED')\\n"
+    ...     "open('data/input.txt', 'a').write('CLOBBERED')\\n"
+    ...     "open('data/new.txt', 'w').write('new')\\n")
+    >>> subprocess.run([sys.executable, program], cwd=ws.staged_dir).returncode
+    0
+    >>> open(os.path.join(ws.staged_dir, "top.txt")).read()
+    'CLOBBERED'
+    >>> [open(os.path.join(project, rel)).read() for rel in ("top.txt", "data/input.txt")]
+    ['original', 'original']
+    >>> sorted(os.listdir(os.path.join(project, "data")))
+    ['input.txt']
+    >>> ws.close()
+    """
+    def __init__(self, project_dir: str, entry: str):
+        self.root = os.path.realpath(project_dir)
+        entry_path = entry if os.path.isabs(entry) else os.path.join(self.root, entry)
+        self.entry = os.path.relpath(os.path.realpath(entry_path), self.root)
+        if self.entry.startswith(".."):
+            raise ValueError(f"Entry point {entry} is outside the project {project_dir}")
+        self.staged_dir: Optional[str] = None
+        # relative path -> source of files patched this session (the entry point is owned by the caller)
+        self.overrides: Dict[str, str] = {}
+        # What is currently written in the staged tree instead of a clone of the original
+        self._written: Dict[str, str] = {}
+
+    def __enter__(self):
+        self.stage()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _clone(self, src: str, dst: str):
+        """Stages `src` at `dst`: directories as real directories, files as clones. Never a link to the project."""
+        if os.path.isdir(src):
+            os.makedirs(dst, exist_ok=True)
+            for name in os.listdir(src):
+                if name not in IGNORED_NAMES:
+                    self._clone(os.path.join(src, name), os.path.join(dst, name))
+        else:
+            clone_file(src, dst)
+
+    def stage(self) -> str:
+        """Stages the project once; later calls return the existing staged root."""
+        if self.staged_dir:
+            return self.staged_dir
+        self.staged_dir = tempfile.mkdtemp(prefix="debug_ws_")
+        self._clone(self.root, self.staged_dir)
+        return self.staged_dir
+
+    def read(self, rel: str) -> str:
+        if rel in self.overrides:
+            return self.overrides[rel]
+        with open(os.path.join(self.root, rel), "r") as f:
+            return f.read()
+
+    def write(self, rel: str, code: str):
+        self.overrides[rel] = code
+
+    def sync(self):
+        """Brings the staged tree in line with `overrides`; only files that changed are touched."""
+        self.stage()
+        for rel in set(self._written) | set(self.overrides):
+            wanted = self.overrides.get(rel)
+            if wanted == self._written.get(rel):
+                continue
+            path = os.path.join(self.staged_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.lexists(path):
+                os.unlink(path)
+            if wanted is None:
+                self._clone(os.path.join(self.root, rel), path)
+                del self._written[rel]
+            else:
+                with open(path, "w") as f:
+                    f.write(wanted)
+                self._written[rel] = wanted
+
+    def entry_script(self, code: str) -> str:
+        """
+        Writes `code` as a uniquely named entry script next to the staged entry point and returns its path.
+        Separate files let concurrent runs use different entry code against the same staged tree.
+        """
+        self.sync()
+        directory = os.path.join(self.staged_dir, os.path.dirname(self.entry))
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".py", prefix=_ENTRY_PREFIX, dir=directory, delete=False) as f:
+            f.write(code)
+            return f.name
+
+    def locate(self, stderr: str) -> Optional[str]:
+        """Relative path of the innermost traceback frame inside the workspace (None if there is none)."""
+        if not self.staged_dir or not stderr:
+            return None
+        found = None
+        for path, _ in _FRAME.findall(stderr):
+            if not path.startswith(self.staged_dir + os.sep):
+                continue
+            rel = os.path.relpath(path, self.staged_dir)
+            found = self.entry if os.path.basename(rel).startswith(_ENTRY_PREFIX) else rel
+        return found
+
+    def state(self, entry_code: str) -> Dict[str, str]:
+        """The full program state: entry point plus every patched file."""
+        return {**self.overrides, self.entry: entry_code}
+
+    def restore(self, state: Dict[str, str]) -> str:
+        """Resets the patched files to `state` and returns its entry point source."""
+        self.overrides = {rel: code for rel, code in state.items() if rel != self.entry}
+        return state[self.entry]
+
+    def export(self, dest_dir: str, entry_code: str) -> list:
+        """Writes the entry point and every patched file under `dest_dir`; returns the written paths."""
+        written = []
+        for rel, code in self.state(entry_code).items():
+            path = os.path.join(dest_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(code)
+            written.append(path)
+        return written
+
+    def refresh(self):
+        """Drops this session's patches and restages on next use, picking up edits and new project files."""
+        self.overrides = {}
+        self.close()
+
+    def close(self):
+        if self.staged_dir:
+            shutil.rmtree(self.staged_dir, ignore_errors=True)
+            self.staged_dir = None
+            self._written = {}